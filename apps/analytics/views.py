@@ -3,18 +3,92 @@ Vistas para análisis estadísticos avanzados
 """
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg, Max, Min, StdDev, Q
+from django.db.models import Count, Avg, Max, Min, StdDev, Q, Exists, OuterRef
 from django.utils import timezone
 from datetime import timedelta
 import json
-
+import numpy as np
+
+from apps.moodle.activity import activity_window, recent_weeks, weekly_counts_by
+from apps.moodle.categories import category_choices, descendant_ids
+from apps.moodle.coursestats import course_stats, system_totals, with_course_stats
+from apps.moodle.cube import counts_by_days, cube_counts, unique_users, unique_users_by_days
+from apps.moodle.archive import to_micros
+from apps.moodle.replicas import replica_reads
+from apps.moodle.snapshot import table_columns
+from apps.moodle.tenants import current_tenant, fan_out, tenant_label
 from apps.moodle.models import (
     Course, MoodleUser, UserLastAccess, UserEnrolment,
     Group, GroupMember, Category, Role, RoleAssignment
 )
 
 
+def _selected_category(request):
+    """Id de carrera/categoría elegida con ?category= (o None)"""
+    value = request.GET.get('category', '')
+    return int(value) if value.isdigit() else None
+
+
+def _visible_courses(request):
+    """Cursos visibles, limitados al subárbol de ?category= si se indicó"""
+    courses = Course.objects.filter(visible=True)
+    category_id = _selected_category(request)
+    if category_id is not None:
+        courses = courses.filter(category_id__in=descendant_ids([category_id]))
+    return courses
+
+
+def _course_filter(request):
+    """Cursos de ?category= para recortar cubo y consultas, o None (toda la institución)"""
+    if _selected_category(request) is None:
+        return None
+    return _visible_courses(request)
+
+
+def _visible_users(request):
+    """Usuarios; con ?category=, solo los inscriptos a algún curso de esa carrera"""
+    users = MoodleUser.objects.all()
+    courses = _course_filter(request)
+    if courses is not None:
+        users = users.filter(Exists(
+            UserEnrolment.objects.filter(user=OuterRef('pk'), enrol__course__in=courses)
+        ))
+    return users
+
+
+def _count_by(ids, column, weights=None):
+    """Filas (o suma de `weights`) de cada id de `ids` en una columna de esos ids"""
+    order = np.argsort(ids)
+    positions = order[np.searchsorted(ids, column, sorter=order)]
+    return np.bincount(positions, weights=weights, minlength=len(ids))
+
+
+def _system_totals():
+    """Totales del resumen general de la institución actual (mantenidos por triggers)"""
+    totals = system_totals()
+    return {
+        'total_courses': totals['courses'],
+        'total_users': totals['users'],
+        'total_groups': totals['groups'],
+        'total_accesses': totals['accesses'],
+    }
+
+
+def _tenant_rollup(tenants):
+    """
+    Totales de cada institución de `tenants` (consultadas en paralelo) y de
+    todas juntas.
+
+    Devuelve (filas por institución, fila de totales).
+    """
+    totals = fan_out(_system_totals, tenants=tenants)
+    rows = [{'name': name, 'label': tenant_label(name), **values} for name, values in totals.items()]
+    overall = {key: sum(values[key] for values in totals.values()) for key in next(iter(totals.values()))}
+    return rows, overall
+
+
 @login_required
+@replica_reads
 def analytics_menu(request):
     """Menú principal de estadísticas"""
     context = {
@@ -149,27 +223,31 @@ def analytics_menu(request):
                 'category': 'advanced'
             },
         ],
-        'total_courses': Course.objects.filter(visible=True).count(),
-        'total_users': MoodleUser.objects.count(),
-        'total_groups': Group.objects.count(),
-        'total_accesses': UserLastAccess.objects.count(),
+        'categories': category_choices(),
+        'selected_category': _selected_category(request),
     }
+    if len(request.allowed_tenants) > 1:
+        rows, overall = _tenant_rollup(request.allowed_tenants)
+        context.update(next(row for row in rows if row['name'] == current_tenant()))
+        context.update(tenant_totals=rows, overall_totals=overall)
+    else:
+        context.update(_system_totals())
     return render(request, 'analytics/menu.html', context)
 
 
 @login_required
+@replica_reads
 def descriptive_stats(request):
     """Estadísticas descriptivas de accesos"""
     # Obtener datos de acceso por curso
-    courses = Course.objects.filter(visible=True)[:20]  # Limitar para performance
+    courses = with_course_stats(_visible_courses(request))[:20]  # Limitar para performance
 
     stats = []
     for course in courses:
-        accesses = UserLastAccess.objects.filter(course=course)
-        access_count = accesses.count()
+        access_count = course.access_count
 
         if access_count > 0:
-            enrolled_count = UserEnrolment.objects.filter(enrol__course=course).count()
+            enrolled_count = course.enrolled_count
 
             # Calcular días desde el inicio del curso
             now = timezone.now()
@@ -211,17 +289,18 @@ def descriptive_stats(request):
 
 
 @login_required
+@replica_reads
 def correlation_analysis(request):
     """Análisis de correlación entre variables"""
     # Variables: accesos vs inscriptos, grupos vs accesos, etc.
 
-    courses = Course.objects.filter(visible=True)
+    courses = with_course_stats(_visible_courses(request))
 
     data_points = []
     for course in courses:
-        enrolled = UserEnrolment.objects.filter(enrol__course=course).count()
-        accesses = UserLastAccess.objects.filter(course=course).count()
-        groups_count = Group.objects.filter(course=course).count()
+        enrolled = course.enrolled_count
+        accesses = course.access_count
+        groups_count = course.group_count
 
         if enrolled > 0:
             data_points.append({
@@ -241,26 +320,21 @@ def correlation_analysis(request):
 
 
 @login_required
+@replica_reads
 def access_distribution(request):
     """Distribución temporal de accesos"""
-    now = timezone.now()
-    last_30_days = now - timedelta(days=30)
-
-    # Accesos por día (últimos 30 días)
-    daily_accesses = []
-    for i in range(30):
-        day_start = last_30_days + timedelta(days=i)
-        day_end = day_start + timedelta(days=1)
-
-        count = UserLastAccess.objects.filter(
-            timeaccess__gte=day_start,
-            timeaccess__lt=day_end
-        ).count()
-
-        daily_accesses.append({
-            'date': day_start.strftime('%Y-%m-%d'),
+    today = timezone.localdate()
+    last_30_days = today - timedelta(days=29)
+
+    # Accesos por día (últimos 30 días, hoy incluido), desde el cubo
+    daily_counts = counts_by_days(last_30_days, today + timedelta(days=1), courses=_course_filter(request))
+    daily_accesses = [
+        {
+            'date': (last_30_days + timedelta(days=i)).strftime('%Y-%m-%d'),
             'count': count
-        })
+        }
+        for i, count in enumerate(daily_counts)
+    ]
 
     context = {
         'daily_accesses': daily_accesses,
@@ -271,9 +345,10 @@ def access_distribution(request):
 
 
 @login_required
+@replica_reads
 def group_comparison(request):
     """Comparación entre grupos"""
-    groups = Group.objects.all()[:20]
+    groups = Group.objects.filter(course__in=_visible_courses(request))[:20]
 
     group_stats = []
     for group in groups:
@@ -302,27 +377,26 @@ def group_comparison(request):
 
 
 @login_required
+@replica_reads
 def temporal_trends(request):
     """Análisis de tendencias temporales"""
-    now = timezone.now()
-    last_90_days = now - timedelta(days=90)
-
-    # Accesos por semana (últimas 12 semanas)
-    weekly_data = []
-    for i in range(12):
-        week_start = last_90_days + timedelta(weeks=i)
-        week_end = week_start + timedelta(weeks=1)
-
-        count = UserLastAccess.objects.filter(
-            timeaccess__gte=week_start,
-            timeaccess__lt=week_end
-        ).count()
-
-        weekly_data.append({
+    last_90_days = timezone.localdate() - timedelta(days=90)
+
+    # Accesos por semana (12 semanas desde hace 90 días), desde el cubo; los
+    # usuarios distintos de cada semana, uniendo los sketches de sus días
+    courses = _course_filter(request)
+    weekly_counts = counts_by_days(last_90_days, last_90_days + timedelta(weeks=12), step=7, courses=courses)
+    weekly_users = unique_users_by_days(last_90_days, last_90_days + timedelta(weeks=12), step=7,
+                                        courses=courses)
+    weekly_data = [
+        {
             'week': f'Semana {i+1}',
-            'date': week_start.strftime('%Y-%m-%d'),
-            'count': count
-        })
+            'date': (last_90_days + timedelta(weeks=i)).strftime('%Y-%m-%d'),
+            'count': count,
+            'unique_users': users,
+        }
+        for i, (count, users) in enumerate(zip(weekly_counts, weekly_users))
+    ]
 
     context = {
         'weekly_data': weekly_data,
@@ -333,6 +407,7 @@ def temporal_trends(request):
 
 
 @login_required
+@replica_reads
 def custom_panel(request):
     """Panel personalizado para seleccionar variables y operaciones"""
 
@@ -341,7 +416,7 @@ def custom_panel(request):
         selected_vars = request.POST.getlist('variables')
         operation = request.POST.get('operation')
 
-        results = calculate_custom_stats(selected_vars, operation)
+        results = calculate_custom_stats(selected_vars, operation, _course_filter(request))
 
         context = {
             'variables': get_available_variables(),
@@ -383,25 +458,23 @@ def get_available_operations():
     ]
 
 
-def calculate_custom_stats(variables, operation):
-    """Calcula estadísticas personalizadas"""
+def calculate_custom_stats(variables, operation, courses=None):
+    """Calcula estadísticas personalizadas (de `courses` y sus grupos, si se indican)"""
     results = {}
+    if courses is None:
+        visible, groups = Course.objects.filter(visible=True), Group.objects.all()
+    else:
+        visible, groups = courses, Group.objects.filter(course__in=courses)
 
     for var in variables:
         if var == 'course_accesses':
-            values = [
-                UserLastAccess.objects.filter(course=c).count()
-                for c in Course.objects.filter(visible=True)
-            ]
+            values = list(with_course_stats(visible).values_list('access_count', flat=True))
         elif var == 'user_enrollments':
-            values = [
-                UserEnrolment.objects.filter(enrol__course=c).count()
-                for c in Course.objects.filter(visible=True)
-            ]
+            values = list(with_course_stats(visible).values_list('enrolled_count', flat=True))
         elif var == 'group_members':
             values = [
                 GroupMember.objects.filter(group=g).count()
-                for g in Group.objects.all()
+                for g in groups
             ]
         else:
             values = []
@@ -434,50 +507,48 @@ def calculate_custom_stats(variables, operation):
 # ============================================================================
 
 @login_required
+@replica_reads
 def role_analysis(request):
     """Análisis de roles por curso - Últimos 120 días con promedios semanales"""
     from collections import defaultdict
 
     # Fecha límite: últimos 120 días
     date_limit = timezone.now() - timedelta(days=120)
-
-    # Obtener cursos con actividad reciente
-    courses = Course.objects.filter(
-        visible=True,
-        user_accesses__timeaccess__gte=date_limit
-    ).distinct()[:20]
+    today = timezone.localdate()
+    role_names = {role.id: role.get_shortname_display() for role in Role.objects.all()}
+
+    # Accesos por curso y rol del evento, desde el cubo
+    access_counts = defaultdict(lambda: defaultdict(int))
+    for row in cube_counts(today - timedelta(days=120), today + timedelta(days=1),
+                           by=('course', 'role'), courses=_visible_courses(request)):
+        access_counts[row['course']][role_names.get(row['role'], 'Sin rol')] += row['count']
+
+    # Cursos con actividad reciente
+    courses = _visible_courses(request).filter(id__in=list(access_counts))[:20]
+
+    # Usuarios distintos por curso y rol: último acceso en el período y
+    # primer rol asignado en el curso
+    assigned = {}
+    for user_id, course_id, role_id in (
+        RoleAssignment.objects.filter(course__in=courses).order_by('id')
+        .values_list('user_id', 'course_id', 'role_id')
+    ):
+        assigned.setdefault((user_id, course_id), role_id)
+    unique_by_role = defaultdict(lambda: defaultdict(int))
+    for user_id, course_id in UserLastAccess.objects.filter(
+        course__in=courses, timeaccess__gte=date_limit
+    ).values_list('user_id', 'course_id'):
+        role_id = assigned.get((user_id, course_id))
+        unique_by_role[course_id][role_names.get(role_id, 'Sin rol')] += 1
 
     course_stats = []
     for course in courses:
-        # Estadísticas por rol
-        role_stats = defaultdict(lambda: {'total_accesses': 0, 'unique_users': set()})
-
-        # Obtener accesos de los últimos 120 días para este curso
-        accesses = UserLastAccess.objects.filter(
-            course=course,
-            timeaccess__gte=date_limit
-        ).select_related('user')
-
-        for access in accesses:
-            # Obtener rol del usuario en este curso
-            role_assignment = RoleAssignment.objects.filter(
-                user=access.user,
-                course=course
-            ).select_related('role').first()
-
-            if role_assignment:
-                role_name = role_assignment.role.get_shortname_display()
-            else:
-                role_name = 'Sin rol'
-
-            role_stats[role_name]['total_accesses'] += 1
-            role_stats[role_name]['unique_users'].add(access.user.id)
-
         # Calcular promedios semanales (120 días = ~17 semanas)
         weeks = 17
-        for role_name in role_stats:
-            total_accesses = role_stats[role_name]['total_accesses']
-            unique_users = len(role_stats[role_name]['unique_users'])
+        role_stats = {}
+        for role_name in sorted({*access_counts[course.id], *unique_by_role[course.id]}):
+            total_accesses = access_counts[course.id].get(role_name, 0)
+            unique_users = unique_by_role[course.id].get(role_name, 0)
 
             role_stats[role_name] = {
                 'total_accesses': total_accesses,
@@ -488,7 +559,7 @@ def role_analysis(request):
 
         course_stats.append({
             'course': course,
-            'role_stats': dict(role_stats),
+            'role_stats': role_stats,
             'total_accesses': sum(s['total_accesses'] for s in role_stats.values()),
         })
 
@@ -506,33 +577,24 @@ def role_analysis(request):
 
 
 @login_required
+@replica_reads
 def regression_analysis(request):
     """Análisis de regresión y predicción de tendencias"""
     import numpy as np
     from scipy import stats
 
     # Obtener cursos activos
-    courses = Course.objects.filter(visible=True)[:10]
+    courses = list(_visible_courses(request)[:10])
+
+    # Usuarios activos por semana en las últimas 12 (bitmaps de actividad, una sola lectura)
+    weeks = 12
+    _, course_ids, bits = activity_window(recent_weeks(weeks), weeks, courses=[c.id for c in courses])
+    keys, counts = weekly_counts_by(course_ids, bits, weeks)
+    weekly_by_course = dict(zip(keys.tolist(), counts.tolist()))
 
     predictions = []
     for course in courses:
-        # Obtener accesos de los últimos 90 días
-        days = 90
-        date_limit = timezone.now() - timedelta(days=days)
-
-        # Agrupar accesos por semana
-        weekly_data = []
-        for week in range(int(days/7)):
-            week_start = date_limit + timedelta(weeks=week)
-            week_end = week_start + timedelta(days=7)
-
-            count = UserLastAccess.objects.filter(
-                course=course,
-                timeaccess__gte=week_start,
-                timeaccess__lt=week_end
-            ).count()
-
-            weekly_data.append(count)
+        weekly_data = weekly_by_course.get(course.id, [0] * weeks)
 
         if len(weekly_data) > 2 and sum(weekly_data) > 0:
             # Regresión lineal
@@ -560,13 +622,14 @@ def regression_analysis(request):
 
     context = {
         'predictions': predictions,
-        'days_analyzed': 90,
+        'days_analyzed': weeks * 7,
         'weeks_predicted': 4,
     }
     return render(request, 'analytics/regression_analysis.html', context)
 
 
 @login_required
+@replica_reads
 def clustering_analysis(request):
     """Análisis de clustering - Agrupamiento de estudiantes por patrones"""
     from sklearn.cluster import KMeans
@@ -580,43 +643,42 @@ def clustering_analysis(request):
     students_data = []
     students_info = []
 
-    for user in MoodleUser.objects.all()[:200]:  # Limitar para performance
-        # Características del estudiante
-        total_accesses = UserLastAccess.objects.filter(
-            user=user,
-            timeaccess__gte=date_limit
-        ).count()
-
-        courses_enrolled = UserEnrolment.objects.filter(user=user).count()
-        groups_count = GroupMember.objects.filter(user=user).count()
-
-        # Calcular días promedio entre accesos
-        accesses = UserLastAccess.objects.filter(
-            user=user,
-            timeaccess__gte=date_limit
-        ).order_by('timeaccess')
-
-        if accesses.count() > 1:
-            time_deltas = []
-            for i in range(1, len(accesses)):
-                delta = (accesses[i].timeaccess - accesses[i-1].timeaccess).days
-                time_deltas.append(delta)
-            avg_days_between = sum(time_deltas) / len(time_deltas) if time_deltas else 0
-        else:
-            avg_days_between = 0
-
-        if total_accesses > 0:  # Solo estudiantes activos
+    users = list(_visible_users(request)[:200])  # Limitar para performance
+    user_ids = np.array([user.id for user in users], dtype=np.int64)
+
+    # Columnas del snapshot (memmap) de estos usuarios, contadas por usuario
+    accesses = table_columns('last_access', user_ids)
+    recent = accesses['time'] >= to_micros(date_limit)
+    access_users, access_times = accesses['user'][recent], accesses['time'][recent]
+    total_accesses = _count_by(user_ids, access_users)
+    courses_enrolled = _count_by(user_ids, table_columns('enrolments', user_ids)['user'])
+    groups_count = _count_by(user_ids, table_columns('members', user_ids)['user'])
+
+    # Días promedio entre accesos consecutivos de cada usuario
+    order = np.lexsort((access_times, access_users))
+    access_users, access_times = access_users[order], access_times[order]
+    same_user = access_users[1:] == access_users[:-1]
+    gaps = (np.diff(access_times) // (86400 * 1_000_000))[same_user]
+    gap_users = access_users[1:][same_user]
+    gap_counts = _count_by(user_ids, gap_users)
+    avg_days_between = np.divide(
+        _count_by(user_ids, gap_users, weights=gaps), gap_counts,
+        out=np.zeros(len(user_ids)), where=gap_counts > 0,
+    )
+
+    for index, user in enumerate(users):
+        if total_accesses[index] > 0:  # Solo estudiantes activos
             students_data.append([
-                total_accesses,
-                courses_enrolled,
-                groups_count,
-                avg_days_between
+                total_accesses[index],
+                courses_enrolled[index],
+                groups_count[index],
+                avg_days_between[index]
             ])
             students_info.append({
                 'user': user,
-                'total_accesses': total_accesses,
-                'courses_enrolled': courses_enrolled,
-                'groups_count': groups_count,
+                'total_accesses': int(total_accesses[index]),
+                'courses_enrolled': int(courses_enrolled[index]),
+                'groups_count': int(groups_count[index]),
             })
 
     clusters_result = []
@@ -666,6 +728,7 @@ def clustering_analysis(request):
 
 
 @login_required
+@replica_reads
 def survival_analysis(request):
     """Análisis de supervivencia - Retención y abandono de estudiantes"""
     # Analizar retención por cohorte (mes de inscripción)
@@ -678,6 +741,9 @@ def survival_analysis(request):
 
     # Agrupar por mes de inscripción
     enrollments = UserEnrolment.objects.all().select_related('user', 'enrol__course')
+    courses = _course_filter(request)
+    if courses is not None:
+        enrollments = enrollments.filter(enrol__course__in=courses)
 
     for enrollment in enrollments:
         cohort_month = enrollment.timecreated.strftime('%Y-%m')
@@ -726,21 +792,21 @@ def survival_analysis(request):
 
 
 @login_required
+@replica_reads
 def heatmap_activity(request):
     """Heatmap de actividad temporal - Patrones por día de semana y hora"""
     from collections import defaultdict
 
-    # Obtener accesos de los últimos 60 días
-    date_limit = timezone.now() - timedelta(days=60)
-    accesses = UserLastAccess.objects.filter(timeaccess__gte=date_limit)
+    # Accesos de los últimos 60 días, desde el cubo
+    today = timezone.localdate()
+    date_limit = today - timedelta(days=60)
 
-    # Matriz: día de semana (0-6) x hora (0-23)
+    # Matriz: día de semana (0-6, 0=Lunes) x hora (0-23)
     heatmap_data = defaultdict(lambda: defaultdict(int))
 
-    for access in accesses:
-        day_of_week = access.timeaccess.weekday()  # 0=Lunes, 6=Domingo
-        hour = access.timeaccess.hour
-        heatmap_data[day_of_week][hour] += 1
+    for row in cube_counts(date_limit, today + timedelta(days=1), by=('weekday', 'hour'),
+                           courses=_course_filter(request)):
+        heatmap_data[row['weekday']][row['hour']] += row['count']
 
     # Convertir a formato para template
     days = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
@@ -781,6 +847,7 @@ def heatmap_activity(request):
 
 
 @login_required
+@replica_reads
 def pca_analysis(request):
     """Análisis de Componentes Principales - Reducción dimensional"""
     from sklearn.decomposition import PCA
@@ -791,14 +858,14 @@ def pca_analysis(request):
     courses_data = []
     courses_info = []
 
-    for course in Course.objects.filter(visible=True)[:50]:
+    for course in with_course_stats(_visible_courses(request))[:50]:
         # Características del curso
-        total_enrolled = UserEnrolment.objects.filter(enrol__course=course).count()
-        total_accesses = UserLastAccess.objects.filter(course=course).count()
-        groups_count = Group.objects.filter(course=course).count()
+        total_enrolled = course.enrolled_count
+        total_accesses = course.access_count
+        groups_count = course.group_count
 
-        # Calcular engagement rate
-        unique_accessors = UserLastAccess.objects.filter(course=course).values('user').distinct().count()
+        # Calcular engagement rate (un último acceso por usuario y curso)
+        unique_accessors = course.access_count
         engagement_rate = (unique_accessors / total_enrolled * 100) if total_enrolled > 0 else 0
 
         # Días desde inicio
@@ -868,6 +935,7 @@ def pca_analysis(request):
 # ============================================================================
 
 @login_required
+@replica_reads
 def churn_prediction(request):
     """Predicción de abandono estudiantil con Random Forest"""
     from sklearn.ensemble import RandomForestClassifier
@@ -882,7 +950,7 @@ def churn_prediction(request):
     students_data = []
     students_info = []
 
-    for user in MoodleUser.objects.all()[:500]:
+    for user in _visible_users(request)[:500]:
         # Características históricas (90 días previos)
         total_accesses = UserLastAccess.objects.filter(
             user=user,
@@ -990,48 +1058,47 @@ def churn_prediction(request):
 
 
 @login_required
+@replica_reads
 def predictive_trends(request):
     """Análisis predictivo de tendencias multi-variable"""
+    from collections import defaultdict
     from scipy import stats
     import numpy as np
 
     # Analizar múltiples métricas simultáneamente
-    courses = Course.objects.filter(visible=True)[:15]
+    courses = list(with_course_stats(_visible_courses(request))[:15])
+    course_ids = [course.id for course in courses]
+
+    # Últimas 12 semanas (de lunes a domingo): accesos por curso y semana
+    # desde el cubo y usuarios distintos uniendo los sketches de cada semana
+    weeks = 12
+    today = timezone.localdate()
+    first_monday = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    accesses_by_course = defaultdict(lambda: [0] * weeks)
+    users_by_course = defaultdict(lambda: [0] * weeks)
+    for totals, rows in (
+        (accesses_by_course, cube_counts(first_monday, today + timedelta(days=1),
+                                         by=('course', 'week'), courses=course_ids)),
+        (users_by_course, unique_users(first_monday, today + timedelta(days=1),
+                                       by=('course', 'week'), courses=course_ids)),
+    ):
+        for row in rows:
+            totals[row['course']][(row['week'] - first_monday).days // 7] = row['count']
 
     predictions = []
 
     for course in courses:
-        # Últimos 90 días de datos
-        days = 90
-        date_limit = timezone.now() - timedelta(days=days)
+        total_enrolled = course.enrolled_count
 
         # Recopilar datos por semana para múltiples variables
         weeks_data = []
-        for week in range(int(days/7)):
-            week_start = date_limit + timedelta(weeks=week)
-            week_end = week_start + timedelta(days=7)
-
-            # Variable 1: Accesos
-            accesses = UserLastAccess.objects.filter(
-                course=course,
-                timeaccess__gte=week_start,
-                timeaccess__lt=week_end
-            ).count()
-
-            # Variable 2: Usuarios únicos
-            unique_users = UserLastAccess.objects.filter(
-                course=course,
-                timeaccess__gte=week_start,
-                timeaccess__lt=week_end
-            ).values('user').distinct().count()
-
-            # Variable 3: Tasa de engagement
-            total_enrolled = UserEnrolment.objects.filter(enrol__course=course).count()
-            engagement = (unique_users / total_enrolled * 100) if total_enrolled > 0 else 0
+        for accesses, active_users in zip(accesses_by_course[course.id], users_by_course[course.id]):
+            # Variable 1 y 2: Accesos y usuarios únicos; Variable 3: Tasa de engagement
+            engagement = (active_users / total_enrolled * 100) if total_enrolled > 0 else 0
 
             weeks_data.append({
                 'accesses': accesses,
-                'unique_users': unique_users,
+                'unique_users': active_users,
                 'engagement': engagement
             })
 
@@ -1076,13 +1143,14 @@ def predictive_trends(request):
 
     context = {
         'predictions': predictions,
-        'weeks_analyzed': 12,
+        'weeks_analyzed': weeks,
         'weeks_predicted': 4,
     }
     return render(request, 'analytics/predictive_trends.html', context)
 
 
 @login_required
+@replica_reads
 def smart_segmentation(request):
     """Segmentación inteligente de estudiantes con perfiles detallados"""
     from sklearn.cluster import KMeans
@@ -1093,7 +1161,13 @@ def smart_segmentation(request):
     students_data = []
     students_info = []
 
-    for user in MoodleUser.objects.all()[:300]:
+    users = list(_visible_users(request)[:300])
+    # Cursos con actividad en cada una de las últimas 4 semanas (bitmaps, una sola lectura)
+    user_ids, _, bits = activity_window(recent_weeks(4), 4, users=[user.id for user in users])
+    keys, counts = weekly_counts_by(user_ids, bits, 4)
+    weekly_by_user = dict(zip(keys.tolist(), counts.tolist()))
+
+    for user in users:
         # Obtener datos completos del estudiante
         date_limit_30 = timezone.now() - timedelta(days=30)
         date_limit_90 = timezone.now() - timedelta(days=90)
@@ -1105,16 +1179,7 @@ def smart_segmentation(request):
         groups_count = GroupMember.objects.filter(user=user).count()
 
         # Consistencia (varianza en accesos semanales)
-        weekly_accesses = []
-        for week in range(4):
-            week_start = timezone.now() - timedelta(weeks=week+1)
-            week_end = timezone.now() - timedelta(weeks=week)
-            week_count = UserLastAccess.objects.filter(
-                user=user,
-                timeaccess__gte=week_start,
-                timeaccess__lt=week_end
-            ).count()
-            weekly_accesses.append(week_count)
+        weekly_accesses = weekly_by_user.get(user.id, [0] * 4)
 
         consistency = np.std(weekly_accesses) if weekly_accesses else 0
 
@@ -1189,6 +1254,7 @@ def smart_segmentation(request):
 
 
 @login_required
+@replica_reads
 def anomaly_detection(request):
     """Detección de anomalías con Isolation Forest"""
     from sklearn.ensemble import IsolationForest
@@ -1199,23 +1265,25 @@ def anomaly_detection(request):
     courses_data = []
     courses_info = []
 
-    for course in Course.objects.filter(visible=True)[:50]:
-        # Métricas del curso
-        total_enrolled = UserEnrolment.objects.filter(enrol__course=course).count()
-        total_accesses = UserLastAccess.objects.filter(course=course).count()
-        unique_accessors = UserLastAccess.objects.filter(course=course).values('user').distinct().count()
-        groups_count = Group.objects.filter(course=course).count()
-
-        # Tasa de actividad reciente vs histórica
-        recent = UserLastAccess.objects.filter(
-            course=course,
+    courses = list(with_course_stats(_visible_courses(request))[:50])
+    # Accesos de la última semana de todos los cursos en una consulta
+    recent_by_course = dict(
+        UserLastAccess.objects.filter(
+            course__in=courses,
             timeaccess__gte=timezone.now() - timedelta(days=7)
-        ).count()
+        ).values('course').annotate(n=Count('id')).values_list('course', 'n')
+    )
 
-        old = UserLastAccess.objects.filter(
-            course=course,
-            timeaccess__lt=timezone.now() - timedelta(days=7)
-        ).count()
+    for course in courses:
+        # Métricas del curso (un último acceso por usuario y curso)
+        total_enrolled = course.enrolled_count
+        total_accesses = course.access_count
+        unique_accessors = course.access_count
+        groups_count = course.group_count
+
+        # Tasa de actividad reciente vs histórica
+        recent = recent_by_course.get(course.id, 0)
+        old = total_accesses - recent
 
         activity_ratio = (recent / old) if old > 0 else 0
         engagement_rate = (unique_accessors / total_enrolled * 100) if total_enrolled > 0 else 0
@@ -1294,13 +1362,19 @@ def anomaly_detection(request):
 
 
 @login_required
+@replica_reads
 def engagement_patterns(request):
     """Patrones de engagement temporal - Cuándo estudian realmente"""
     from collections import defaultdict
 
-    # Analizar últimos 90 días
-    date_limit = timezone.now() - timedelta(days=90)
-    accesses = UserLastAccess.objects.filter(timeaccess__gte=date_limit)
+    # Analizar últimos 90 días (conteos por día, hora y carrera, desde el cubo)
+    today = timezone.localdate()
+    date_limit = today - timedelta(days=90)
+    rows = cube_counts(
+        date_limit, today + timedelta(days=1), by=('weekday', 'hour', 'course__category__name'),
+        courses=_course_filter(request),
+    )
+    total_accesses = sum(row['count'] for row in rows)
 
     # Patrones por franja horaria
     time_slots = {
@@ -1318,41 +1392,42 @@ def engagement_patterns(request):
     # Patrones por carrera
     career_patterns = defaultdict(lambda: defaultdict(int))
 
-    for access in accesses:
-        hour = access.timeaccess.hour
-        weekday = access.timeaccess.weekday()
+    days = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+    for row in rows:
+        hour = row['hour']
+        count = row['count']
 
         # Clasificar por franja horaria
         if 0 <= hour < 6:
-            time_slots['Madrugada (00-06)'] += 1
+            time_slots['Madrugada (00-06)'] += count
         elif 6 <= hour < 12:
-            time_slots['Mañana (06-12)'] += 1
+            time_slots['Mañana (06-12)'] += count
         elif 12 <= hour < 14:
-            time_slots['Mediodía (12-14)'] += 1
+            time_slots['Mediodía (12-14)'] += count
         elif 14 <= hour < 18:
-            time_slots['Tarde (14-18)'] += 1
+            time_slots['Tarde (14-18)'] += count
         elif 18 <= hour < 22:
-            time_slots['Noche (18-22)'] += 1
+            time_slots['Noche (18-22)'] += count
         else:
-            time_slots['Noche Tardía (22-24)'] += 1
+            time_slots['Noche Tardía (22-24)'] += count
 
         # Día de semana
-        days = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-        weekday_patterns[days[weekday]] += 1
+        weekday_patterns[days[row['weekday']]] += count
 
         # Por carrera (categoría del curso)
-        if access.course.category:
-            career = access.course.category.name
+        career = row['course__category__name']
+        if career:
             if hour < 12:
-                career_patterns[career]['morning'] += 1
+                career_patterns[career]['morning'] += count
             elif hour < 18:
-                career_patterns[career]['afternoon'] += 1
+                career_patterns[career]['afternoon'] += count
             else:
-                career_patterns[career]['night'] += 1
+                career_patterns[career]['night'] += count
 
     # Convertir a listas para template
     time_slot_data = [
-        {'slot': slot, 'count': count, 'percentage': round(count / len(accesses) * 100, 2) if len(accesses) > 0 else 0}
+        {'slot': slot, 'count': count, 'percentage': round(count / total_accesses * 100, 2) if total_accesses > 0 else 0}
         for slot, count in time_slots.items()
     ]
 
@@ -1382,13 +1457,14 @@ def engagement_patterns(request):
         'career_patterns': career_data,
         'peak_time_slot': peak_slot,
         'peak_weekday': peak_day,
-        'total_accesses': len(accesses),
+        'total_accesses': total_accesses,
         'days_analyzed': 90,
     }
     return render(request, 'analytics/engagement_patterns.html', context)
 
 
 @login_required
+@replica_reads
 def course_network(request):
     """Red de cursos relacionados - Qué cursos toman juntos los estudiantes"""
     from collections import defaultdict
@@ -1398,11 +1474,14 @@ def course_network(request):
     course_info = {}
 
     # Obtener estudiantes y sus cursos
-    students = MoodleUser.objects.all()[:300]  # Limitar para performance
+    students = _visible_users(request)[:300]  # Limitar para performance
+    courses = _course_filter(request)
 
     for student in students:
-        # Cursos en los que está inscrito
+        # Cursos en los que está inscrito (de la carrera elegida, si hay)
         enrollments = UserEnrolment.objects.filter(user=student).select_related('enrol__course')
+        if courses is not None:
+            enrollments = enrollments.filter(enrol__course__in=courses)
         student_courses = [e.enrol.course for e in enrollments if e.enrol.course.visible]
 
         # Crear pares de cursos
@@ -1415,6 +1494,7 @@ def course_network(request):
                 course_pairs[pair] += 1
 
     # Convertir a lista ordenada
+    enrolled = course_stats(list(course_info))
     network_data = []
     for (course1_id, course2_id), count in course_pairs.items():
         if count >= 3:  # Mínimo 3 estudiantes en común
@@ -1423,10 +1503,7 @@ def course_network(request):
 
             if course1 and course2:
                 # Calcular strength (normalizado)
-                max_enrolled = max(
-                    UserEnrolment.objects.filter(enrol__course=course1).count(),
-                    UserEnrolment.objects.filter(enrol__course=course2).count()
-                )
+                max_enrolled = max(enrolled.get(course1_id, 0), enrolled.get(course2_id, 0))
                 strength = (count / max_enrolled * 100) if max_enrolled > 0 else 0
 
                 network_data.append({
@@ -0,0 +1,216 @@
+"""
+Actividad semanal por (usuario, curso) como bitmap
+
+Las semanas se numeran desde el lunes WEEK_EPOCH (hora local) y se guardan en
+bloques de 64 (WeeklyActivity): el bit i de `weeks` es la semana
+64 * block + i. Cada carga de accesos (eventos en vivo, importación de
+últimos accesos, datos mock) prende los bits con OR: la tabla no pierde
+semanas, ni siquiera las de meses ya archivados.
+
+activity_window() lee una ventana de hasta 64 semanas en un solo recorrido y
+devuelve un uint64 por (usuario, curso), con el bit 0 en la primera semana.
+Semanas activas, rachas, constancia y activos por semana son operaciones de
+bits vectorizadas sobre ese arreglo, sin una consulta por usuario y semana.
+"""
+from datetime import date, datetime, time, timedelta
+from itertools import chain
+
+import numpy as np
+from django.utils import timezone
+
+from .models import AccessEvent, UserLastAccess, WeeklyActivity
+from .tenants import atomic, connection
+
+
+WEEK_EPOCH = date(1970, 1, 5)  # lunes
+BLOCK_WEEKS = 64
+
+CHUNK_SIZE = 20000
+
+
+def week_index(moment):
+    """Número de semana (local) de un instante"""
+    return (timezone.localtime(moment).date() - WEEK_EPOCH).days // 7
+
+
+def week_start(index):
+    """Lunes 00:00 (local) de la semana `index`"""
+    day = WEEK_EPOCH + timedelta(weeks=index)
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def week_numbers(seconds):
+    """Números de semana (local) de instantes en segundos desde epoch (arreglo)"""
+    tz = timezone.get_current_timezone()
+    seconds = np.asarray(seconds, dtype=np.int64)
+    # Desplazamiento de la zona horaria por día (pocos días distintos)
+    days, inverse = np.unique(seconds // 86400, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(int(day) * 86400 + 43200, tz).utcoffset().total_seconds()
+        for day in days
+    ], dtype=np.int64)[inverse]
+    local_days = (seconds + offsets) // 86400
+    return (local_days - (WEEK_EPOCH - date(1970, 1, 1)).days) // 7
+
+
+def week_blocks(weeks):
+    """(bloque, bit en int64) de cada número de semana, para escribir WeeklyActivity"""
+    weeks = np.asarray(weeks, dtype=np.int64)
+    bits = np.left_shift(np.uint64(1), (weeks % BLOCK_WEEKS).astype(np.uint64))
+    return weeks // BLOCK_WEEKS, bits.view(np.int64)
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+
+def record_activity_sql(select):
+    """
+    INSERT ... ON CONFLICT que prende las semanas de las filas de `select`
+    (columnas user_id, course_id, moment). Devuelve (sql, parámetros); sirve
+    como sentencia suelta o como CTE de otra.
+    """
+    table = WeeklyActivity._meta.db_table
+    return (
+        f'INSERT INTO {table} (user_id, course_id, block, weeks) '
+        f'SELECT user_id, course_id, week / {BLOCK_WEEKS}, '
+        f'bit_or(1::bigint << mod(week, {BLOCK_WEEKS})) '
+        f"FROM (SELECT user_id, course_id, ((moment AT TIME ZONE %s)::date - DATE '{WEEK_EPOCH}') / 7 "
+        f'AS week FROM ({select}) r) w '
+        f'GROUP BY 1, 2, 3 '
+        f'ON CONFLICT (user_id, course_id, block) DO UPDATE '
+        f'SET weeks = {table}.weeks | EXCLUDED.weeks'
+    ), [timezone.get_current_timezone_name()]
+
+
+def backfill_weekly_activity():
+    """
+    Prende las semanas de toda la bitácora que sigue en la base y de los
+    últimos accesos (para instalaciones con datos previos a la tabla).
+    Solo agrega bits: es seguro repetirlo. Devuelve las filas escritas.
+    """
+    written = 0
+    sources = [
+        f'SELECT user_id, course_id, timecreated AS moment FROM {AccessEvent._meta.db_table}',
+        f'SELECT user_id, course_id, timeaccess AS moment FROM {UserLastAccess._meta.db_table}',
+    ]
+    with atomic(), connection.cursor() as cursor:
+        for select in sources:
+            cursor.execute(*record_activity_sql(select))
+            written += cursor.rowcount
+    return written
+
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+def activity_window(first_week, weeks=BLOCK_WEEKS, courses=None, users=None):
+    """
+    Actividad de las semanas [first_week, first_week + weeks), weeks <= 64.
+
+    `courses` y `users` pueden ser querysets o iterables de ids. Devuelve
+    (user_ids, course_ids, bits) con un uint64 por (usuario, curso) que tuvo
+    actividad en la ventana; el bit i es la semana first_week + i.
+    """
+    if not 0 < weeks <= BLOCK_WEEKS:
+        raise ValueError(f'La ventana debe tener entre 1 y {BLOCK_WEEKS} semanas')
+    blocks = range(first_week // BLOCK_WEEKS, (first_week + weeks - 1) // BLOCK_WEEKS + 1)
+    rows = WeeklyActivity.objects.filter(block__in=list(blocks))
+    if courses is not None:
+        rows = rows.filter(course_id__in=courses)
+    if users is not None:
+        rows = rows.filter(user_id__in=users)
+    values = np.fromiter(
+        chain.from_iterable(
+            rows.values_list('user_id', 'course_id', 'block', 'weeks').iterator(chunk_size=CHUNK_SIZE)
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    user_ids, course_ids = values[:, 0], values[:, 1]
+
+    # Cada bloque se corre a su lugar en la ventana (a lo sumo dos bloques)
+    offsets = values[:, 2] * BLOCK_WEEKS - first_week
+    words = values[:, 3].view(np.uint64)
+    bits = np.where(
+        offsets >= 0,
+        np.left_shift(words, np.clip(offsets, 0, BLOCK_WEEKS - 1).astype(np.uint64)),
+        np.right_shift(words, np.clip(-offsets, 0, BLOCK_WEEKS - 1).astype(np.uint64)),
+    ) & _mask(weeks)
+
+    if len(blocks) > 1 and len(bits):
+        order = np.lexsort((course_ids, user_ids))
+        user_ids, course_ids, bits = user_ids[order], course_ids[order], bits[order]
+        starts = np.flatnonzero(np.r_[True, (user_ids[1:] != user_ids[:-1])
+                                      | (course_ids[1:] != course_ids[:-1])])
+        user_ids, course_ids = user_ids[starts], course_ids[starts]
+        bits = np.bitwise_or.reduceat(bits, starts)
+
+    active = bits != 0
+    return user_ids[active], course_ids[active], bits[active]
+
+
+def recent_weeks(weeks, until=None):
+    """Primera semana de una ventana de `weeks` semanas que termina en la de `until` (hoy)"""
+    return week_index(until or timezone.now()) - weeks + 1
+
+
+def _mask(weeks):
+    return np.uint64((1 << weeks) - 1)
+
+
+# ============================================================================
+# MÉTRICAS (sobre los bits de activity_window)
+# ============================================================================
+
+def active_weeks(bits):
+    """Semanas con actividad de cada fila"""
+    return np.bitwise_count(bits).astype(np.int64)
+
+
+def consistency(bits, weeks):
+    """Fracción de semanas de la ventana con actividad (0..1)"""
+    return active_weeks(bits) / weeks
+
+
+def longest_streak(bits):
+    """Racha más larga de semanas consecutivas con actividad de cada fila"""
+    streak = np.zeros(len(bits), dtype=np.int64)
+    current = np.asarray(bits, dtype=np.uint64).copy()
+    # Cada vuelta acorta todas las rachas en uno: a lo sumo 64 vueltas
+    while current.any():
+        streak += current != 0
+        current &= np.left_shift(current, np.uint64(1))
+    return streak
+
+
+def current_streak(bits, weeks):
+    """Semanas consecutivas con actividad que terminan en la última de la ventana"""
+    streak = np.zeros(len(bits), dtype=np.int64)
+    alive = np.ones(len(bits), dtype=bool)
+    for week in range(weeks - 1, -1, -1):
+        alive &= (np.right_shift(bits, np.uint64(week)) & np.uint64(1)).astype(bool)
+        if not alive.any():
+            break
+        streak += alive
+    return streak
+
+
+def weekly_active_counts(bits, weeks):
+    """Filas con actividad en cada semana de la ventana (arreglo de `weeks`)"""
+    return np.array([
+        np.count_nonzero(bits & np.uint64(1 << week)) for week in range(weeks)
+    ], dtype=np.int64)
+
+
+def weekly_counts_by(keys, bits, weeks):
+    """
+    Filas con actividad por semana agrupadas por `keys` (p. ej. course_ids
+    para usuarios activos por curso). Devuelve (claves, matriz claves × semanas).
+    """
+    unique, index = np.unique(keys, return_inverse=True)
+    counts = np.zeros((len(unique), weeks), dtype=np.int64)
+    for week in range(weeks):
+        active = (np.right_shift(bits, np.uint64(week)) & np.uint64(1)).astype(np.int64)
+        counts[:, week] = np.bincount(index, weights=active, minlength=len(unique))
+    return unique, counts
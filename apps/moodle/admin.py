@@ -4,7 +4,8 @@ Admin interface para los modelos de Moodle
 from django.contrib import admin
 from .models import (
     Category, Course, MoodleUser, Group, GroupMember,
-    Enrol, UserEnrolment, UserLastAccess, Role, RoleAssignment
+    Enrol, UserEnrolment, UserLastAccess, Role, RoleAssignment,
+    SyncWatermark, WeeklyNeverAccess
 )
 
 
@@ -17,8 +18,8 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ['shortname', 'fullname', 'category', 'startdate', 'visible']
-    list_filter = ['category', 'visible', 'startdate']
+    list_display = ['shortname', 'fullname', 'category', 'academic_year', 'semester', 'startdate', 'visible']
+    list_filter = ['category', 'visible', 'academic_year', 'semester', 'startdate']
     search_fields = ['shortname', 'fullname']
     date_hierarchy = 'startdate'
 
@@ -81,3 +82,16 @@ class RoleAssignmentAdmin(admin.ModelAdmin):
     list_filter = ['role', 'course', 'timecreated']
     search_fields = ['user__username', 'user__lastname', 'role__name', 'course__shortname']
     date_hierarchy = 'timecreated'
+
+
+@admin.register(WeeklyNeverAccess)
+class WeeklyNeverAccessAdmin(admin.ModelAdmin):
+    list_display = ['group', 'course', 'week_start', 'never', 'total_group', 'computed_at']
+    list_filter = ['course', 'week_start']
+    search_fields = ['group__name', 'course__shortname']
+    date_hierarchy = 'week_start'
+
+
+@admin.register(SyncWatermark)
+class SyncWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['source', 'value', 'updated_at', 'reconciled_at']
@@ -5,3 +5,6 @@ class MoodleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.moodle'
     verbose_name = 'Datos de Moodle'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,245 @@
+"""
+Archivo en frío de la bitácora de accesos
+
+Los meses más viejos que ACCESS_ARCHIVE_AFTER_MONTHS se pasan de su partición
+de PostgreSQL a un archivo columnar comprimido por mes (.npz: user, course,
+role y time en microsegundos desde epoch, ordenado por tiempo) y la partición
+se elimina. Un manifest.json en el mismo directorio registra cada mes
+archivado; el cubo de accesos (cube.py) agrega los meses archivados y
+events_between() del snapshot (snapshot.py) los suma en su rango, así las
+tablas y sus índices quedan con el período en curso y las comparaciones
+históricas siguen funcionando.
+
+La partición primero se separa de la tabla y se renombra (<partición>
+__archiving): si el proceso se corta, la próxima corrida la retoma. Si llegan
+eventos tardíos para un mes archivado se vuelve a crear su partición; al
+archivarlo otra vez se agregan al archivo existente.
+"""
+import hashlib
+import json
+import os
+from datetime import date, datetime, timezone as dt_timezone
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from . import partitions
+from .models import AccessEvent
+from .tenants import atomic, connection, tenant_path
+
+
+MANIFEST_NAME = 'manifest.json'
+DETACHED_SUFFIX = '__archiving'
+ARCHIVE_COLUMNS = ('user', 'course', 'role', 'time')
+ARCHIVE_FETCH_SIZE = 100000
+
+# Meses archivados que se mantienen descomprimidos en memoria por proceso
+ARCHIVE_CACHE_MONTHS = 6
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_micros(moment):
+    """Microsegundos desde epoch de un datetime con zona horaria"""
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def archive_dir():
+    return tenant_path(settings.ACCESS_ARCHIVE_DIR)
+
+
+def archive_filename(month):
+    return f'access_events_{month:%Y_%m}.npz'
+
+
+def load_manifest():
+    """{'YYYY-MM': {'file', 'rows', 'sha256', 'archived_at'}} de los meses archivados"""
+    path = archive_dir() / MANIFEST_NAME
+    if not path.is_file():
+        return {}
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _save_manifest(manifest):
+    directory = archive_dir()
+    partial = directory / f'{MANIFEST_NAME}.partial'
+    with open(partial, 'w', encoding='utf-8') as fh:
+        json.dump(dict(sorted(manifest.items())), fh, indent=2)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(partial, directory / MANIFEST_NAME)
+
+
+def archived_months():
+    return {date.fromisoformat(f'{key}-01') for key in load_manifest()}
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=ARCHIVE_CACHE_MONTHS)
+def _read_file(path, mtime):
+    with np.load(path) as data:
+        return {column: data[column] for column in ARCHIVE_COLUMNS}
+
+
+def read_month(month):
+    """Columnas de un mes archivado (dict de arrays) o None si no está archivado"""
+    entry = load_manifest().get(f'{month:%Y-%m}')
+    if entry is None:
+        return None
+    path = archive_dir() / entry['file']
+    return _read_file(str(path), path.stat().st_mtime_ns)
+
+
+def archived_events(start, end, course_ids=None, months=None):
+    """
+    Columnas de los accesos archivados en [start, end), opcionalmente solo de
+    ciertos cursos o de ciertos meses (`months`, fechas del día 1); None si
+    ningún mes del rango está archivado.
+    """
+    months = archived_months() if months is None else archived_months() & set(months)
+    wanted = [month for month in partitions.iter_months(start, end) if month in months]
+    if not wanted:
+        return None
+
+    start_us, end_us = to_micros(start), to_micros(end)
+    chunks = []
+    for month in wanted:
+        data = read_month(month)
+        times = data['time']
+        # Ordenado por tiempo: el rango es un corte
+        low, high = np.searchsorted(times, [start_us, end_us])
+        chunk = {column: data[column][low:high] for column in ARCHIVE_COLUMNS}
+        if course_ids is not None:
+            keep = np.isin(chunk['course'], np.fromiter(course_ids, dtype=np.int64))
+            chunk = {column: values[keep] for column, values in chunk.items()}
+        chunks.append(chunk)
+    return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in ARCHIVE_COLUMNS}
+
+
+def _fetch_partition(name):
+    """Lee una partición completa a arrays, por bloques con un cursor del servidor"""
+    columns = {column: [] for column in ARCHIVE_COLUMNS}
+    with atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f'SELECT user_id, course_id, coalesce(role_id, 0), '
+            f'(extract(epoch FROM timecreated) * 1000000)::bigint FROM {name}'
+        )
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_FETCH_SIZE)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.int64)
+            for index, column in enumerate(ARCHIVE_COLUMNS):
+                columns[column].append(block[:, index])
+    return {
+        column: np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        for column, parts in columns.items()
+    }
+
+
+def archive_month(month):
+    """
+    Pasa un mes de la base a su archivo y elimina la partición.
+
+    Devuelve la cantidad de filas archivadas de la base.
+    """
+    name = partitions.partition_name(month)
+    detached = f'{name}{DETACHED_SUFFIX}'
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {AccessEvent._meta.db_table} DETACH PARTITION {name}')
+        cursor.execute(f'ALTER TABLE {name} RENAME TO {detached}')
+    partitions.forget_partition(month)
+    return archive_detached(detached, month)
+
+
+def archive_detached(table, month):
+    """
+    Vuelca una partición ya separada a su archivo y la elimina.
+
+    El archivo y el manifest quedan escritos y verificados antes de borrarla.
+    """
+    data = _fetch_partition(table)
+    rows = len(data['time'])
+
+    previous = read_month(month)
+    if previous is None and not rows:
+        _drop_table(table)
+        return 0
+    if previous is not None:
+        data = {column: np.concatenate([previous[column], data[column]]) for column in ARCHIVE_COLUMNS}
+    order = np.argsort(data['time'], kind='stable')
+    data = {
+        'user': data['user'][order],
+        'course': data['course'][order],
+        'role': data['role'][order].astype(np.int32),
+        'time': data['time'][order],
+    }
+
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    filename = archive_filename(month)
+    partial = directory / f'{filename}.partial'
+    with open(partial, 'wb') as fh:
+        np.savez_compressed(fh, **data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    with np.load(partial) as check:
+        if len(check['time']) != len(data['time']):
+            raise RuntimeError(f'El archivo de {month:%Y-%m} no se verificó')
+    os.replace(partial, directory / filename)
+
+    manifest = load_manifest()
+    manifest[f'{month:%Y-%m}'] = {
+        'file': filename,
+        'rows': int(len(data['time'])),
+        'sha256': _file_digest(directory / filename),
+        'archived_at': timezone.now().isoformat(timespec='seconds'),
+    }
+    _save_manifest(manifest)
+
+    _drop_table(table)
+    return rows
+
+
+def _drop_table(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {table}')
+
+
+def pending_detached():
+    """(tabla, mes) de particiones separadas por una corrida que no terminó"""
+    prefix = f'{AccessEvent._meta.db_table}_'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE %s ORDER BY relname",
+            [f'{prefix}%{DETACHED_SUFFIX}'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return [
+        (name, datetime.strptime(name[len(prefix):-len(DETACHED_SUFFIX)], '%Y_%m').date())
+        for name in names
+    ]
+
+
+def archivable_months(older_than_months=None):
+    """Meses con partición en la base anteriores al horizonte de archivo"""
+    if older_than_months is None:
+        older_than_months = settings.ACCESS_ARCHIVE_AFTER_MONTHS
+    horizon = partitions.add_months(partitions.month_start(timezone.now()), -older_than_months)
+    return [
+        month for month in (
+            date.fromisoformat(lower[:10]) for _, lower, _, _ in partitions.list_partitions()
+        )
+        if month < horizon
+    ]
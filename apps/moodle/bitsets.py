@@ -0,0 +1,164 @@
+"""
+Índice de pertenencia con bitmaps
+
+Cada usuario recibe una posición densa (0..N-1) y cada grupo y cada curso se
+representa como un bitmap empaquetado de N bits (np.packbits). Las
+intersecciones grupo ∩ inscriptos pasan a ser AND/ANDNOT sobre arreglos de
+N/8 bytes, sin armar sets de Python en cada request.
+
+Las listas de miembros se guardan en formato CSR (claves ordenadas, offsets y
+posiciones) y los bitmaps se arman a demanda. El índice se reconstruye
+cuando cambia la versión de datos (apps.moodle.cache); con una réplica
+atrasada no hay índice y los reportes usan consultas SQL puntuales.
+"""
+from itertools import chain
+
+import numpy as np
+
+from .cache import data_version
+from .models import GroupMember, MoodleUser, UserEnrolment
+from .replicas import reads_current_data
+from .tenants import current_tenant
+
+
+CHUNK_SIZE = 20000
+
+# Máxima cantidad de bitmaps materializados que se conservan por índice
+BITMAP_CACHE_SIZE = 4096
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def bitmap_and(*bitmaps):
+    """Intersección de bitmaps"""
+    return np.bitwise_and.reduce(bitmaps)
+
+
+def bitmap_andnot(left, right):
+    """Elementos de `left` que no están en `right`"""
+    return left & ~right
+
+
+def popcount(bitmap):
+    """Cantidad de bits encendidos"""
+    return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+
+def _pairs(queryset):
+    """Lee pares (clave, user_id) en un arreglo N×2 sin materializar tuplas"""
+    values = np.fromiter(
+        chain.from_iterable(queryset.iterator(chunk_size=CHUNK_SIZE)), dtype=np.int64
+    )
+    return values.reshape(-1, 2)
+
+
+class _Csr:
+    """Listas de posiciones por clave: claves ordenadas + offsets"""
+
+    def __init__(self, keys, positions):
+        order = np.lexsort((positions, keys))
+        keys, positions = keys[order], positions[order]
+        self.keys, starts = np.unique(keys, return_index=True)
+        self.indptr = np.append(starts, len(keys))
+        self.positions = positions
+
+    def get(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.positions[:0]
+        return self.positions[self.indptr[i]:self.indptr[i + 1]]
+
+
+class MembershipIndex:
+    """Bitmaps de usuarios por grupo y por curso (inscriptos)"""
+
+    def __init__(self, user_ids, group_pairs, enrolment_pairs):
+        self.user_ids = np.sort(np.asarray(user_ids, dtype=np.int64))
+        self.size = len(self.user_ids)
+        self.nbytes = (self.size + 7) // 8
+        self._groups = self._csr(group_pairs)
+        self._courses = self._csr(enrolment_pairs)
+        self._bitmaps = {}
+
+    def _csr(self, pairs):
+        positions, known = self.positions(pairs[:, 1])
+        return _Csr(pairs[known, 0], positions[known])
+
+    @classmethod
+    def build(cls):
+        """Lee usuarios, miembros de grupos e inscripciones (tres consultas)"""
+        user_ids = np.fromiter(
+            MoodleUser.objects.values_list('id', flat=True).iterator(chunk_size=CHUNK_SIZE),
+            dtype=np.int64,
+        )
+        group_pairs = _pairs(GroupMember.objects.values_list('group_id', 'user_id'))
+        enrolment_pairs = _pairs(
+            UserEnrolment.objects.values_list('enrol__course_id', 'user_id').distinct()
+        )
+        return cls(user_ids, group_pairs, enrolment_pairs)
+
+    def positions(self, user_ids):
+        """Posiciones densas de los ids y máscara de los que existen en el índice"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        positions = np.searchsorted(self.user_ids, user_ids)
+        known = positions < self.size
+        known[known] = self.user_ids[positions[known]] == user_ids[known]
+        return positions, known
+
+    def _pack(self, positions):
+        bits = np.zeros(self.nbytes * 8, dtype=bool)
+        bits[positions] = True
+        return np.packbits(bits)
+
+    def bitmap(self, user_ids):
+        """Bitmap de un conjunto arbitrario de ids (los desconocidos se ignoran)"""
+        positions, known = self.positions(np.fromiter(user_ids, dtype=np.int64))
+        return self._pack(positions[known])
+
+    def _bitmap(self, kind, csr, key):
+        cache_key = (kind, key)
+        bitmap = self._bitmaps.get(cache_key)
+        if bitmap is None:
+            bitmap = self._pack(csr.get(key))
+            if len(self._bitmaps) >= BITMAP_CACHE_SIZE:
+                self._bitmaps.clear()
+            self._bitmaps[cache_key] = bitmap
+        return bitmap
+
+    def group(self, group_id):
+        """Bitmap de los miembros del grupo"""
+        return self._bitmap('group', self._groups, group_id)
+
+    def course(self, course_id):
+        """Bitmap de los inscriptos al curso"""
+        return self._bitmap('course', self._courses, course_id)
+
+    def targets(self, course_id, group_id):
+        """Miembros del grupo que están inscriptos al curso"""
+        return bitmap_and(self.group(group_id), self.course(course_id))
+
+    def ids(self, bitmap):
+        """Ids de usuario de los bits encendidos"""
+        positions = np.flatnonzero(np.unpackbits(bitmap)[:self.size])
+        return self.user_ids[positions]
+
+
+# {institución: (versión de datos, índice)}
+_index_cache = {}
+
+
+def membership_index():
+    """
+    Índice del proceso, reconstruido si cambió la versión de datos.
+
+    None si las lecturas van a una réplica atrasada: la versión es la del
+    primario y armarlo en cada request recorrería usuarios, grupos e
+    inscripciones completos.
+    """
+    if not reads_current_data():
+        return None
+    version = data_version()
+    cached = _index_cache.get(current_tenant())
+    if cached is None or cached[0] != version:
+        cached = _index_cache[current_tenant()] = (version, MembershipIndex.build())
+    return cached[1]
@@ -0,0 +1,145 @@
+"""
+Reporte masivo de usuarios sin acceso para un árbol de categorías
+
+El trabajo se reparte por curso entre procesos (ProcessPoolExecutor); cada
+proceso abre su propia conexión a la base de datos.
+"""
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .categories import descendant_ids
+from .models import Category, Course
+from .reports import calculate_course_matrix, iter_periods, normalize_granularity
+from .tenants import activate_tenant, current_tenant, tenant_path
+
+
+FACULTY_REPORT_PREFIX = 'faculty_'
+
+
+def resolve_category(spec):
+    """
+    Busca una categoría por id o por ruta de nombres ("Grado/Ingeniería").
+
+    Devuelve None si no existe.
+    """
+    spec = str(spec).strip().strip('/')
+    if spec.isdigit():
+        return Category.objects.filter(id=int(spec)).first()
+
+    category = None
+    for name in [part.strip() for part in spec.split('/') if part.strip()]:
+        candidates = Category.objects.filter(name__iexact=name)
+        candidates = candidates.filter(parent=category) if category else candidates
+        category = candidates.order_by('depth', 'id').first()
+        if category is None:
+            return None
+    return category
+
+
+def course_report_rows(course_id, from_ts, to_ts, granularity):
+    """Filas (curso, grupo, integrantes, serie) de un curso; corre en el worker"""
+    tz = timezone.get_current_timezone()
+    from_date = datetime.fromtimestamp(from_ts, tz=tz)
+    to_date = datetime.fromtimestamp(to_ts, tz=tz)
+
+    course = Course.objects.get(id=course_id)
+    matrix = calculate_course_matrix(course, from_date, to_date, granularity)
+    return [
+        [course.shortname, course.fullname, row['group'].name, row['total_group'], *row['never']]
+        for row in matrix['rows']
+    ]
+
+
+def iter_faculty_rows(course_ids, from_date, to_date, granularity, workers=1):
+    """
+    Genera las filas del reporte, curso por curso y en orden.
+
+    Con workers > 1 los cursos se calculan en procesos separados.
+    """
+    args = [
+        (course_id, from_date.timestamp(), to_date.timestamp(), granularity)
+        for course_id in course_ids
+    ]
+
+    if workers <= 1:
+        for arg in args:
+            yield from course_report_rows(*arg)
+        return
+
+    # Los procesos se crean con fork (Django ya inicializado); las conexiones
+    # se cierran antes para que cada worker abra la suya y no comparta sockets
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=activate_tenant, initargs=(current_tenant(),)) as executor:
+        chunksize = max(1, len(args) // (workers * 4))
+        for rows in executor.map(course_report_rows, *zip(*args), chunksize=chunksize):
+            yield from rows
+
+
+def write_faculty_report(category, from_date, to_date, granularity='week', workers=1,
+                         output=None):
+    """
+    Escribe el CSV (UTF-8 con BOM) del reporte de toda la categoría.
+
+    Devuelve (ruta, cantidad de cursos).
+    """
+    granularity = normalize_granularity(granularity)
+    course_ids = list(
+        Course.objects.filter(visible=True, category_id__in=descendant_ids([category.id]))
+        .order_by('shortname')
+        .values_list('id', flat=True)
+    )
+    labels = [label for _, _, label in iter_periods(from_date, to_date, granularity)]
+
+    if output is None:
+        directory = reports_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        output = directory / (
+            f'{FACULTY_REPORT_PREFIX}{category.id}_'
+            f'{from_date:%Y%m%d}_{to_date:%Y%m%d}_{granularity}.csv'
+        )
+
+    # Se escribe aparte y se renombra: nunca se descarga un archivo a medias
+    partial = f'{output}.partial'
+    with open(partial, 'w', newline='', encoding='utf-8-sig') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['Código', 'Curso', 'Grupo', 'Integrantes', *labels])
+        for row in iter_faculty_rows(course_ids, from_date, to_date, granularity, workers):
+            writer.writerow(row)
+    os.replace(partial, output)
+
+    return output, len(course_ids)
+
+
+def reports_dir():
+    """Directorio de reportes de la institución actual"""
+    return tenant_path(settings.REPORTS_DIR)
+
+
+def list_faculty_reports():
+    """Reportes generados disponibles para descarga, más recientes primero"""
+    directory = reports_dir()
+    if not directory.is_dir():
+        return []
+
+    files = [
+        path for path in directory.glob(f'{FACULTY_REPORT_PREFIX}*.csv')
+        if path.is_file()
+    ]
+    files.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    return [
+        {
+            'name': path.name,
+            'size_kb': round(path.stat().st_size / 1024, 1),
+            'modified': datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.get_current_timezone()),
+        }
+        for path in files
+    ]
@@ -0,0 +1,38 @@
+"""
+Caché versionada de datos derivados de Moodle
+
+Cada carga o modificación de cursos incrementa la versión de datos; las
+claves incluyen la versión, así que lo cacheado antes queda obsoleto sin
+tener que borrar nada. Cada institución tiene su propia versión.
+"""
+import time
+
+from django.core.cache import cache
+
+from .replicas import reads_current_data
+from .tenants import current_tenant
+
+
+DATA_VERSION_CACHE_KEY = 'moodle:data_version'
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key():
+    return f'{DATA_VERSION_CACHE_KEY}:{current_tenant()}'
+
+
+def data_version():
+    """Versión actual de los datos de la institución (compartida entre procesos)"""
+    return cache.get_or_set(_version_key(), time.time_ns(), None)
+
+
+def bump_data_version():
+    """Invalida todo lo cacheado con cached_by_version()"""
+    cache.set(_version_key(), time.time_ns(), None)
+
+
+def cached_by_version(key, builder, timeout=DEFAULT_TIMEOUT):
+    """Devuelve builder() cacheado bajo `key` para la versión de datos actual"""
+    if not reads_current_data():
+        return builder()
+    return cache.get_or_set(f'{key}:{current_tenant()}:v{data_version()}', builder, timeout)
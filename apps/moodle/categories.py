@@ -0,0 +1,152 @@
+"""
+Árbol de categorías: tabla de clausura y caché en proceso
+
+- descendant_ids(): todas las descendientes en una sola consulta indexada
+  sobre CategoryClosure (sin recorrer el árbol ni usar path__startswith).
+- category_tree(): árbol completo en memoria, invalidado por versión cuando
+  cambia alguna categoría (o por el latido de la réplica atrasada que se lee).
+"""
+import time
+
+from django.core.cache import cache
+from .models import Category, CategoryClosure
+from .replicas import replica_data_version
+from .tenants import atomic, current_tenant
+
+
+VERSION_CACHE_KEY = 'moodle:category_tree_version'
+
+# {(institución, de réplica atrasada): (versión, árbol)}
+_tree_cache = {}
+
+
+def bump_category_version():
+    """Invalida el árbol cacheado (en este y en los demás procesos)"""
+    cache.set(f'{VERSION_CACHE_KEY}:{current_tenant()}', time.time_ns(), None)
+
+
+def _current_version():
+    return cache.get_or_set(f'{VERSION_CACHE_KEY}:{current_tenant()}', time.time_ns(), None)
+
+
+def _build_tree():
+    nodes = {
+        row['id']: {**row, 'children': []}
+        for row in Category.objects.order_by('path', 'name')
+        .values('id', 'name', 'parent_id', 'depth')
+    }
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        if parent is not None:
+            parent['children'].append(node['id'])
+    return nodes
+
+
+def category_tree():
+    """
+    Árbol de categorías cacheado en el proceso.
+
+    Devuelve {id: {'id', 'name', 'parent_id', 'depth', 'children': [ids]}}.
+    """
+    version = replica_data_version()
+    slot = (current_tenant(), version is not None)
+    if version is None:
+        version = _current_version()
+    cached = _tree_cache.get(slot)
+    if cached is None or cached[0] != version:
+        cached = _tree_cache[slot] = (version, _build_tree())
+    return cached[1]
+
+
+def category_choices():
+    """Lista (id, nombre indentado) en orden de árbol, para selectores"""
+    tree = category_tree()
+    choices = []
+
+    def visit(node_id, level):
+        node = tree[node_id]
+        choices.append((node_id, f"{'— ' * level}{node['name']}"))
+        for child_id in node['children']:
+            visit(child_id, level + 1)
+
+    for node_id, node in tree.items():
+        if node['parent_id'] not in tree:
+            visit(node_id, 0)
+    return choices
+
+
+def category_ids_named(name):
+    """Ids de las categorías con ese nombre (sin distinguir mayúsculas)"""
+    name = name.strip().lower()
+    return [node_id for node_id, node in category_tree().items() if node['name'].lower() == name]
+
+
+def descendant_ids(category_ids, include_self=True):
+    """Ids de las categorías dadas y todas sus descendientes (una consulta)"""
+    links = CategoryClosure.objects.filter(ancestor_id__in=list(category_ids))
+    if not include_self:
+        links = links.filter(depth__gt=0)
+    return set(links.values_list('descendant_id', flat=True))
+
+
+def add_category_links(category):
+    """Agrega las filas de clausura de una categoría recién creada"""
+    links = [CategoryClosure(ancestor_id=category.id, descendant_id=category.id, depth=0)]
+    if category.parent_id:
+        links += [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.id, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(descendant_id=category.parent_id)
+            .values_list('ancestor_id', 'depth')
+        ]
+    CategoryClosure.objects.bulk_create(links, ignore_conflicts=True)
+
+
+def move_category_links(category):
+    """Reubica el subárbol de una categoría cuyo padre cambió"""
+    subtree = dict(
+        CategoryClosure.objects.filter(ancestor_id=category.id).values_list('descendant_id', 'depth')
+    )
+    with atomic():
+        # Desvincular el subárbol de sus ancestros anteriores
+        CategoryClosure.objects.filter(descendant_id__in=subtree).exclude(
+            ancestor_id__in=subtree
+        ).delete()
+
+        if category.parent_id:
+            new_ancestors = CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list('ancestor_id', 'depth')
+            CategoryClosure.objects.bulk_create([
+                CategoryClosure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + 1 + descendant_depth,
+                )
+                for ancestor_id, ancestor_depth in new_ancestors
+                for descendant_id, descendant_depth in subtree.items()
+            ], ignore_conflicts=True)
+
+
+def rebuild_category_closure():
+    """
+    Reconstruye toda la tabla de clausura desde los punteros parent.
+
+    Para cargas masivas que no disparan señales (COPY, bulk_create).
+    """
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        seen = set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(CategoryClosure(
+                ancestor_id=ancestor_id, descendant_id=category_id, depth=depth
+            ))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    with atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(links, batch_size=5000)
+    bump_category_version()
+    return len(links)
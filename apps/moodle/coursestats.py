@@ -0,0 +1,56 @@
+"""
+Conteos por curso y totales de la institución mantenidos por la base
+
+CourseStats (inscriptos, usuarios con acceso, grupos y miembros de cada curso)
+y la fila única de SystemStats se actualizan con triggers por sentencia de
+PostgreSQL (migración 0013) sobre inscripciones, últimos accesos, grupos,
+miembros, cursos y usuarios. Cada INSERT, UPDATE, DELETE, COPY o TRUNCATE
+suma o resta sus filas en la misma transacción, venga del ORM, de la
+importación o de load_mock_data: las vistas leen los valores en lugar de
+contar.
+
+Las recargas con tablas sombra reemplazan las tablas (y con ellas sus
+triggers): shadow.py los vuelve a crear y llama a refresh_course_stats()
+dentro del intercambio.
+"""
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+from .models import CourseStats, SystemStats
+from .tenants import atomic, connection
+
+
+# {anotación: campo de CourseStats}; los nombres evitan los de las relaciones del curso
+COURSE_STAT_FIELDS = {
+    'enrolled_count': 'enrolled',
+    'access_count': 'accesses',
+    'group_count': 'groups',
+    'member_count': 'members',
+}
+
+SYSTEM_STAT_FIELDS = ('users', 'courses', 'groups', 'accesses')
+
+
+def refresh_course_stats():
+    """Recalcula todos los conteos desde las tablas (tras recargas o para corregir)"""
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT moodle_coursestats_refresh()')
+
+
+def with_course_stats(courses):
+    """Anota los conteos de COURSE_STAT_FIELDS (0 si el curso no tiene fila) a un queryset de cursos"""
+    return courses.annotate(**{
+        name: Coalesce(F(f'stats__{field}'), Value(0))
+        for name, field in COURSE_STAT_FIELDS.items()
+    })
+
+
+def course_stats(course_ids, field='enrolled'):
+    """{id de curso: valor de `field`} de ciertos cursos"""
+    return dict(CourseStats.objects.filter(course_id__in=course_ids).values_list('course_id', field))
+
+
+def system_totals():
+    """Totales de la institución ({campo: valor}; ceros si la fila todavía no existe)"""
+    row = SystemStats.objects.filter(pk=1).values(*SYSTEM_STAT_FIELDS).first()
+    return row or dict.fromkeys(SYSTEM_STAT_FIELDS, 0)
@@ -0,0 +1,360 @@
+"""
+Cubo de roll-up de la bitácora de accesos
+
+AccessCube guarda cantidades de accesos por (curso, grupo, rol, fecha, hora)
+en hora local. roll_up_access_cube() suma los eventos posteriores a una marca
+de agua (el mayor id ya agregado, en SyncWatermark) y corre después de cada
+carga: volcados de eventos en vivo, importaciones y load_mock_data; la
+primera vez (o con rebuild_access_cube) también agrega los meses ya
+archivados. Archivar un mes no toca el cubo: sus celdas quedan.
+
+El trabajo se hace por tramos (ROLLUP_CHUNK_EVENTS ids o un mes archivado),
+cada uno en su transacción y guardando su marca de agua: la primera corrida
+sobre una bitácora grande no carga todo en memoria ni retiene el lock que
+esperan los volcados de eventos.
+
+cube_counts() responde cualquier corte (por curso, grupo, rol, carrera,
+fecha, día de semana, hora, semana o mes) y rango de días desde miles de
+celdas, en lugar de recorrer millones de eventos.
+
+La misma corrida une los usuarios de cada (curso, día) a un sketch
+HyperLogLog (AccessSketch): unique_users() estima los usuarios distintos
+de cualquier rango y conjunto de cursos uniendo sketches, cosa que no se
+puede con conteos (los distintos de dos semanas no se suman).
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+
+from .archive import load_manifest, read_month
+from .hll import count_by, sketches_by, union_by
+from .models import AccessCube, AccessEvent, AccessSketch, Group, GroupMember, SyncWatermark
+from .snapshot import table_columns
+from .tenants import atomic, connection
+
+
+CUBE_SOURCE = 'access_cube'  # SyncWatermark.source
+# Último mes archivado agregado (aaaamm) mientras CUBE_SOURCE no existe
+CUBE_ARCHIVE_SOURCE = 'access_cube_archive'
+CUBE_SOURCES = (CUBE_SOURCE, CUBE_ARCHIVE_SOURCE)
+ROLLUP_LOCK_KEY = 'apps.moodle.cube'
+
+HOUR_MICROS = 3600 * 1_000_000
+# Ids de eventos por tramo (y transacción) del roll-up
+ROLLUP_CHUNK_EVENTS = 200_000
+# Sketches por sentencia al guardarlos
+SKETCH_CHUNK = 20000
+
+# Dimensiones derivadas de la fecha; el resto son campos del cubo o relacionados.
+# Se calculan en Python sobre los totales por fecha: agrupar por una expresión
+# obliga a PostgreSQL a ordenar todas las celdas del rango
+DIMENSIONS = {
+    'weekday': lambda day: day.weekday(),  # 0=Lunes..6
+    'week': lambda day: day - timedelta(days=day.weekday()),
+    'month': lambda day: day.replace(day=1),
+}
+
+
+def _upsert_sql(select):
+    """INSERT ... ON CONFLICT que suma las celdas de `select` (course_id, group_id, role_id, date, hour, count)"""
+    table = AccessCube._meta.db_table
+    return (
+        f'INSERT INTO {table} AS c (course_id, group_id, role_id, date, hour, count) {select} '
+        f'ON CONFLICT (course_id, group_id, role_id, date, hour) '
+        f'DO UPDATE SET count = c.count + EXCLUDED.count'
+    )
+
+
+def _rollup_sql():
+    """Celdas de los eventos con id en (desde, hasta]; grupo de los miembros de esos usuarios"""
+    events = AccessEvent._meta.db_table
+    return _upsert_sql(
+        f'SELECT e.course_id, pg.group_id, e.role_id, e.date, e.hour, sum(e.n) FROM ('
+        f'  SELECT user_id, course_id, role_id, (timecreated AT TIME ZONE %s)::date AS date, '
+        f'  extract(hour FROM timecreated AT TIME ZONE %s)::int AS hour, count(*) AS n '
+        f'  FROM {events} WHERE id > %s AND id <= %s GROUP BY 1, 2, 3, 4, 5'
+        f') e LEFT JOIN ('
+        f'  SELECT gm.user_id, g.course_id, min(gm.group_id) AS group_id '
+        f'  FROM {GroupMember._meta.db_table} gm JOIN {Group._meta.db_table} g ON g.id = gm.group_id '
+        f'  WHERE gm.user_id IN (SELECT user_id FROM {events} WHERE id > %s AND id <= %s) '
+        f'  GROUP BY 1, 2'
+        f') pg ON pg.user_id = e.user_id AND pg.course_id = e.course_id '
+        f'GROUP BY 1, 2, 3, 4, 5'
+    )
+
+
+def _users_sql():
+    """(curso, ordinal de la fecha local, usuario) distintos de los eventos con id en (desde, hasta]"""
+    return (
+        f"SELECT DISTINCT course_id, (timecreated AT TIME ZONE %s)::date - date '0001-01-01' + 1, user_id "
+        f'FROM {AccessEvent._meta.db_table} WHERE id > %s AND id <= %s'
+    )
+
+
+# ============================================================================
+# CONSTRUCCIÓN
+# ============================================================================
+
+def roll_up_access_cube():
+    """
+    Suma al cubo los eventos de la bitácora posteriores a la marca de agua.
+
+    Devuelve la cantidad de eventos agregados (incluidos los archivados en la
+    primera corrida). Es seguro llamarla en paralelo: los tramos se turnan.
+    """
+    events = AccessEvent._meta.db_table
+    # Los escritores en curso terminan antes de leer el máximo: después no
+    # puede aparecer un id menor sin agregar
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {events} IN SHARE MODE')
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {events}')
+        high = cursor.fetchone()[0]
+
+    added = 0
+    while True:
+        with atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [ROLLUP_LOCK_KEY])
+            if not SyncWatermark.objects.filter(source=CUBE_SOURCE).exists():
+                # Primera corrida: los meses archivados antes que la bitácora
+                added += _roll_up_next_archive(cursor)
+                continue
+            watermark = SyncWatermark.objects.get(source=CUBE_SOURCE)
+            if watermark.value >= high:
+                return added
+            upper = min(high, watermark.value + ROLLUP_CHUNK_EVENTS)
+            added += _roll_up_events(cursor, watermark.value, upper)
+            watermark.value = upper
+            watermark.save(update_fields=['value', 'updated_at'])
+
+
+def _roll_up_events(cursor, low, high):
+    """Suma al cubo y a los sketches los eventos con id en (low, high]; devuelve cuántos son"""
+    events = AccessEvent._meta.db_table
+    tz = timezone.get_current_timezone_name()
+    cursor.execute(f'SELECT count(*) FROM {events} WHERE id > %s AND id <= %s', [low, high])
+    count = cursor.fetchone()[0]
+    if count:
+        cursor.execute(_rollup_sql(), [tz, tz, low, high, low, high])
+        cursor.execute(_users_sql(), [tz, low, high])
+        rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+        _add_sketches(cursor, rows[:, 0], rows[:, 1], rows[:, 2])
+    return count
+
+
+def rebuild_access_cube():
+    """Vacía el cubo y lo vuelve a armar desde la bitácora y los meses archivados"""
+    with atomic():
+        AccessCube.objects.all().delete()
+        AccessSketch.objects.all().delete()
+        SyncWatermark.objects.filter(source__in=CUBE_SOURCES).delete()
+    return roll_up_access_cube()
+
+
+def _primary_groups():
+    """(claves usuario·curso ordenadas, grupo de menor id) de todos los miembros"""
+    members = table_columns('members')
+    keys = _pair_keys(members['user'], members['course'])
+    order = np.lexsort((members['group'], keys))
+    keys, groups = keys[order], np.asarray(members['group'], dtype=np.int64)[order]
+    first = np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.empty(0, dtype=bool)
+    return keys[first], groups[first]
+
+
+def _pair_keys(users, courses):
+    return (np.asarray(users, dtype=np.int64) << 32) | np.asarray(courses, dtype=np.int64)
+
+
+def _local_date_hours(micros):
+    """(ordinal de la fecha local, hora local) de instantes en microsegundos"""
+    tz = timezone.get_current_timezone()
+    hours, inverse = np.unique(micros // HOUR_MICROS, return_inverse=True)
+    local = [datetime.fromtimestamp(hour * 3600, tz) for hour in hours.tolist()]
+    days = np.array([moment.toordinal() for moment in local], dtype=np.int64)
+    clock = np.array([moment.hour for moment in local], dtype=np.int64)
+    return days[inverse], clock[inverse]
+
+
+def _add_sketches(cursor, courses, days, users):
+    """
+    Une los usuarios de cada (curso, ordinal de fecha) a su sketch guardado
+    y los de cada día al de la institución (curso 0 acá, NULL en la tabla)
+    """
+    days = np.asarray(days, dtype=np.int64)
+    keys, blobs = sketches_by(
+        np.r_[_pair_keys(days, courses), _pair_keys(days, np.zeros(len(days)))],
+        np.r_[users, users],
+    )
+    table = AccessSketch._meta.db_table
+    for low in range(0, len(keys), SKETCH_CHUNK):
+        cells, fresh = keys[low:low + SKETCH_CHUNK], blobs[low:low + SKETCH_CHUNK]
+        course_ids = (cells & 0xFFFFFFFF).tolist()
+        dates = [date.fromordinal(day) for day in (cells >> 32).tolist()]
+        cursor.execute(
+            f'SELECT s.course_id, s.date, s.registers FROM {table} s '
+            f'JOIN unnest(%s::bigint[], %s::date[]) AS k(course_id, date) USING (course_id, date) '
+            f'UNION ALL SELECT 0, date, registers FROM {table} WHERE course_id IS NULL AND date = ANY(%s)',
+            [course_ids, dates, [day for course_id, day in zip(course_ids, dates) if not course_id]],
+        )
+        stored = cursor.fetchall()
+        if stored:
+            # Mismas celdas: la unión vuelve con las claves de `cells`
+            _, fresh = union_by(
+                np.r_[cells, _pair_keys([row[1].toordinal() for row in stored], [row[0] for row in stored])],
+                fresh + [row[2] for row in stored],
+            )
+        cursor.execute(
+            f'INSERT INTO {table} (course_id, date, registers) '
+            f'SELECT nullif(course_id, 0), date, registers '
+            f'FROM unnest(%s::bigint[], %s::date[], %s::bytea[]) AS c(course_id, date, registers) '
+            f'ON CONFLICT (course_id, date) DO UPDATE SET registers = EXCLUDED.registers',
+            [course_ids, dates, fresh],
+        )
+
+
+def _roll_up_next_archive(cursor):
+    """
+    Suma al cubo el mes archivado siguiente al último agregado y guarda el
+    avance; sin meses pendientes crea la marca de agua de la bitácora (desde
+    ahí los meses que se archiven ya están en el cubo). Devuelve los eventos
+    agregados.
+    """
+    progress, _ = SyncWatermark.objects.get_or_create(source=CUBE_ARCHIVE_SOURCE)
+    pending = sorted(key for key in load_manifest() if int(key.replace('-', '')) > progress.value)
+    if not pending:
+        progress.delete()
+        SyncWatermark.objects.create(source=CUBE_SOURCE)
+        return 0
+    key = pending[0]
+    added = _roll_up_month(cursor, date.fromisoformat(f'{key}-01'))
+    progress.value = int(key.replace('-', ''))
+    progress.save(update_fields=['value', 'updated_at'])
+    return added
+
+
+def _roll_up_month(cursor, month):
+    """Suma al cubo un mes archivado; devuelve los eventos agregados"""
+    data = read_month(month)
+    if data is None or not len(data['time']):
+        return 0
+    member_keys, member_groups = _primary_groups()
+    pairs = _pair_keys(data['user'], data['course'])
+    groups = np.zeros(len(pairs), dtype=np.int64)
+    if len(member_keys):
+        position = np.minimum(np.searchsorted(member_keys, pairs), len(member_keys) - 1)
+        found = member_keys[position] == pairs
+        groups[found] = member_groups[position[found]]
+    days, hours = _local_date_hours(data['time'])
+    cells, counts = np.unique(
+        np.stack([np.asarray(data['course'], dtype=np.int64), groups,
+                  np.asarray(data['role'], dtype=np.int64), days, hours]),
+        axis=1, return_counts=True,
+    )
+    cursor.execute(
+        _upsert_sql(
+            'SELECT course_id, nullif(group_id, 0), nullif(role_id, 0), date, hour, count '
+            'FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[], %s::date[], '
+            '%s::int[], %s::bigint[]) AS c(course_id, group_id, role_id, date, hour, count)'
+        ),
+        [
+            cells[0].tolist(), cells[1].tolist(), cells[2].tolist(),
+            [date.fromordinal(day) for day in cells[3].tolist()],
+            cells[4].tolist(), counts.tolist(),
+        ],
+    )
+    _add_sketches(cursor, data['course'], days, data['user'])
+    return len(data['time'])
+
+
+# ============================================================================
+# CONSULTAS
+# ============================================================================
+
+def cube_counts(start, end, by=(), courses=None, **filters):
+    """
+    Accesos de los días [start, end) (fechas locales) agrupados por `by`.
+
+    `by` admite campos del cubo ('course', 'group', 'role', 'date', 'hour'),
+    las dimensiones de DIMENSIONS ('weekday', 'week', 'month') y campos
+    relacionados ('course__category__name'); `courses` (queryset o ids) y
+    `filters` (lookups sobre el cubo, p. ej. role__shortname='student')
+    recortan el cubo. Cada fila es {dimensión: valor, ..., 'count'},
+    ordenadas por las dimensiones (los vacíos al final).
+    """
+    cells = AccessCube.objects.filter(date__gte=start, date__lt=end, **filters)
+    if courses is not None:
+        cells = cells.filter(course__in=courses)
+    fields = list(dict.fromkeys('date' if name in DIMENSIONS else name for name in by))
+    # Sin ORDER BY: la base agrupa con una tabla hash y el orden se da acá
+    rows = cells.values(*fields).annotate(count=Sum('count')).order_by()
+
+    totals = Counter()
+    for row in rows:
+        key = tuple(DIMENSIONS[name](row['date']) if name in DIMENSIONS else row[name] for name in by)
+        totals[key] += int(row['count'])
+    return _sorted_rows(by, totals.items())
+
+
+def _sorted_rows(by, items):
+    """Filas {dimensión: valor, ..., 'count'} de pares (clave, conteo), ordenadas con los vacíos al final"""
+    return [
+        {**dict(zip(by, key)), 'count': count}
+        for key, count in sorted(items, key=lambda item: [(value is None, value) for value in item[0]])
+    ]
+
+
+def counts_by_days(start, end, step=1, courses=None, **filters):
+    """
+    Accesos por intervalo de `step` días a partir de start (fechas locales).
+
+    Devuelve una lista con un conteo por intervalo (el último puede quedar
+    cortado por end).
+    """
+    buckets = [0] * -(-(end - start).days // step)
+    for row in cube_counts(start, end, by=('date',), courses=courses, **filters):
+        buckets[(row['date'] - start).days // step] += row['count']
+    return buckets
+
+
+def _union_counts(start, end, courses, by, label):
+    """{clave: usuarios distintos} uniendo los sketches de los días [start, end) por label(curso, fecha)"""
+    sketches = AccessSketch.objects.filter(date__gte=start, date__lt=end)
+    if courses is not None:
+        sketches = sketches.filter(course__in=courses)
+    else:
+        # Sin cortar por curso alcanza el sketch de la institución de cada día
+        sketches = sketches.filter(course__isnull='course' not in by)
+    labels, groups, blobs = {}, [], []
+    for course_id, day, registers in sketches.values_list('course_id', 'date', 'registers'):
+        groups.append(labels.setdefault(label(course_id, day), len(labels)))
+        blobs.append(registers)
+    numbers, counts = count_by(groups, blobs)
+    keys = list(labels)
+    return {keys[number]: count for number, count in zip(numbers.tolist(), counts.tolist())}
+
+
+def unique_users(start, end, by=(), courses=None):
+    """
+    Usuarios distintos con accesos en los días [start, end) agrupados por
+    `by` ('course', 'date' o las dimensiones de DIMENSIONS), estimados
+    uniendo sketches (error estándar del 1,6 %). Cada fila es
+    {dimensión: valor, ..., 'count'}, ordenadas por las dimensiones.
+    """
+    def label(course_id, day):
+        values = {'course': course_id, 'date': day}
+        return tuple(DIMENSIONS[name](day) if name in DIMENSIONS else values[name] for name in by)
+
+    return _sorted_rows(by, _union_counts(start, end, courses, by, label).items())
+
+
+def unique_users_by_days(start, end, step=1, courses=None):
+    """Usuarios distintos por intervalo de `step` días a partir de start (como counts_by_days)"""
+    buckets = [0] * -(-(end - start).days // step)
+    def bucket(_, day):
+        return (day - start).days // step
+
+    for index, count in _union_counts(start, end, courses, (), bucket).items():
+        buckets[index] = count
+    return buckets
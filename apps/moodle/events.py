@@ -0,0 +1,236 @@
+"""
+Eventos de acceso a cursos en tiempo real
+
+Los eventos llegan en lotes NDJSON (endpoint HTTP o directorio de spool) y se
+acumulan en un buffer en memoria del proceso, que se vuelca a la base por
+tamaño o por tiempo en un hilo aparte. Si la base se atrasa y el buffer se
+llena, add() rechaza el lote (BufferFull) y el endpoint responde 503 con
+Retry-After: el emisor reintenta en lugar de acumular memoria sin límite.
+
+Cada volcado agrega los eventos a la bitácora (AccessEvent), actualiza
+UserLastAccess (GREATEST, nunca retrocede) y la actividad semanal
+(WeeklyActivity, OR de bits), recalcula las semanas precalculadas de los
+cursos afectados y suma el lote al cubo de accesos (AccessCube).
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .activity import record_activity_sql
+from .cube import roll_up_access_cube
+from .models import AccessEvent, Course, MoodleUser, UserLastAccess
+from .partitions import ensure_partitions_for, forget_partition
+from .replicas import beat
+from .reports import refresh_stored_weeks
+from .tenants import atomic, connection, current_tenant, use_tenant
+
+
+logger = logging.getLogger(__name__)
+
+# Eventos con reloj adelantado más que esto se rechazan (no crean particiones
+# de meses futuros)
+MAX_CLOCK_SKEW = timedelta(days=1)
+
+
+class BufferFull(Exception):
+    """El buffer alcanzó ACCESS_EVENTS_MAX_PENDING eventos sin volcar"""
+
+
+def parse_event(row):
+    """
+    (user_id, course_id, instante, role_id) de un evento, o None si es inválido.
+
+    Acepta los nombres de Moodle: {"userid", "courseid", "timeaccess"} (o
+    "time") y opcionalmente "roleid".
+    """
+    if not isinstance(row, dict):
+        return None
+    try:
+        user_id = int(row['userid'])
+        course_id = int(row['courseid'])
+        ts = int(row.get('timeaccess') or row.get('time') or 0)
+        role_id = int(row['roleid']) if row.get('roleid') else None
+        moment = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return None
+    if user_id <= 0 or course_id <= 0 or ts <= 0 or moment > timezone.now() + MAX_CLOCK_SKEW:
+        return None
+    return user_id, course_id, moment, role_id
+
+
+def parse_ndjson_events(lines):
+    """Devuelve (eventos válidos, cantidad de líneas rechazadas)"""
+    events, rejected = [], 0
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = parse_event(json.loads(line))
+        except ValueError:
+            event = None
+        if event is None:
+            rejected += 1
+        else:
+            events.append(event)
+    return events, rejected
+
+
+def write_access_events(events):
+    """
+    Vuelca eventos a la base en una sola sentencia por lote.
+
+    Los eventos van a la bitácora, el máximo por (usuario, curso) se integra
+    a UserLastAccess con GREATEST y sus semanas a WeeklyActivity; los ids
+    desconocidos se descartan.
+    Devuelve {curso: instante} con el último acceso más antiguo que cambió
+    (el anterior, o el nuevo si no había): desde ahí cambian las semanas.
+    """
+    if not events:
+        return {}
+
+    ensure_partitions_for(moment for _, _, moment, _ in events)
+
+    table = UserLastAccess._meta.db_table
+    activity_sql, activity_params = record_activity_sql(
+        'SELECT user_id, course_id, timecreated AS moment FROM e'
+    )
+    try:
+        with atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH e AS ('
+                f'  SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::timestamptz[], %s::bigint[]) '
+                f'  AS e(user_id, course_id, timecreated, role_id) '
+                f'  WHERE EXISTS (SELECT 1 FROM {MoodleUser._meta.db_table} u WHERE u.id = e.user_id) '
+                f'  AND EXISTS (SELECT 1 FROM {Course._meta.db_table} c WHERE c.id = e.course_id)'
+                f'), logged AS ('
+                f'  INSERT INTO {AccessEvent._meta.db_table} (user_id, course_id, role_id, timecreated) '
+                f'  SELECT user_id, course_id, role_id, timecreated FROM e'
+                f'), active AS ({activity_sql}'
+                # Todas las partes ven la tabla de antes de la sentencia
+                f'), previous AS ('
+                f'  SELECT l.user_id, l.course_id, l.timeaccess FROM {table} l '
+                f'  WHERE (l.user_id, l.course_id) IN (SELECT user_id, course_id FROM e)'
+                f'), merged AS ('
+                f'  INSERT INTO {table} (user_id, course_id, timeaccess) '
+                f'  SELECT user_id, course_id, max(timecreated) FROM e GROUP BY user_id, course_id '
+                f'  ON CONFLICT (user_id, course_id) DO UPDATE '
+                f'  SET timeaccess = GREATEST({table}.timeaccess, EXCLUDED.timeaccess) '
+                f'  RETURNING user_id, course_id, timeaccess'
+                f') '
+                f'SELECT m.course_id, min(coalesce(p.timeaccess, m.timeaccess)) '
+                f'FROM merged m LEFT JOIN previous p USING (user_id, course_id) '
+                f'WHERE p.timeaccess IS DISTINCT FROM m.timeaccess GROUP BY m.course_id',
+                [*(list(column) for column in zip(*events)), *activity_params],
+            )
+            changed_since = dict(cursor.fetchall())
+            beat()
+    except DatabaseError:
+        # Otro proceso pudo haber archivado un mes: se vuelven a verificar las particiones
+        forget_partition()
+        raise
+    return changed_since
+
+
+def refresh_aggregates(changed_since):
+    """Recalcula las semanas precalculadas afectadas por los eventos y suma el lote al cubo"""
+    if changed_since:
+        refresh_stored_weeks(list(changed_since), min(changed_since.values()))
+    roll_up_access_cube()
+
+
+class AccessEventBuffer:
+    """
+    Buffer de eventos de una institución, con volcado por tamaño o tiempo y
+    límite de pendientes.
+    """
+
+    def __init__(self, flush_size, flush_interval, max_pending, tenant=None):
+        self.tenant = tenant or current_tenant()
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, events):
+        """Encola eventos; lanza BufferFull si no hay lugar para el lote"""
+        with self._lock:
+            if len(self._pending) + len(events) > self.max_pending:
+                raise BufferFull
+            self._pending.extend(events)
+            full = len(self._pending) >= self.flush_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+        return len(events)
+
+    def flush(self):
+        """Vuelca lo pendiente; ante un error los eventos vuelven al buffer"""
+        with self._flush_lock, use_tenant(self.tenant):
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                changed_since = write_access_events(batch)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            refresh_aggregates(changed_since)
+            return len(batch)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name=f'access-event-flusher-{self.tenant}', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('No se pudieron volcar los eventos de acceso')
+                time.sleep(self.flush_interval)
+            finally:
+                with use_tenant(self.tenant):
+                    connection.close()
+
+
+_buffers = {}
+_buffer_lock = threading.Lock()
+
+
+def access_event_buffer():
+    """Buffer del proceso para la institución actual (se vacía al salir)"""
+    tenant = current_tenant()
+    with _buffer_lock:
+        if tenant not in _buffers:
+            _buffers[tenant] = AccessEventBuffer(
+                settings.ACCESS_EVENTS_FLUSH_SIZE,
+                settings.ACCESS_EVENTS_FLUSH_SECONDS,
+                settings.ACCESS_EVENTS_MAX_PENDING,
+                tenant,
+            )
+            atexit.register(_buffers[tenant].flush)
+    return _buffers[tenant]
@@ -0,0 +1,213 @@
+"""
+HyperLogLog: cantidad aproximada de elementos distintos, combinable
+
+Un sketch son REGISTERS registros de un byte: cada valor (id de usuario) se
+hashea, los primeros PRECISION bits eligen el registro y este guarda el
+mayor rango (ceros a la izquierda + 1) del resto. La unión de dos sketches
+es el máximo registro a registro, así que los usuarios distintos de varios
+días o cursos salen de unir sus sketches sin volver a la bitácora; el error
+estándar es 1.04 / sqrt(REGISTERS) (1,6 %) y con pocos usuarios el conteo
+es prácticamente exacto.
+
+Serialización (bytes): PRECISION en el primer byte y luego, si hay pocos
+registros ocupados, entradas uint32 (registro << 8 | rango) ordenadas; si
+no, los REGISTERS bytes. Las funciones *_by() trabajan sobre muchos
+sketches a la vez con NumPy, sin un objeto por sketch.
+"""
+import numpy as np
+
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+HASH_BITS = 64 - PRECISION
+# Entradas dispersas (4 bytes) hasta la cuarta parte de los registros
+SPARSE_LIMIT = REGISTERS // 4
+
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+_RANK_BITS = 6  # rango <= HASH_BITS + 1 < 64
+
+
+def hash64(values):
+    """splitmix64 de enteros: estable entre procesos y versiones (no usa hash())"""
+    z = np.asarray(values, dtype=np.int64).view(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def registers_of(values):
+    """(registro, rango) de cada valor"""
+    hashed = np.atleast_1d(hash64(values))
+    index = (hashed >> np.uint64(HASH_BITS)).astype(np.int64)
+    rest = hashed & np.uint64((1 << HASH_BITS) - 1)
+    # Largo en bits del resto; frexp es exacto porque rest < 2**53
+    _, bits = np.frexp(rest.astype(np.float64))
+    return index, (HASH_BITS + 1 - bits).astype(np.int64)
+
+
+def _estimate(zeros, inverse_sum):
+    """Estimación a partir de registros vacíos y la suma de 2**-rango (arreglos)"""
+    raw = _ALPHA * REGISTERS * REGISTERS / inverse_sum
+    linear = REGISTERS * np.log(REGISTERS / np.maximum(zeros, 1))
+    return np.rint(np.where((raw <= 2.5 * REGISTERS) & (zeros > 0), linear, raw)).astype(np.int64)
+
+
+# ============================================================================
+# SERIALIZACIÓN
+# ============================================================================
+
+def _encode(index, rank):
+    """Bytes de un sketch a partir de sus registros ocupados (index ordenado)"""
+    if len(index) < SPARSE_LIMIT:
+        payload = ((index << 8) | rank).astype('<u4').tobytes()
+    else:
+        registers = np.zeros(REGISTERS, dtype=np.uint8)
+        registers[index] = rank
+        payload = registers.tobytes()
+    return bytes([PRECISION]) + payload
+
+
+def _decode(data):
+    """(registro, rango) de los registros ocupados de un sketch serializado"""
+    data = memoryview(data).cast('B')  # psycopg2 entrega bytea como memoryview de formato 'c'
+    if not len(data) or data[0] != PRECISION:
+        raise ValueError('Sketch de otra precisión o corrupto')
+    if len(data) == 1 + REGISTERS:
+        registers = np.frombuffer(data, dtype=np.uint8, offset=1)
+        index = np.flatnonzero(registers)
+        return index, registers[index].astype(np.int64)
+    entries = np.frombuffer(data, dtype='<u4', offset=1).astype(np.int64)
+    return entries >> 8, entries & 0xFF
+
+
+# ============================================================================
+# UN SKETCH
+# ============================================================================
+
+class HyperLogLog:
+    """Un sketch en memoria (REGISTERS bytes)"""
+
+    def __init__(self, registers=None):
+        if registers is None:
+            registers = np.zeros(REGISTERS, dtype=np.uint8)
+        self.registers = np.asarray(registers, dtype=np.uint8)
+
+    @classmethod
+    def of(cls, values):
+        sketch = cls()
+        sketch.add(values)
+        return sketch
+
+    @classmethod
+    def from_bytes(cls, data):
+        sketch = cls()
+        index, rank = _decode(data)
+        sketch.registers[index] = rank
+        return sketch
+
+    def to_bytes(self):
+        index = np.flatnonzero(self.registers)
+        return _encode(index, self.registers[index].astype(np.int64))
+
+    def add(self, values):
+        index, rank = registers_of(values)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def update(self, *others):
+        """Une otros sketches a este"""
+        for other in others:
+            np.maximum(self.registers, other.registers, out=self.registers)
+
+    def __or__(self, other):
+        return HyperLogLog(np.maximum(self.registers, other.registers))
+
+    def count(self):
+        zeros = np.count_nonzero(self.registers == 0)
+        inverse_sum = np.exp2(-self.registers.astype(np.float64)).sum()
+        return int(_estimate(np.array([zeros]), np.array([inverse_sum]))[0])
+
+
+# ============================================================================
+# MUCHOS SKETCHES (vectorizado)
+# ============================================================================
+
+def _reduce(groups, index, rank):
+    """
+    Máximo rango por (grupo, registro). Devuelve (grupos, registros, rangos)
+    ordenados por grupo y registro.
+    """
+    combined = np.sort(((np.asarray(groups, dtype=np.int64) * REGISTERS + index) << _RANK_BITS) | rank)
+    keys = combined >> _RANK_BITS
+    last = np.r_[keys[1:] != keys[:-1], True] if len(keys) else np.empty(0, dtype=bool)
+    keys, rank = keys[last], combined[last] & ((1 << _RANK_BITS) - 1)
+    return keys // REGISTERS, keys % REGISTERS, rank
+
+
+def _labels(keys):
+    """(claves distintas ordenadas, número de grupo de cada clave)"""
+    return np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+
+
+def _split(groups, index, rank, count):
+    """Bytes del sketch de cada grupo 0..count-1 (entradas de _reduce)"""
+    bounds = np.searchsorted(groups, np.arange(count + 1))
+    # Las entradas dispersas de todos los grupos se arman juntas y se cortan
+    entries = ((index << 8) | rank).astype('<u4').tobytes()
+    header = bytes([PRECISION])
+    return [
+        header + entries[4 * low:4 * high] if high - low < SPARSE_LIMIT
+        else _encode(index[low:high], rank[low:high])
+        for low, high in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+    ]
+
+
+def _entries(blobs):
+    """(número de sketch, registro, rango) de todos los registros ocupados"""
+    views = [memoryview(blob).cast('B') for blob in blobs]
+    sizes = np.fromiter(map(len, views), dtype=np.int64, count=len(views))
+    data = np.frombuffer(b''.join(views), dtype=np.uint8)
+    starts = np.cumsum(sizes) - sizes
+    if (sizes == 0).any() or (data[starts] != PRECISION).any():
+        raise ValueError('Sketch de otra precisión o corrupto')
+
+    # Sin el byte de precisión: entradas de los dispersos y bytes de los densos
+    body = np.delete(data, starts)
+    dense = sizes == 1 + REGISTERS
+    in_dense = np.repeat(dense, sizes - 1)
+    entries = body[~in_dense].view('<u4').astype(np.int64)
+    sparse_numbers = np.repeat(np.flatnonzero(~dense), (sizes[~dense] - 1) // 4)
+    dense_numbers, dense_index = np.nonzero(body[in_dense].reshape(-1, REGISTERS))
+    return (
+        np.r_[sparse_numbers, np.flatnonzero(dense)[dense_numbers]],
+        np.r_[entries >> 8, dense_index],
+        np.r_[entries & 0xFF, body[in_dense].reshape(-1, REGISTERS)[dense_numbers, dense_index]],
+    )
+
+
+def sketches_by(keys, values):
+    """
+    Sketch de los valores de cada clave (arreglos paralelos de enteros).
+    Devuelve (claves distintas ordenadas, lista de bytes).
+    """
+    unique, groups = _labels(keys)
+    index, rank = registers_of(values)
+    return unique, _split(*_reduce(groups, index, rank), len(unique))
+
+
+def union_by(keys, blobs):
+    """Une los sketches serializados de cada clave; devuelve (claves, bytes)"""
+    unique, labels = _labels(keys)
+    numbers, index, rank = _entries(blobs)
+    return unique, _split(*_reduce(labels[numbers], index, rank), len(unique))
+
+
+def count_by(keys, blobs):
+    """Distintos estimados de la unión de los sketches de cada clave; devuelve (claves, conteos)"""
+    unique, labels = _labels(keys)
+    numbers, index, rank = _entries(blobs)
+    groups, _, rank = _reduce(labels[numbers], index, rank)
+    occupied = np.bincount(groups, minlength=len(unique))
+    inverse_sum = (REGISTERS - occupied) + np.bincount(
+        groups, weights=np.exp2(-rank.astype(np.float64)), minlength=len(unique)
+    )
+    return unique, _estimate(REGISTERS - occupied, inverse_sum)
@@ -0,0 +1,697 @@
+"""
+Importación masiva desde Moodle: export NDJSON nocturno o base de Moodle
+
+Cada archivo se lee línea a línea (memoria constante), o cada tabla mdl_* con
+un cursor del lado del servidor, y se vuelca con COPY a una tabla de staging
+UNLOGGED; las fuentes se cargan en paralelo, una por proceso. Luego, en una sola transacción y en orden de dependencias, cada
+staging se integra a su tabla con INSERT ... ON CONFLICT DO UPDATE,
+conservando los ids de Moodle para categorías, cursos, usuarios, métodos de
+inscripción y grupos.
+
+Modo incremental: para las tablas de relación se guarda una marca de agua
+(SyncWatermark: mayor id de Moodle o timeaccess integrado) y solo se cargan
+las filas posteriores; los accesos se integran con GREATEST. Las bajas se
+detectan con una conciliación periódica por checksums de buckets: solo los
+buckets cuyo conteo/suma difiere se comparan clave por clave.
+
+Recarga completa sin tocar las tablas vivas: ver shadow.py (--shadow).
+"""
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connections
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .activity import record_activity_sql
+from .cache import bump_data_version
+from .categories import rebuild_category_closure
+from .models import (
+    Category, Course, Enrol, Group, GroupMember, MdlContext, MdlCourse,
+    MdlCourseCategory, MdlEnrol, MdlGroup, MdlGroupMember, MdlRole,
+    MdlRoleAssignment, MdlUser, MdlUserEnrolment, MdlUserLastAccess, MoodleUser,
+    Role, RoleAssignment, SyncWatermark, UserEnrolment, UserLastAccess,
+)
+from .periods import academic_period, year_in_name
+from .replicas import beat
+from .cube import roll_up_access_cube
+from .snapshot import build_snapshot
+from .tenants import activate_tenant, atomic, connection, current_tenant, tenant_path
+
+
+COPY_CHUNK_SIZE = 1 << 16
+
+# Filas por viaje al leer la base de Moodle con cursores del lado del servidor
+MOODLE_FETCH_SIZE = 10000
+
+# contextlevel de Moodle para los contextos de curso
+CONTEXT_COURSE = 50
+
+# Clave para serializar integraciones concurrentes (pg_advisory_xact_lock)
+MERGE_LOCK_KEY = 'apps.moodle.ingest'
+
+# Conciliación: cantidad de buckets y mezcla de la clave (a, b) → bucket
+RECONCILE_BUCKETS = 1024
+RECONCILE_MIX = 7919
+RECONCILE_SHIFT = 1 << 32
+RECONCILE_DELETE_BATCH = 5000
+
+
+def iter_ndjson(path):
+    """Filas (dict) de un archivo NDJSON; ignora líneas vacías o inválidas"""
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(row, dict):
+                yield row
+
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _epoch(value):
+    """Timestamp Unix de Moodle a datetime (0 o vacío: None)"""
+    ts = _int(value)
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc) if ts > 0 else None
+
+
+def _text(value, size=None):
+    text = '' if value is None else str(value)
+    return text[:size] if size else text
+
+
+# ============================================================================
+# CONVERSIÓN: fila de Moodle → columnas de la tabla
+# ============================================================================
+
+def _category_row(row):
+    if _int(row.get('id')) <= 0:
+        return None
+    return (
+        _int(row['id']), _text(row.get('name'), 255), _text(row.get('path'), 500),
+        _int(row.get('parent')) or None, _int(row.get('depth')),
+    )
+
+
+def _course_row(row):
+    # El curso "sitio" (id 1) tiene categoría 0 y no es un curso real
+    if _int(row.get('id')) <= 0 or _int(row.get('category')) <= 0:
+        return None
+    shortname = _text(row.get('shortname'), 255)
+    fullname = _text(row.get('fullname'), 500)
+    startdate = _epoch(row.get('startdate'))
+    year, semester = academic_period(fullname, shortname, startdate)
+    return (
+        _int(row['id']), _int(row['category']), shortname, fullname,
+        startdate, _epoch(row.get('enddate')), _int(row.get('visible'), 1) != 0,
+        year, semester, year_in_name(fullname, shortname) is not None,
+    )
+
+
+def _user_row(row):
+    if _int(row.get('id')) <= 0 or _int(row.get('deleted')):
+        return None
+    return (
+        _int(row['id']), _text(row.get('username'), 100), _text(row.get('firstname'), 100),
+        _text(row.get('lastname'), 100), _text(row.get('email'), 254),
+    )
+
+
+def _enrol_row(row):
+    if _int(row.get('id')) <= 0:
+        return None
+    # En Moodle status 0 es "habilitado"
+    return (
+        _int(row['id']), _int(row.get('courseid')), _text(row.get('enrol'), 50) or 'manual',
+        _int(row.get('status')) == 0,
+    )
+
+
+def _group_row(row):
+    if _int(row.get('id')) <= 0:
+        return None
+    return (
+        _int(row['id']), _int(row.get('courseid')), _text(row.get('name'), 255),
+        _text(row.get('description')),
+    )
+
+
+def _group_member_row(row):
+    return (
+        _int(row.get('groupid')), _int(row.get('userid')),
+        _epoch(row.get('timeadded')) or datetime.now(dt_timezone.utc),
+    )
+
+
+def _user_enrolment_row(row):
+    return (
+        _int(row.get('enrolid')), _int(row.get('userid')),
+        _epoch(row.get('timestart')), _epoch(row.get('timeend')),
+        _epoch(row.get('timecreated')) or datetime.now(dt_timezone.utc),
+    )
+
+
+def _last_access_row(row):
+    timeaccess = _epoch(row.get('timeaccess'))
+    if timeaccess is None:
+        return None
+    return _int(row.get('userid')), _int(row.get('courseid')), timeaccess
+
+
+def _role_row(row):
+    if _int(row.get('id')) <= 0:
+        return None
+    shortname = _text(row.get('shortname'), 100)
+    return _int(row['id']), _text(row.get('name'), 255) or shortname, shortname
+
+
+def _role_assignment_row(row):
+    # Solo asignaciones en contexto de curso (courseid resuelto desde mdl_context)
+    if _int(row.get('courseid')) <= 0:
+        return None
+    return (
+        _int(row.get('roleid')), _int(row.get('userid')), _int(row.get('courseid')),
+        _epoch(row.get('timemodified')) or datetime.now(dt_timezone.utc),
+    )
+
+
+class Source:
+    """Un archivo del export (o tabla de Moodle) y cómo se integra a su modelo"""
+
+    def __init__(self, name, model, columns, convert, conflict=('id',), parents=(),
+                 watermark=None, incremental_update=None):
+        self.name = name
+        self.filename = f'{name}.ndjson'
+        self.model = model
+        self.columns = columns
+        self.convert = convert
+        self.conflict = conflict
+        # (columna, modelo) de las claves foráneas a validar antes de insertar
+        self.parents = parents
+        # Campo creciente de Moodle ('id', 'timeaccess') para el modo incremental
+        self.watermark = watermark
+        # Expresiones ON CONFLICT propias del modo incremental ({table}: la tabla)
+        self.incremental_update = incremental_update or {}
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def stage_table(self, run_id):
+        return f'moodle_stage_{self.name}_{run_id}'
+
+    def records(self, path=None, since=None):
+        """Filas de Moodle (dicts) del archivo o, sin `path`, de la base de Moodle"""
+        if path is not None:
+            return iter_ndjson(path)
+        records = MOODLE_READERS[self.name]()
+        if since is not None and self.watermark:
+            records = records.filter(**{f'{self.watermark}__gt': since})
+        return records.iterator(chunk_size=MOODLE_FETCH_SIZE)
+
+    def rows(self, records, since=None, mark=None):
+        """
+        Filas convertidas.
+
+        Con `since` se omiten las filas con marca de agua menor o igual; en
+        `mark['high']` queda la mayor marca vista.
+        """
+        for row in records:
+            if self.watermark is not None:
+                value = _int(row.get(self.watermark))
+                if since is not None and value <= since:
+                    continue
+                if mark is not None and value > mark.get('high', 0):
+                    mark['high'] = value
+            values = self.convert(row)
+            if values is not None:
+                yield values
+
+
+# En orden de dependencias: cada fuente solo referencia a las anteriores
+SOURCES = [
+    Source('categories', Category, ['id', 'name', 'path', 'parent_id', 'depth'],
+           _category_row, parents=[('parent_id', Category)]),
+    Source('courses', Course,
+           ['id', 'category_id', 'shortname', 'fullname', 'startdate', 'enddate', 'visible',
+            'academic_year', 'semester', 'name_has_year'],
+           _course_row, parents=[('category_id', Category)]),
+    Source('users', MoodleUser, ['id', 'username', 'firstname', 'lastname', 'email'], _user_row),
+    Source('enrol', Enrol, ['id', 'course_id', 'enrol', 'status'], _enrol_row,
+           parents=[('course_id', Course)]),
+    Source('groups', Group, ['id', 'course_id', 'name', 'description'], _group_row,
+           parents=[('course_id', Course)]),
+    Source('groups_members', GroupMember, ['group_id', 'user_id', 'timeadded'],
+           _group_member_row, conflict=('group_id', 'user_id'),
+           parents=[('group_id', Group), ('user_id', MoodleUser)], watermark='id'),
+    Source('user_enrolments', UserEnrolment,
+           ['enrol_id', 'user_id', 'timestart', 'timeend', 'timecreated'],
+           _user_enrolment_row, conflict=('enrol_id', 'user_id'),
+           parents=[('enrol_id', Enrol), ('user_id', MoodleUser)], watermark='id'),
+    Source('user_lastaccess', UserLastAccess, ['user_id', 'course_id', 'timeaccess'],
+           _last_access_row, conflict=('user_id', 'course_id'),
+           parents=[('user_id', MoodleUser), ('course_id', Course)],
+           watermark='timeaccess',
+           incremental_update={'timeaccess': 'GREATEST({table}.timeaccess, EXCLUDED.timeaccess)'}),
+    Source('roles', Role, ['id', 'name', 'shortname'], _role_row),
+    Source('role_assignments', RoleAssignment, ['role_id', 'user_id', 'course_id', 'timecreated'],
+           _role_assignment_row, conflict=('role_id', 'user_id', 'course_id'),
+           parents=[('role_id', Role), ('user_id', MoodleUser), ('course_id', Course)],
+           watermark='id'),
+]
+
+SOURCES_BY_NAME = {source.name: source for source in SOURCES}
+
+# Tablas de relación que se pueden podar o conciliar (filas ausentes del export)
+PRUNABLE = {'groups_members', 'user_enrolments', 'user_lastaccess'}
+
+
+def _role_assignment_records():
+    course_context = MdlContext.objects.filter(
+        id=OuterRef('contextid'), contextlevel=CONTEXT_COURSE
+    ).values('instanceid')[:1]
+    return (
+        MdlRoleAssignment.objects.annotate(courseid=Subquery(course_context))
+        .filter(courseid__isnull=False)
+        .values('id', 'roleid', 'userid', 'courseid', 'timemodified')
+    )
+
+
+# Lectura de cada fuente desde la base de Moodle (alias MOODLE_DB_ALIAS): las
+# columnas llevan los mismos nombres que en el export NDJSON
+MOODLE_READERS = {
+    'categories': lambda: MdlCourseCategory.objects.values('id', 'name', 'parent', 'path', 'depth'),
+    'courses': lambda: MdlCourse.objects.values(
+        'id', 'category', 'shortname', 'fullname', 'startdate', 'enddate', 'visible'
+    ),
+    'users': lambda: MdlUser.objects.filter(deleted=0).values(
+        'id', 'username', 'firstname', 'lastname', 'email', 'deleted'
+    ),
+    'enrol': lambda: MdlEnrol.objects.values('id', 'courseid', 'enrol', 'status'),
+    'groups': lambda: MdlGroup.objects.values('id', 'courseid', 'name', 'description'),
+    'groups_members': lambda: MdlGroupMember.objects.values('id', 'groupid', 'userid', 'timeadded'),
+    'user_enrolments': lambda: MdlUserEnrolment.objects.values(
+        'id', 'enrolid', 'userid', 'timestart', 'timeend', 'timecreated'
+    ),
+    'user_lastaccess': lambda: MdlUserLastAccess.objects.values(
+        'id', 'userid', 'courseid', 'timeaccess'
+    ),
+    'roles': lambda: MdlRole.objects.values('id', 'name', 'shortname'),
+    'role_assignments': _role_assignment_records,
+}
+
+
+# ============================================================================
+# COPY A STAGING
+# ============================================================================
+
+def _csv_value(value):
+    """Valor en formato CSV de COPY: vacío sin comillas es NULL"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class CsvStream:
+    """Adapta un iterador de tuplas a un archivo de lectura para COPY"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._pending = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        chunks, length = [self._pending], len(self._pending)
+        for row in self._rows:
+            line = ','.join(_csv_value(value) for value in row) + '\n'
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Carga `rows` en `table` con COPY; devuelve la cantidad de filas"""
+    stream = CsvStream(rows)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        stream, COPY_CHUNK_SIZE,
+    )
+    return stream.count
+
+
+def create_stage(source, run_id):
+    """Tabla UNLOGGED con las columnas (y tipos) de la tabla destino"""
+    stage = source.stage_table(run_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {stage}')
+        cursor.execute(
+            f'CREATE UNLOGGED TABLE {stage} AS '
+            f'SELECT {", ".join(source.columns)} FROM {source.table} WITH NO DATA'
+        )
+    return stage
+
+
+def drop_stage(source, run_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {source.stage_table(run_id)}')
+
+
+def load_stage(name, path, run_id, since=None):
+    """
+    Vuelca un archivo (o, con path None, la tabla de Moodle) a su staging;
+    corre en un proceso aparte.
+
+    Devuelve (fuente, filas, mayor marca de agua vista o None).
+    """
+    source = SOURCES_BY_NAME[name]
+    mark = {}
+    with connection.cursor() as cursor:
+        count = copy_rows(
+            cursor, source.stage_table(run_id), source.columns,
+            source.rows(source.records(path, since), since, mark),
+        )
+    return name, count, mark.get('high')
+
+
+def load_stages(paths, run_id, workers=1, since=None):
+    """
+    Carga las fuentes en paralelo; devuelve {fuente: (filas, marca de agua)}.
+
+    `paths` es {fuente: archivo NDJSON o None para leer la base de Moodle}.
+    """
+    since = since or {}
+    args = [(name, path, run_id, since.get(name)) for name, path in paths.items()]
+    if workers <= 1 or len(paths) <= 1:
+        results = [load_stage(*arg) for arg in args]
+    else:
+        # Igual que en bulk.py: fork con las conexiones cerradas antes
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=context,
+                                 initializer=activate_tenant, initargs=(current_tenant(),)) as executor:
+            futures = [executor.submit(load_stage, *arg) for arg in args]
+            results = [future.result() for future in futures]
+    return {name: (count, high) for name, count, high in results}
+
+
+# ============================================================================
+# INTEGRACIÓN (MERGE)
+# ============================================================================
+
+def _parent_filter(source, stage, tables=None):
+    """
+    Condiciones para descartar filas que apuntan a padres inexistentes.
+
+    `tables` ({modelo: tabla}) permite validar contra otra tabla del padre
+    (las sombras de shadow.py).
+    """
+    tables = tables or {}
+    conditions = []
+    for column, model in source.parents:
+        parent = tables.get(model, model._meta.db_table)
+        exists = f'EXISTS (SELECT 1 FROM {parent} p WHERE p.id = s.{column})'
+        if model is source.model:
+            # Autorreferencia: el padre puede venir en el mismo archivo
+            exists = (
+                f's.{column} IS NULL OR {exists} OR '
+                f'EXISTS (SELECT 1 FROM {stage} p WHERE p.id = s.{column})'
+            )
+        conditions.append(f'({exists})')
+    return ' AND '.join(conditions) or 'TRUE'
+
+
+def merge_sql(source, stage, update=None):
+    """
+    INSERT ... SELECT DISTINCT ON (clave) ... ON CONFLICT DO UPDATE.
+
+    Ante claves repetidas en el archivo gana la última fila. `update` permite
+    reemplazar la expresión de alguna columna (ej. GREATEST para accesos).
+    """
+    columns = ', '.join(source.columns)
+    conflict = ', '.join(source.conflict)
+    assignments = {
+        column: f'EXCLUDED.{column}'
+        for column in source.columns if column not in source.conflict
+    }
+    assignments.update(update or {})
+    set_clause = ', '.join(f'{column} = {expr}' for column, expr in assignments.items())
+    return (
+        f'INSERT INTO {source.table} ({columns}) '
+        f'SELECT DISTINCT ON ({conflict}) {columns} FROM {stage} s '
+        f'WHERE {_parent_filter(source, stage)} '
+        f'ORDER BY {conflict}, s.ctid DESC '
+        f'ON CONFLICT ({conflict}) DO UPDATE SET {set_clause}'
+    )
+
+
+def prune_sql(source, stage):
+    """Borra las filas de la tabla que no figuran en el export"""
+    match = ' AND '.join(f's.{column} = t.{column}' for column in source.conflict)
+    return (
+        f'DELETE FROM {source.table} t '
+        f'WHERE NOT EXISTS (SELECT 1 FROM {stage} s WHERE {match})'
+    )
+
+
+def merge_stages(names, run_id, prune=False, incremental=False, marks=None):
+    """
+    Integra los stagings en orden de dependencias; devuelve {fuente: filas}.
+
+    `marks` ({fuente: marca}) se guarda en SyncWatermark en la misma
+    transacción, de modo que la marca nunca avanza sin sus datos.
+    """
+    merged = {}
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [MERGE_LOCK_KEY])
+        for source in SOURCES:
+            if source.name not in names:
+                continue
+            stage = source.stage_table(run_id)
+            update = None
+            if incremental:
+                update = {
+                    column: expr.format(table=source.table)
+                    for column, expr in source.incremental_update.items()
+                }
+            cursor.execute(f'ANALYZE {stage}')
+            cursor.execute(merge_sql(source, stage, update))
+            merged[source.name] = cursor.rowcount
+            if source.model is UserLastAccess:
+                # Cada último acceso es actividad en su semana
+                cursor.execute(*record_activity_sql(
+                    f'SELECT user_id, course_id, timeaccess AS moment FROM {stage} s '
+                    f'WHERE {_parent_filter(source, stage)}'
+                ))
+            if prune and source.name in PRUNABLE:
+                cursor.execute(prune_sql(source, stage))
+
+        # Los ids vienen de Moodle: las secuencias se ponen al día
+        models = [source.model for source in SOURCES if source.name in names]
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+        store_watermarks(marks)
+        beat()
+    return merged
+
+
+def store_watermarks(marks):
+    """Avanza las marcas de agua ({fuente: marca}); va dentro de la transacción del merge"""
+    for name, high in (marks or {}).items():
+        if high is None:
+            continue
+        watermark, _ = SyncWatermark.objects.select_for_update().get_or_create(source=name)
+        if high > watermark.value:
+            watermark.value = high
+            watermark.save(update_fields=['value', 'updated_at'])
+
+
+def current_watermarks(names):
+    """{fuente: marca de agua} de las fuentes incrementales ya sincronizadas"""
+    return dict(
+        SyncWatermark.objects.filter(source__in=names).values_list('source', 'value')
+    )
+
+
+# ============================================================================
+# CONCILIACIÓN DE BAJAS (checksums por bucket)
+# ============================================================================
+
+def _bucket(a, b):
+    return (a * RECONCILE_MIX + b) % RECONCILE_BUCKETS
+
+
+def _key_positions(source):
+    return [source.columns.index(column) for column in source.conflict]
+
+
+def source_checksums(source, path=None):
+    """{bucket: (filas, Σ clave, Σ clave²)} de las claves del origen"""
+    i, j = _key_positions(source)
+    sums = {}
+    for values in source.rows(source.records(path)):
+        a, b = values[i], values[j]
+        key = a * RECONCILE_SHIFT + b
+        entry = sums.setdefault(_bucket(a, b), [0, 0, 0])
+        entry[0] += 1
+        entry[1] += key
+        entry[2] += key * key
+    return {bucket: tuple(entry) for bucket, entry in sums.items()}
+
+
+def _bucket_sql(source):
+    a, b = source.conflict
+    return f'mod({a}::bigint * {RECONCILE_MIX} + {b}, {RECONCILE_BUCKETS})'
+
+
+def table_checksums(source):
+    """Los mismos checksums calculados en la base, agrupados por bucket"""
+    a, b = source.conflict
+    key = f'({a}::numeric * {RECONCILE_SHIFT} + {b})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {_bucket_sql(source)}, count(*), sum({key}), sum({key} * {key}) '
+            f'FROM {source.table} GROUP BY 1'
+        )
+        return {
+            bucket: (count, int(total), int(squares))
+            for bucket, count, total, squares in cursor.fetchall()
+        }
+
+
+def reconcile_source(source, path=None):
+    """
+    Borra las filas que ya no están en el origen (un export completo o, sin
+    `path`, la base de Moodle).
+
+    Solo se comparan clave por clave los buckets cuyos checksums difieren.
+    Devuelve la cantidad de filas borradas.
+    """
+    expected = source_checksums(source, path)
+    stale_buckets = [
+        bucket for bucket, sums in table_checksums(source).items()
+        if expected.get(bucket) != sums
+    ]
+
+    deleted = 0
+    if stale_buckets:
+        i, j = _key_positions(source)
+        buckets = set(stale_buckets)
+        keep = {
+            (values[i], values[j]) for values in source.rows(source.records(path))
+            if _bucket(values[i], values[j]) in buckets
+        }
+        a, b = source.conflict
+        with atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [MERGE_LOCK_KEY])
+            cursor.execute(
+                f'SELECT {a}, {b} FROM {source.table} WHERE {_bucket_sql(source)} = ANY(%s)',
+                [stale_buckets],
+            )
+            stale = [key for key in cursor.fetchall() if key not in keep]
+            for start in range(0, len(stale), RECONCILE_DELETE_BATCH):
+                batch = stale[start:start + RECONCILE_DELETE_BATCH]
+                cursor.execute(
+                    f'DELETE FROM {source.table} t '
+                    f'USING unnest(%s::bigint[], %s::bigint[]) AS d(a, b) '
+                    f'WHERE t.{a} = d.a AND t.{b} = d.b',
+                    [[key[0] for key in batch], [key[1] for key in batch]],
+                )
+                deleted += cursor.rowcount
+
+    SyncWatermark.objects.update_or_create(
+        source=source.name, defaults={'reconciled_at': timezone.now()}
+    )
+    return deleted
+
+
+def run_import(paths, workers=1, prune=False, incremental=False, reconcile=False, shadow=False):
+    """
+    Carga e integra las fuentes de `paths` ({fuente: archivo o None}).
+
+    Con `shadow` reemplaza las tablas completas (ver shadow.py). Al terminar
+    publica un snapshot columnar nuevo (snapshot.py). Devuelve (filas
+    cargadas, filas integradas, filas borradas por la conciliación), cada
+    uno {fuente: cantidad}.
+    """
+    if not paths:
+        return {}, {}, {}
+    if shadow:
+        from .shadow import shadow_reload
+        result = shadow_reload(paths, workers)
+        roll_up_access_cube()
+        build_snapshot()
+        return result
+
+    run_id = os.getpid()
+    sources = [SOURCES_BY_NAME[name] for name in paths]
+    since = current_watermarks(list(paths)) if incremental else None
+    for source in sources:
+        create_stage(source, run_id)
+    try:
+        stages = load_stages(paths, run_id, workers, since)
+        marks = {name: high for name, (_, high) in stages.items()}
+        merged = merge_stages(set(paths), run_id, prune, incremental, marks)
+    finally:
+        for source in sources:
+            drop_stage(source, run_id)
+
+    removed = {}
+    if reconcile:
+        for source in sources:
+            if source.name in PRUNABLE:
+                removed[source.name] = reconcile_source(source, paths[source.name])
+
+    if 'categories' in paths:
+        rebuild_category_closure()
+    bump_data_version()
+    roll_up_access_cube()
+    build_snapshot()
+    loaded = {name: count for name, (count, _) in stages.items()}
+    return loaded, merged, removed
+
+
+def import_ndjson(export_dir=None, names=None, **options):
+    """Importa los archivos presentes del export (ver run_import)"""
+    export_dir = export_dir or tenant_path(Path(settings.MOODLE_EXPORT_DIR))
+    names = names or [source.name for source in SOURCES]
+    paths = {
+        name: os.path.join(export_dir, SOURCES_BY_NAME[name].filename)
+        for name in names
+        if os.path.isfile(os.path.join(export_dir, SOURCES_BY_NAME[name].filename))
+    }
+    return run_import(paths, **options)
+
+
+def sync_moodle_db(names=None, **options):
+    """Sincroniza directamente desde las tablas mdl_* (ver run_import)"""
+    names = names or [source.name for source in SOURCES]
+    return run_import({name: None for name in names}, **options)
@@ -0,0 +1,69 @@
+"""
+Comando para archivar en frío los meses viejos de la bitácora de accesos
+Pensado para correr una vez por mes (cron); ver apps/moodle/archive.py
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.archive import (
+    archivable_months, archive_detached, archive_month, load_manifest, pending_detached,
+)
+from apps.moodle.cube import roll_up_access_cube
+from apps.moodle.tenants import connection
+
+
+class Command(BaseCommand):
+    help = 'Pasa las particiones viejas de AccessEvent a archivos .npz comprimidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=settings.ACCESS_ARCHIVE_AFTER_MONTHS,
+            help=f'Archivar meses anteriores a este horizonte (por defecto: {settings.ACCESS_ARCHIVE_AFTER_MONTHS})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar qué meses se archivarían',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Mostrar el manifest de meses archivados',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('La bitácora sólo está particionada en PostgreSQL')
+        if options['older_than_months'] < 1:
+            raise CommandError('--older-than-months debe ser al menos 1')
+
+        if options['list']:
+            for month, entry in load_manifest().items():
+                self.stdout.write(f'  {month}: {entry["rows"]} filas ({entry["file"]})')
+            return
+
+        # El cubo conserva los meses archivados: primero se agregan sus eventos
+        if not options['dry_run']:
+            roll_up_access_cube()
+
+        # Particiones separadas por una corrida anterior que se cortó
+        for table, month in pending_detached():
+            if options['dry_run']:
+                self.stdout.write(f'  {month:%Y-%m} (pendiente de una corrida anterior)')
+                continue
+            rows = archive_detached(table, month)
+            self.stdout.write(self.style.SUCCESS(f'✓ {month:%Y-%m}: {rows} filas archivadas (retomado)'))
+
+        months = archivable_months(options['older_than_months'])
+        if not months:
+            self.stdout.write('No hay meses para archivar.')
+            return
+
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f'  {month:%Y-%m}')
+                continue
+            rows = archive_month(month)
+            self.stdout.write(self.style.SUCCESS(f'✓ {month:%Y-%m}: {rows} filas archivadas'))
@@ -0,0 +1,23 @@
+"""
+Comando para completar la actividad semanal desde los datos ya cargados
+Las cargas la mantienen solas; hace falta una vez sobre datos previos a la tabla
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.activity import backfill_weekly_activity
+from apps.moodle.models import WeeklyActivity
+from apps.moodle.tenants import connection
+
+
+class Command(BaseCommand):
+    help = 'Prende las semanas de actividad de la bitácora y de los últimos accesos'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('La actividad semanal se calcula en PostgreSQL')
+
+        self.stdout.write('Recorriendo bitácora y últimos accesos...')
+        written = backfill_weekly_activity()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {written} filas escritas ({WeeklyActivity.objects.count()} en la tabla)'
+        ))
@@ -0,0 +1,88 @@
+"""
+Comando que consume eventos de acceso dejados como archivos NDJSON en un spool
+Alternativa al endpoint HTTP cuando Moodle (o un logstore) escribe a disco
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.events import BufferFull, access_event_buffer, parse_ndjson_events
+from apps.moodle.tenants import connection, tenant_path
+
+
+PROCESSING_SUFFIX = '.processing'
+
+
+class Command(BaseCommand):
+    help = 'Consume archivos *.ndjson de eventos de acceso del directorio de spool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=None,
+            help='Directorio de spool (por defecto: ACCESS_EVENTS_SPOOL_DIR)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesar lo pendiente y salir (sin quedar esperando archivos)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Segundos entre revisiones del directorio (por defecto: 1)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El volcado de eventos usa unnest/ON CONFLICT: requiere PostgreSQL')
+
+        spool = Path(options['dir'] or tenant_path(settings.ACCESS_EVENTS_SPOOL_DIR))
+        if not spool.is_dir():
+            raise CommandError(f'No existe el directorio: {spool}')
+
+        buffer = access_event_buffer()
+        # Archivos que quedaron tomados por una corrida interrumpida
+        for path in sorted(spool.glob(f'*.ndjson{PROCESSING_SUFFIX}')):
+            self._consume(buffer, path)
+
+        while True:
+            for path in sorted(spool.glob('*.ndjson')):
+                claimed = path.with_name(path.name + PROCESSING_SUFFIX)
+                try:
+                    path.rename(claimed)
+                except FileNotFoundError:
+                    continue  # lo tomó otro consumidor
+                self._consume(buffer, claimed)
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+    def _consume(self, buffer, path):
+        accepted = rejected = 0
+        with open(path, 'rb') as fh:
+            while True:
+                lines = fh.readlines(1 << 20)
+                if not lines:
+                    break
+                events, bad = parse_ndjson_events(lines)
+                rejected += bad
+                for start in range(0, len(events), buffer.flush_size):
+                    chunk = events[start:start + buffer.flush_size]
+                    while True:
+                        try:
+                            accepted += buffer.add(chunk)
+                            break
+                        except BufferFull:
+                            buffer.flush()
+
+        # El archivo se borra recién cuando sus eventos están en la base
+        buffer.flush()
+        path.unlink()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {path.name.removesuffix(PROCESSING_SUFFIX)}: {accepted} eventos '
+            f'({rejected} rechazados)'
+        ))
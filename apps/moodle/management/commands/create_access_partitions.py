@@ -0,0 +1,57 @@
+"""
+Comando para crear por adelantado las particiones mensuales de la bitácora
+Pensado para correr una vez por día o por semana (cron)
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.moodle.partitions import (
+    PARTITION_MONTHS_AHEAD, add_months, ensure_partitions, list_partitions, month_start,
+)
+from apps.moodle.tenants import connection
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones mensuales de AccessEvent que falten'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=PARTITION_MONTHS_AHEAD,
+            help=f'Meses a cubrir por delante del actual (por defecto: {PARTITION_MONTHS_AHEAD})',
+        )
+        parser.add_argument(
+            '--from',
+            dest='from_month',
+            help='Crear también desde este mes YYYY-MM (para cargar historia)',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Mostrar las particiones existentes',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('La bitácora sólo está particionada en PostgreSQL')
+
+        current = month_start(timezone.now())
+        first = current
+        if options['from_month']:
+            try:
+                first = month_start(datetime.strptime(options['from_month'], '%Y-%m').date())
+            except ValueError:
+                raise CommandError(f'Mes inválido: {options["from_month"]} (formato YYYY-MM)')
+        last = add_months(current, max(options['months_ahead'], 0))
+
+        created = ensure_partitions(min(first, current), last)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {created} particiones creadas (cubierto hasta {last:%Y-%m})'
+        ))
+
+        if options['list']:
+            for name, lower, upper, estimate in list_partitions():
+                self.stdout.write(f'  {name}: {lower[:10]} → {upper[:10]} (~{estimate} filas)')
@@ -0,0 +1,78 @@
+"""
+Comando para generar el reporte masivo de usuarios sin acceso de una categoría
+(todas las carreras/cursos/grupos debajo de, por ejemplo, "Grado/Ingeniería")
+"""
+import os
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.moodle.bulk import resolve_category, write_faculty_report
+from apps.moodle.reports import GRANULARITIES
+
+
+class Command(BaseCommand):
+    help = 'Genera el CSV de usuarios sin acceso de todos los cursos y grupos de una categoría'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category',
+            required=True,
+            help='Id o ruta de nombres de la categoría, ej. "Grado/Ingeniería"',
+        )
+        parser.add_argument('--from', dest='from_date', help='Fecha inicial YYYY-MM-DD')
+        parser.add_argument('--to', dest='to_date', help='Fecha final YYYY-MM-DD (por defecto: hoy)')
+        parser.add_argument(
+            '--granularity',
+            default='week',
+            choices=[key for key, _ in GRANULARITIES],
+            help='Granularidad de la serie (por defecto: week)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos en paralelo, uno por curso a la vez (por defecto: CPUs)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Archivo de salida (por defecto: REPORTS_DIR, descargable desde el panel)',
+        )
+
+    def _parse_date(self, value):
+        try:
+            return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {value} (formato YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        category = resolve_category(options['category'])
+        if category is None:
+            raise CommandError(f'Categoría no encontrada: {options["category"]}')
+
+        to_date = self._parse_date(options['to_date']) if options['to_date'] else timezone.now()
+        if options['from_date']:
+            from_date = self._parse_date(options['from_date'])
+        else:
+            from_date = to_date - timedelta(days=30)
+        if from_date > to_date:
+            from_date, to_date = to_date, from_date
+
+        self.stdout.write(
+            f'Generando reporte de "{category.name}" '
+            f'({from_date:%Y-%m-%d} → {to_date:%Y-%m-%d}, {options["workers"]} procesos)...'
+        )
+
+        started = timezone.now()
+        output, total_courses = write_faculty_report(
+            category, from_date, to_date,
+            granularity=options['granularity'],
+            workers=max(1, options['workers']),
+            output=options['output'],
+        )
+        elapsed = (timezone.now() - started).total_seconds()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total_courses} cursos procesados en {elapsed:.1f}s → {output}'
+        ))
@@ -1,22 +1,16 @@
 """
 Comando para cargar datos mock que simulan una base de datos de Moodle
-Genera datos realistas para testing y desarrollo con escala configurable
+Genera datos realistas para testing y desarrollo con escala configurable;
+la generación y la carga (COPY) están en apps/moodle/mockdata.py
 """
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-import random
-from apps.moodle.models import (
-    Category, Course, MoodleUser, Group, GroupMember,
-    Enrol, UserEnrolment, UserLastAccess, Role, RoleAssignment
-)
+import os
+import time
 
-# CONSTANTES DE CONFIGURACIÓN
-TOTAL_USERS = 3200
-TOTAL_COURSES = 200
-NUM_CAREERS = 5
-NUM_MODALITIES = 2
-COURSES_PER_SEMESTER = TOTAL_COURSES // 2  # Mitad primer cuatri, mitad segundo
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.mockdata import clear_mock_data, load_mock_data, scaled_sizes
+from apps.moodle.tenants import connection
 
 
 class Command(BaseCommand):
@@ -26,7 +20,10 @@ class Command(BaseCommand):
         parser.add_argument(
             '--clear',
             action='store_true',
-            help='Limpia todos los datos antes de cargar',
+            help=(
+                'Vacía las tablas vivas con TRUNCATE antes de cargar: no es seguro '
+                'con el sitio en servicio (para recargar en vivo usar import_moodle)'
+            ),
         )
         parser.add_argument(
             '--scale',
@@ -35,378 +32,83 @@ class Command(BaseCommand):
             choices=['-1', '-2', '-4'],
             help='Escala de datos: -1 (total=3200), -2 (mitad=1600), -4 (cuarto=800)',
         )
+        parser.add_argument(
+            '--users',
+            type=int,
+            help='Cantidad de usuarios (reemplaza la de --scale)',
+        )
+        parser.add_argument(
+            '--courses',
+            type=int,
+            help='Cantidad de cursos (reemplaza la de --scale)',
+        )
+        parser.add_argument(
+            '--events',
+            type=int,
+            help='Total de eventos de la bitácora (por defecto: hasta 15 accesos previos por acceso)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Semilla para reproducir un conjunto (por defecto se sortea y se muestra)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos para generar y cargar (por defecto: cantidad de CPUs)',
+        )
 
     def handle(self, *args, **options):
-        # Determinar escala
-        scale_factor = {
-            '-1': 1,      # Total
-            '-2': 2,      # Mitad
-            '-4': 4,      # Cuarto
-        }[options['scale']]
-
-        users_to_create = TOTAL_USERS // scale_factor
-        courses_to_create = TOTAL_COURSES // scale_factor
+        if connection.vendor != 'postgresql':
+            raise CommandError('La carga de datos mock usa COPY y requiere PostgreSQL')
+
+        users, courses = scaled_sizes(options['scale'])
+        users = options['users'] if options['users'] is not None else users
+        courses = options['courses'] if options['courses'] is not None else courses
+        if users < 1 or courses < 1:
+            raise CommandError('--users y --courses deben ser al menos 1')
+        if options['events'] is not None and options['events'] < 0:
+            raise CommandError('--events no puede ser negativo')
+        seed = options['seed']
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**32)
 
         self.stdout.write(self.style.WARNING(f'\nEscala seleccionada: {options["scale"]}'))
-        self.stdout.write(f'  Usuarios a crear: {users_to_create}')
-        self.stdout.write(f'  Cursos a crear: {courses_to_create}\n')
+        self.stdout.write(f'  Usuarios a crear: {users}')
+        self.stdout.write(f'  Cursos a crear: {courses}')
+        self.stdout.write(f'  Semilla: {seed} (repetir con --seed {seed})\n')
 
         if options['clear']:
             self.stdout.write('Limpiando datos existentes...')
-            UserLastAccess.objects.all().delete()
-            UserEnrolment.objects.all().delete()
-            Enrol.objects.all().delete()
-            GroupMember.objects.all().delete()
-            Group.objects.all().delete()
-            MoodleUser.objects.all().delete()
-            Course.objects.all().delete()
-            Category.objects.all().delete()
+            clear_mock_data()
             self.stdout.write(self.style.SUCCESS('✓ Datos eliminados'))
 
         self.stdout.write('Generando datos mock de Moodle...')
-
-        # 1. Categorías (Grado y Postgrado como modalidades, carreras dentro)
-        self.stdout.write('Creando categorías...')
-
-        # Modalidades principales
-        cat_grado = Category.objects.create(
-            name='Grado',
-            path='/1',
-            depth=1
-        )
-
-        cat_postgrado = Category.objects.create(
-            name='Postgrado',
-            path='/2',
-            depth=1
-        )
-
-        # 5 Carreras en Grado
-        careers_grado = [
-            'Derecho',
-            'Economía',
-            'Ingeniería',
-            'Medicina',
-            'Arquitectura',
-        ]
-
-        career_categories = []
-        for i, career_name in enumerate(careers_grado):
-            cat = Category.objects.create(
-                name=career_name,
-                path=f'/1/{3+i}',
-                parent=cat_grado,
-                depth=2
-            )
-            career_categories.append(cat)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {Category.objects.count()} categorías creadas'))
-
-        # 2. Cursos (200 cursos: mitad primer cuatri, mitad segundo cuatri)
-        self.stdout.write('Creando cursos...')
-
-        current_year = timezone.now().year
-        now = timezone.now()
-
-        courses = []
-        courses_per_career = courses_to_create // NUM_CAREERS
-
-        # Nombres de materias por carrera
-        subjects_by_career = {
-            'Derecho': ['Derecho Civil', 'Derecho Penal', 'Derecho Constitucional', 'Derecho Laboral',
-                       'Derecho Internacional', 'Derecho Comercial', 'Filosofía del Derecho',
-                       'Derecho Procesal', 'Derecho Administrativo', 'Derecho Tributario'],
-            'Economía': ['Microeconomía', 'Macroeconomía', 'Econometría', 'Finanzas',
-                        'Contabilidad', 'Estadística', 'Matemática Financiera',
-                        'Análisis Económico', 'Economía Internacional', 'Política Económica'],
-            'Ingeniería': ['Cálculo', 'Física', 'Álgebra', 'Programación',
-                          'Estructuras', 'Electrónica', 'Termodinámica',
-                          'Mecánica', 'Materiales', 'Proyecto Final'],
-            'Medicina': ['Anatomía', 'Fisiología', 'Bioquímica', 'Farmacología',
-                        'Patología', 'Clínica Médica', 'Cirugía', 'Pediatría',
-                        'Ginecología', 'Medicina Interna'],
-            'Arquitectura': ['Diseño Arquitectónico', 'Historia de la Arquitectura', 'Estructuras',
-                            'Construcciones', 'Urbanismo', 'Instalaciones',
-                            'Proyecto Arquitectónico', 'Morfología', 'Materialidad', 'Taller'],
-        }
-
-        for idx, category in enumerate(career_categories):
-            career_name = category.name
-            subjects = subjects_by_career.get(career_name, ['Materia'])
-
-            for i in range(courses_per_career):
-                # Determinar si es primer o segundo cuatrimestre
-                is_first_semester = i < (courses_per_career // 2)
-
-                if is_first_semester:
-                    # Primer cuatrimestre: marzo a julio
-                    start = timezone.datetime(current_year, 3, random.randint(1, 15), tzinfo=timezone.get_current_timezone())
-                    end = start + timedelta(days=120)
-                    semester = '1C'
-                else:
-                    # Segundo cuatrimestre: agosto a diciembre
-                    start = timezone.datetime(current_year, 8, random.randint(1, 15), tzinfo=timezone.get_current_timezone())
-                    end = start + timedelta(days=120)
-                    semester = '2C'
-
-                # Seleccionar materia
-                subject = random.choice(subjects)
-                year_level = random.randint(1, 5)
-
-                course_code = f'{career_name[:3].upper()}-{year_level}{i:02d}-{semester}-{current_year}'
-                course_name = f'{subject} - Año {year_level} ({semester} {current_year})'
-
-                course = Course.objects.create(
-                    shortname=course_code,
-                    fullname=course_name,
-                    category=category,
-                    startdate=start,
-                    enddate=end,
-                    visible=True
-                )
-                courses.append(course)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {Course.objects.count()} cursos creados'))
-
-        # 3. Usuarios (3200, 1600 o 800 según escala)
-        self.stdout.write(f'Creando {users_to_create} usuarios...')
-
-        nombres = [
-            'Juan', 'María', 'Carlos', 'Ana', 'Pedro', 'Laura', 'Diego', 'Sofia',
-            'Miguel', 'Valentina', 'Lucas', 'Camila', 'Mateo', 'Isabella', 'Santiago',
-            'Martina', 'Nicolás', 'Catalina', 'Sebastián', 'Emilia', 'Tomás', 'Agustina',
-            'Felipe', 'Josefina', 'Joaquín', 'Victoria', 'Manuel', 'Antonella', 'Pablo',
-            'Carolina', 'Andrés', 'Francisca', 'Gabriel', 'Mercedes', 'Rodrigo'
-        ]
-
-        apellidos = [
-            'García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez',
-            'Sánchez', 'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez',
-            'Fernández', 'Díaz', 'Morales', 'Jiménez', 'Álvarez', 'Romero',
-            'Herrera', 'Medina', 'Castro', 'Vargas', 'Ortiz', 'Silva'
-        ]
-
-        users = []
-        batch_size = 1000
-
-        for i in range(users_to_create):
-            nombre = random.choice(nombres)
-            apellido = random.choice(apellidos)
-
-            user = MoodleUser(
-                username=f'user{i:05d}',
-                firstname=nombre,
-                lastname=apellido,
-                email=f'{nombre.lower()}.{apellido.lower()}{i}@universidad.edu.ar'
-            )
-            users.append(user)
-
-            # Bulk create cada 1000 usuarios
-            if len(users) >= batch_size:
-                MoodleUser.objects.bulk_create(users)
-                self.stdout.write(f'  Creados {i+1}/{users_to_create} usuarios...')
-                users = []
-
-        # Crear los restantes
-        if users:
-            MoodleUser.objects.bulk_create(users)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {MoodleUser.objects.count()} usuarios creados'))
-
-        # 4. Grupos (2-3 por curso)
-        self.stdout.write('Creando grupos...')
-
-        all_users = list(MoodleUser.objects.all())
-        groups = []
-
-        for course in courses:
-            num_groups = random.randint(2, 3)
-            for grupo_num in range(1, num_groups + 1):
-                group = Group.objects.create(
-                    name=f'Comisión {grupo_num}',
-                    course=course,
-                    description=f'Comisión {grupo_num} de {course.shortname}'
-                )
-                groups.append(group)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {Group.objects.count()} grupos creados'))
-
-        # 5. Inscripciones de usuarios a grupos
-        self.stdout.write('Inscribiendo usuarios a grupos...')
-
-        group_members = []
-        students_per_group = max(20, users_to_create // len(groups))
-
-        for group in groups:
-            # Entre 20 y students_per_group estudiantes por grupo
-            num_students = random.randint(20, min(students_per_group, len(all_users)))
-            selected_users = random.sample(all_users, num_students)
-
-            for user in selected_users:
-                group_members.append(
-                    GroupMember(group=group, user=user)
-                )
-
-            # Bulk create cada 2000 registros
-            if len(group_members) >= 2000:
-                GroupMember.objects.bulk_create(group_members, ignore_conflicts=True)
-                self.stdout.write(f'  Creados {len(group_members)} miembros de grupos...')
-                group_members = []
-
-        if group_members:
-            GroupMember.objects.bulk_create(group_members, ignore_conflicts=True)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {GroupMember.objects.count()} miembros de grupos creados'))
-
-        # 6. Métodos de inscripción
-        self.stdout.write('Creando métodos de inscripción...')
-
-        enrols = []
-        for course in courses:
-            enrol = Enrol.objects.create(
-                course=course,
-                enrol='manual',
-                status=True
-            )
-            enrols.append(enrol)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {Enrol.objects.count()} métodos de inscripción creados'))
-
-        # 7. Inscripciones de usuarios a cursos
-        self.stdout.write('Inscribiendo usuarios a cursos...')
-
-        user_enrolments = []
-
-        for enrol in enrols:
-            # Obtener todos los usuarios que están en grupos de este curso
-            course_users = set()
-            for group in enrol.course.groups.all():
-                for member in group.members.all():
-                    course_users.add(member.user)
-
-            for user in course_users:
-                user_enrolments.append(
-                    UserEnrolment(
-                        enrol=enrol,
-                        user=user,
-                        timestart=enrol.course.startdate,
-                        timeend=enrol.course.enddate
-                    )
-                )
-
-            # Bulk create cada 2000
-            if len(user_enrolments) >= 2000:
-                UserEnrolment.objects.bulk_create(user_enrolments, ignore_conflicts=True)
-                self.stdout.write(f'  Creadas {len(user_enrolments)} inscripciones...')
-                user_enrolments = []
-
-        if user_enrolments:
-            UserEnrolment.objects.bulk_create(user_enrolments, ignore_conflicts=True)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {UserEnrolment.objects.count()} inscripciones creadas'))
-
-        # 8. Últimos accesos (70% de usuarios con acceso)
-        self.stdout.write('Generando datos de accesos (70% de usuarios)...')
-
-        accesses = []
-
-        for course in courses:
-            enrolled_users = set()
-            for ue in UserEnrolment.objects.filter(enrol__course=course):
-                enrolled_users.add(ue.user)
-
-            for user in enrolled_users:
-                # 70% de probabilidad de tener acceso
-                if random.random() < 0.7:
-                    # Acceso en los últimos 60 días
-                    days_ago = random.randint(0, 60)
-                    access_time = now - timedelta(days=days_ago, hours=random.randint(0, 23))
-
-                    accesses.append(
-                        UserLastAccess(
-                            user=user,
-                            course=course,
-                            timeaccess=access_time
-                        )
-                    )
-
-            # Bulk create cada 5000
-            if len(accesses) >= 5000:
-                UserLastAccess.objects.bulk_create(accesses, ignore_conflicts=True)
-                self.stdout.write(f'  Creados {len(accesses)} registros de acceso...')
-                accesses = []
-
-        if accesses:
-            UserLastAccess.objects.bulk_create(accesses, ignore_conflicts=True)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {UserLastAccess.objects.count()} registros de acceso creados'))
-
-        # 7. CREAR ROLES Y ASIGNACIONES
-        self.stdout.write(self.style.WARNING('\n[7/7] Creando roles y asignaciones...'))
-
-        # Crear roles básicos
-        role_student, _ = Role.objects.get_or_create(
-            shortname='student',
-            defaults={'name': 'Estudiante'}
-        )
-        role_teacher, _ = Role.objects.get_or_create(
-            shortname='teacher',
-            defaults={'name': 'Profesor'}
-        )
-        role_editing, _ = Role.objects.get_or_create(
-            shortname='editingteacher',
-            defaults={'name': 'Profesor Editor'}
+        started = time.monotonic()
+        counts = load_mock_data(
+            users, courses,
+            events=options['events'],
+            seed=seed,
+            workers=max(options['workers'], 1),
+            progress=lambda message: self.stdout.write(self.style.SUCCESS(f'✓ {message}')),
         )
 
-        self.stdout.write(f'  Creados {Role.objects.count()} roles')
-
-        # Asignar roles a usuarios en cursos
-        role_assignments = []
-        all_users = list(MoodleUser.objects.all())
-        all_courses = list(Course.objects.all())
-
-        # 95% estudiantes, 4% profesores, 1% editores
-        for enrollment in UserEnrolment.objects.select_related('user', 'enrol__course'):
-            rand = random.random()
-            if rand < 0.95:  # 95% estudiantes
-                role = role_student
-            elif rand < 0.99:  # 4% profesores
-                role = role_teacher
-            else:  # 1% editores
-                role = role_editing
-
-            role_assignments.append(
-                RoleAssignment(
-                    role=role,
-                    user=enrollment.user,
-                    course=enrollment.enrol.course
-                )
-            )
-
-            # Bulk create cada 5000
-            if len(role_assignments) >= 5000:
-                RoleAssignment.objects.bulk_create(role_assignments, ignore_conflicts=True)
-                self.stdout.write(f'  Creadas {len(role_assignments)} asignaciones de roles...')
-                role_assignments = []
-
-        if role_assignments:
-            RoleAssignment.objects.bulk_create(role_assignments, ignore_conflicts=True)
-
-        self.stdout.write(self.style.SUCCESS(f'✓ {RoleAssignment.objects.count()} asignaciones de roles creadas'))
-
         # Resumen final
         self.stdout.write('\n' + '='*70)
         self.stdout.write(self.style.SUCCESS('RESUMEN DE DATOS GENERADOS:'))
-        self.stdout.write(f'  Escala: {options["scale"]} (factor {scale_factor}x)')
-        self.stdout.write(f'  Categorías: {Category.objects.count()}')
-        self.stdout.write(f'  Cursos: {Course.objects.count()} ({courses_to_create // 2} por cuatrimestre)')
-        self.stdout.write(f'  Usuarios: {MoodleUser.objects.count()}')
-        self.stdout.write(f'  Grupos: {Group.objects.count()}')
-        self.stdout.write(f'  Miembros de grupos: {GroupMember.objects.count()}')
-        self.stdout.write(f'  Métodos de inscripción: {Enrol.objects.count()}')
-        self.stdout.write(f'  Inscripciones: {UserEnrolment.objects.count()}')
-        self.stdout.write(f'  Registros de acceso: {UserLastAccess.objects.count()}')
-        self.stdout.write(f'  Roles: {Role.objects.count()}')
-        self.stdout.write(f'  Asignaciones de roles: {RoleAssignment.objects.count()}')
+        self.stdout.write(f'  Semilla: {seed}')
+        self.stdout.write(f'  Categorías: {counts["categories"]}')
+        self.stdout.write(f'  Cursos: {counts["courses"]}')
+        self.stdout.write(f'  Usuarios: {counts["users"]}')
+        self.stdout.write(f'  Grupos: {counts["groups"]}')
+        self.stdout.write(f'  Miembros de grupos: {counts.get("group_members", 0)}')
+        self.stdout.write(f'  Métodos de inscripción: {counts["enrols"]}')
+        self.stdout.write(f'  Inscripciones: {counts.get("enrolments", 0)}')
+        self.stdout.write(f'  Registros de acceso: {counts.get("last_accesses", 0)}')
+        self.stdout.write(f'  Bitácora de accesos: {counts.get("events", 0)}')
+        self.stdout.write(f'  Actividad semanal: {counts.get("weekly_activity", 0)}')
+        self.stdout.write(f'  Asignaciones de roles: {counts.get("role_assignments", 0)}')
+        self.stdout.write(f'  Tiempo: {time.monotonic() - started:.1f}s')
         self.stdout.write('='*70)
         self.stdout.write(self.style.SUCCESS('\n✓ Datos mock cargados exitosamente'))
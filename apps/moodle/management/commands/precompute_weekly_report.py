@@ -0,0 +1,68 @@
+"""
+Comando para precalcular la serie semanal de usuarios sin acceso
+Pensado para correr de noche (cron) y servir el panel desde la tabla
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.moodle.models import WeeklyNeverAccess
+from apps.moodle.reports import precompute_weekly_never_accessed
+
+
+class Command(BaseCommand):
+    help = 'Precalcula usuarios sin acceso por (curso, grupo, semana) en una sola pasada'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='from_date',
+            help='Fecha inicial YYYY-MM-DD (por defecto: hoy menos --weeks semanas)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_date',
+            help='Fecha final YYYY-MM-DD (por defecto: hoy)',
+        )
+        parser.add_argument(
+            '--weeks',
+            type=int,
+            default=26,
+            help='Semanas hacia atrás cuando no se indica --from (por defecto: 26)',
+        )
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='courses',
+            help='Limitar a un curso (se puede repetir)',
+        )
+
+    def _parse_date(self, value):
+        try:
+            return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {value} (formato YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        to_date = self._parse_date(options['to_date']) if options['to_date'] else now
+        if options['from_date']:
+            from_date = self._parse_date(options['from_date'])
+        else:
+            from_date = to_date - timedelta(weeks=options['weeks'])
+
+        if from_date > to_date:
+            from_date, to_date = to_date, from_date
+
+        self.stdout.write(
+            f'Precalculando semanas entre {from_date:%Y-%m-%d} y {to_date:%Y-%m-%d}...'
+        )
+
+        written = precompute_weekly_never_accessed(from_date, to_date, options['courses'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {written} filas escritas '
+            f'({WeeklyNeverAccess.objects.values("group").distinct().count()} grupos)'
+        ))
@@ -0,0 +1,26 @@
+"""
+Comando para recalcular los conteos por curso y los totales de la institución
+Los triggers los mantienen solos; sirve para corregirlos tras cambios hechos
+con los triggers desactivados
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.coursestats import refresh_course_stats, system_totals
+from apps.moodle.models import CourseStats
+from apps.moodle.tenants import connection
+
+
+class Command(BaseCommand):
+    help = 'Recalcula CourseStats y SystemStats desde las tablas'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Los conteos se mantienen con triggers de PostgreSQL')
+
+        self.stdout.write('Recalculando conteos...')
+        refresh_course_stats()
+        totals = system_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {CourseStats.objects.count()} cursos; {totals["users"]} usuarios, '
+            f'{totals["groups"]} grupos, {totals["accesses"]} registros de acceso'
+        ))
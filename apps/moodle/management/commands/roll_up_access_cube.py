@@ -0,0 +1,31 @@
+"""
+Comando para poner al día el cubo de accesos (AccessCube)
+Las cargas lo mantienen solas; la primera corrida sobre datos previos a la
+tabla agrega toda la bitácora y los meses archivados
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.cube import rebuild_access_cube, roll_up_access_cube
+from apps.moodle.models import AccessCube
+from apps.moodle.tenants import connection
+
+
+class Command(BaseCommand):
+    help = 'Suma al cubo de accesos los eventos de la bitácora que falten'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Vacía el cubo y lo arma de nuevo (p. ej. tras cambiar TIME_ZONE)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El cubo se arma sobre la bitácora particionada de PostgreSQL')
+
+        self.stdout.write('Agregando eventos...')
+        added = rebuild_access_cube() if options['rebuild'] else roll_up_access_cube()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {added} eventos agregados ({AccessCube.objects.count()} celdas en el cubo)'
+        ))
@@ -0,0 +1,119 @@
+"""
+Comando para crear una base de Moodle de prueba (tablas mdl_*) en el alias
+MOODLE_DB_ALIAS, copiando los datos actuales de la plataforma.
+Sirve para probar sync_moodle_db sin acceso a un Moodle real, ej.:
+MOODLE_DB_ENGINE=django.db.backends.sqlite3 MOODLE_DB_NAME=/tmp/moodle.sqlite3
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.moodle.ingest import CONTEXT_COURSE
+from apps.moodle.models import (
+    Category, Course, Enrol, Group, GroupMember, MdlContext, MdlCourse,
+    MdlCourseCategory, MdlEnrol, MdlGroup, MdlGroupMember, MdlRole,
+    MdlRoleAssignment, MdlUser, MdlUserEnrolment, MdlUserLastAccess, MoodleUser,
+    Role, RoleAssignment, UserEnrolment, UserLastAccess,
+)
+
+
+BATCH_SIZE = 5000
+
+
+def _ts(value):
+    return int(value.timestamp()) if value else 0
+
+
+class Command(BaseCommand):
+    help = 'Crea y llena las tablas mdl_* de una base de Moodle de prueba con los datos actuales'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Borrar y recrear las tablas mdl_* si ya existen',
+        )
+
+    def _fill(self, model, rows):
+        total = 0
+        rows = iter(rows)
+        while batch := list(islice(rows, BATCH_SIZE)):
+            model.objects.using(self.alias).bulk_create(batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'✓ {model._meta.db_table}: {total} filas'))
+
+    def handle(self, *args, **options):
+        self.alias = settings.MOODLE_DB_ALIAS
+        if self.alias not in settings.DATABASES:
+            raise CommandError('No hay base de Moodle configurada (MOODLE_DB_NAME)')
+
+        tables = [
+            MdlCourseCategory, MdlCourse, MdlUser, MdlEnrol, MdlUserEnrolment, MdlGroup,
+            MdlGroupMember, MdlUserLastAccess, MdlRole, MdlContext, MdlRoleAssignment,
+        ]
+        connection = connections[self.alias]
+        existing = set(connection.introspection.table_names())
+        if not options['replace'] and any(model._meta.db_table in existing for model in tables):
+            raise CommandError(
+                f'La base "{self.alias}" ya tiene tablas de Moodle; usar --replace para recrearlas'
+            )
+
+        with connection.schema_editor() as editor:
+            for model in tables:
+                if model._meta.db_table in existing:
+                    editor.delete_model(model)
+                editor.create_model(model)
+
+        self._fill(MdlCourseCategory, (
+            MdlCourseCategory(id=c.id, name=c.name, parent=c.parent_id or 0, path=c.path, depth=c.depth)
+            for c in Category.objects.iterator()
+        ))
+        self._fill(MdlCourse, (
+            MdlCourse(id=c.id, category=c.category_id, fullname=c.fullname, shortname=c.shortname,
+                      startdate=_ts(c.startdate), enddate=_ts(c.enddate), visible=int(c.visible))
+            for c in Course.objects.iterator()
+        ))
+        self._fill(MdlContext, (
+            MdlContext(id=course_id, contextlevel=CONTEXT_COURSE, instanceid=course_id)
+            for course_id in Course.objects.values_list('id', flat=True).iterator()
+        ))
+        self._fill(MdlUser, (
+            MdlUser(id=u.id, username=u.username, firstname=u.firstname, lastname=u.lastname,
+                    email=u.email)
+            for u in MoodleUser.objects.iterator()
+        ))
+        self._fill(MdlEnrol, (
+            MdlEnrol(id=e.id, enrol=e.enrol, status=0 if e.status else 1, courseid=e.course_id)
+            for e in Enrol.objects.iterator()
+        ))
+        self._fill(MdlUserEnrolment, (
+            MdlUserEnrolment(id=ue.id, enrolid=ue.enrol_id, userid=ue.user_id,
+                             timestart=_ts(ue.timestart), timeend=_ts(ue.timeend),
+                             timecreated=_ts(ue.timecreated))
+            for ue in UserEnrolment.objects.iterator()
+        ))
+        self._fill(MdlGroup, (
+            MdlGroup(id=g.id, courseid=g.course_id, name=g.name, description=g.description)
+            for g in Group.objects.iterator()
+        ))
+        self._fill(MdlGroupMember, (
+            MdlGroupMember(id=m.id, groupid=m.group_id, userid=m.user_id, timeadded=_ts(m.timeadded))
+            for m in GroupMember.objects.iterator()
+        ))
+        self._fill(MdlUserLastAccess, (
+            MdlUserLastAccess(id=a.id, userid=a.user_id, courseid=a.course_id,
+                              timeaccess=_ts(a.timeaccess))
+            for a in UserLastAccess.objects.iterator()
+        ))
+        self._fill(MdlRole, (
+            MdlRole(id=r.id, name=r.name, shortname=r.shortname) for r in Role.objects.iterator()
+        ))
+        self._fill(MdlRoleAssignment, (
+            MdlRoleAssignment(id=ra.id, roleid=ra.role_id, contextid=ra.course_id, userid=ra.user_id,
+                              timemodified=_ts(ra.timecreated))
+            for ra in RoleAssignment.objects.filter(course__isnull=False).iterator()
+        ))
+
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Base de prueba "{self.alias}" lista'))
@@ -0,0 +1,74 @@
+"""
+Comando para sincronizar directamente desde la base de Moodle (tablas mdl_*)
+Lee con cursores del lado del servidor y reutiliza el staging + merge del
+importador NDJSON (apps/moodle/ingest.py)
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.moodle.ingest import PRUNABLE, SOURCES, sync_moodle_db
+from apps.moodle.tenants import connection
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza cursos, usuarios, grupos, inscripciones, roles y accesos desde la base de Moodle'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            action='append',
+            choices=[source.name for source in SOURCES],
+            help='Sincronizar solo esta tabla (se puede repetir)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Tablas leídas en paralelo (por defecto: CPUs)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Solo filas nuevas según la marca de agua de cada tabla',
+        )
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help=f'Detectar bajas por checksums de buckets ({", ".join(sorted(PRUNABLE))})',
+        )
+        parser.add_argument(
+            '--shadow',
+            action='store_true',
+            help='Recarga completa en tablas sombra con intercambio atómico (sin --incremental/--reconcile)',
+        )
+
+    def handle(self, *args, **options):
+        if settings.MOODLE_DB_ALIAS not in settings.DATABASES:
+            raise CommandError('No hay base de Moodle configurada (MOODLE_DB_NAME)')
+        if connection.vendor != 'postgresql':
+            raise CommandError('La sincronización usa COPY: requiere PostgreSQL')
+        if options['shadow'] and (options['incremental'] or options['reconcile']):
+            raise CommandError('--shadow es una recarga completa: no se combina con '
+                               '--incremental ni --reconcile')
+
+        self.stdout.write(f'Sincronizando desde la base "{settings.MOODLE_DB_ALIAS}"...')
+        started = time.monotonic()
+        loaded, merged, removed = sync_moodle_db(
+            options['only'], workers=options['workers'],
+            incremental=options['incremental'], reconcile=options['reconcile'],
+            shadow=options['shadow'],
+        )
+
+        for source in SOURCES:
+            if source.name in loaded:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {source.name}: {loaded[source.name]} cargadas, '
+                    f'{merged.get(source.name, 0)} integradas'
+                    + (f', {removed[source.name]} bajas' if source.name in removed else '')
+                ))
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Sincronización completa en {time.monotonic() - started:.1f} s'
+        ))
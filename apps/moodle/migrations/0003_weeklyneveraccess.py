@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-18 06:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0002_role_roleassignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyNeverAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(verbose_name='Inicio de semana')),
+                ('never', models.IntegerField(verbose_name='Aún no ingresaron')),
+                ('total_group', models.IntegerField(verbose_name='Integrantes del grupo')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculado')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_never_access', to='moodle.course', verbose_name='Curso')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_never_access', to='moodle.group', verbose_name='Grupo')),
+            ],
+            options={
+                'verbose_name': 'Resumen semanal sin acceso',
+                'verbose_name_plural': 'Resúmenes semanales sin acceso',
+                'ordering': ['course', 'group', 'week_start'],
+                'unique_together': {('group', 'week_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0003_weeklyneveraccess'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moodleuser',
+            index=models.Index(fields=['lastname', 'firstname', 'id'], name='moodle_mood_lastnam_1139a2_idx'),
+        ),
+    ]
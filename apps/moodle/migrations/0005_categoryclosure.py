@@ -0,0 +1,46 @@
+# Generated by Django 5.1 on 2026-10-18 06:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    """Carga inicial de la clausura desde los punteros parent existentes"""
+    Category = apps.get_model('moodle', 'Category')
+    CategoryClosure = apps.get_model('moodle', 'CategoryClosure')
+    db_alias = schema_editor.connection.alias
+
+    parents = dict(Category.objects.using(db_alias).values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    CategoryClosure.objects.using(db_alias).bulk_create(links, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0004_moodleuser_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.IntegerField(default=0, verbose_name='Distancia')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='moodle.category', verbose_name='Ancestro')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='moodle.category', verbose_name='Descendiente')),
+            ],
+            options={
+                'verbose_name': 'Relación de categorías',
+                'verbose_name_plural': 'Relaciones de categorías',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
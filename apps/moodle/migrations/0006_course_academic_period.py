@@ -0,0 +1,70 @@
+# Generated by Django 5.1 on 2026-10-18 06:29
+
+import re
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Copia de apps.moodle.periods al momento de la migración: la migración no
+# debe cambiar si más adelante cambian las reglas del período.
+YEAR_RE = re.compile(r'\b(20\d{2})\b')
+SEMESTER_RE = re.compile(r'\b([12])\s*C\b', re.IGNORECASE)
+
+
+def academic_period(fullname, shortname='', startdate=None):
+    name = fullname or shortname or ''
+    if startdate is not None and timezone.is_aware(startdate):
+        startdate = timezone.localtime(startdate)
+
+    year_match = YEAR_RE.search(name)
+    if year_match:
+        year = int(year_match.group(1))
+    else:
+        year = startdate.year if startdate is not None else None
+
+    semester_match = SEMESTER_RE.search(name) or SEMESTER_RE.search(shortname or '')
+    if semester_match:
+        semester = f'{semester_match.group(1)}C'
+    elif startdate is not None:
+        semester = '1C' if startdate.month <= 7 else '2C'
+    else:
+        semester = ''
+
+    return year, semester
+
+
+def fill_academic_period(apps, schema_editor):
+    Course = apps.get_model('moodle', 'Course')
+    db_alias = schema_editor.connection.alias
+    courses = list(Course.objects.using(db_alias).only('id', 'fullname', 'shortname', 'startdate'))
+    for course in courses:
+        course.academic_year, course.semester = academic_period(
+            course.fullname, course.shortname, course.startdate
+        )
+    Course.objects.using(db_alias).bulk_update(courses, ['academic_year', 'semester'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0005_categoryclosure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='academic_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='Año académico'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='semester',
+            field=models.CharField(blank=True, choices=[('1C', 'Primer cuatrimestre'), ('2C', 'Segundo cuatrimestre')], editable=False, max_length=2, verbose_name='Cuatrimestre'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['academic_year', 'semester'], name='moodle_cour_academi_b3e572_idx'),
+        ),
+        migrations.RunPython(fill_academic_period, migrations.RunPython.noop),
+    ]
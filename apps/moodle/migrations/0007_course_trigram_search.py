@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-18 06:31
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0006_course_academic_period'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['shortname'], name='course_shortname_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['fullname'], name='course_fullname_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
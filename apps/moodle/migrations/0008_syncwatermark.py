@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0007_course_trigram_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, unique=True, verbose_name='Fuente')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Marca de agua')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True, verbose_name='Última conciliación')),
+            ],
+            options={
+                'verbose_name': 'Marca de agua de sincronización',
+                'verbose_name_plural': 'Marcas de agua de sincronización',
+                'ordering': ['source'],
+            },
+        ),
+    ]
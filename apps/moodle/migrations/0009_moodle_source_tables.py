@@ -0,0 +1,170 @@
+# Generated by Django 5.1 on 2026-10-18 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0008_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MdlContext',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contextlevel', models.BigIntegerField()),
+                ('instanceid', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'mdl_context',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlCourse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.BigIntegerField(default=0)),
+                ('fullname', models.CharField(max_length=254)),
+                ('shortname', models.CharField(max_length=255)),
+                ('startdate', models.BigIntegerField(default=0)),
+                ('enddate', models.BigIntegerField(default=0)),
+                ('visible', models.SmallIntegerField(default=1)),
+                ('timemodified', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_course',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlCourseCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('parent', models.BigIntegerField(default=0)),
+                ('path', models.CharField(default='', max_length=255)),
+                ('depth', models.BigIntegerField(default=0)),
+                ('timemodified', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_course_categories',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlEnrol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrol', models.CharField(max_length=20)),
+                ('status', models.BigIntegerField(default=0)),
+                ('courseid', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'mdl_enrol',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('courseid', models.BigIntegerField()),
+                ('name', models.CharField(max_length=254)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('timemodified', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_groups',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlGroupMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('groupid', models.BigIntegerField()),
+                ('userid', models.BigIntegerField()),
+                ('timeadded', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_groups_members',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlRole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='', max_length=255)),
+                ('shortname', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'mdl_role',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlRoleAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('roleid', models.BigIntegerField()),
+                ('contextid', models.BigIntegerField()),
+                ('userid', models.BigIntegerField()),
+                ('timemodified', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_role_assignments',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=100)),
+                ('firstname', models.CharField(max_length=100)),
+                ('lastname', models.CharField(max_length=100)),
+                ('email', models.CharField(max_length=100)),
+                ('deleted', models.SmallIntegerField(default=0)),
+                ('suspended', models.SmallIntegerField(default=0)),
+                ('timemodified', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_user',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlUserEnrolment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.BigIntegerField(default=0)),
+                ('enrolid', models.BigIntegerField()),
+                ('userid', models.BigIntegerField()),
+                ('timestart', models.BigIntegerField(default=0)),
+                ('timeend', models.BigIntegerField(default=0)),
+                ('timecreated', models.BigIntegerField(default=0)),
+                ('timemodified', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_user_enrolments',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MdlUserLastAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('userid', models.BigIntegerField()),
+                ('courseid', models.BigIntegerField()),
+                ('timeaccess', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'mdl_user_lastaccess',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1 on 2026-10-18 06:46
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Solo PostgreSQL (como toda la base de Romanova): tabla particionada por mes
+# sobre timecreated; la clave primaria incluye la columna de partición
+CREATE_TABLE = """
+CREATE TABLE moodle_accessevent (
+    id bigserial NOT NULL,
+    user_id bigint NOT NULL,
+    course_id bigint NOT NULL,
+    role_id bigint NULL,
+    timecreated timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, timecreated)
+) PARTITION BY RANGE (timecreated);
+CREATE INDEX accessevent_time_brin ON moodle_accessevent USING brin (timecreated);
+"""
+
+# Crea las particiones mensuales (en UTC) que falten entre dos meses;
+# devuelve cuántas creó. El lock evita carreras entre escritores.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION moodle_accessevent_ensure_partitions(first_month date, last_month date)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    m date := date_trunc('month', first_month)::date;
+    partition text;
+    created integer := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('moodle_accessevent_partitions'));
+    WHILE m <= last_month LOOP
+        partition := 'moodle_accessevent_' || to_char(m, 'YYYY_MM');
+        IF to_regclass(partition) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF moodle_accessevent FOR VALUES FROM (%L) TO (%L)',
+                partition,
+                m::timestamp AT TIME ZONE 'UTC',
+                (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        m := (m + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END
+$$;
+"""
+
+# Último año y los próximos meses; después los mantiene create_access_partitions
+CREATE_INITIAL_PARTITIONS = """
+SELECT moodle_accessevent_ensure_partitions(
+    (date_trunc('month', now()) - interval '12 months')::date,
+    (date_trunc('month', now()) + interval '3 months')::date
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0009_moodle_source_tables'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_TABLE, 'DROP TABLE moodle_accessevent;'),
+                migrations.RunSQL(
+                    CREATE_FUNCTION,
+                    'DROP FUNCTION moodle_accessevent_ensure_partitions(date, date);',
+                ),
+                migrations.RunSQL(CREATE_INITIAL_PARTITIONS, migrations.RunSQL.noop),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='AccessEvent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('timecreated', models.DateTimeField(verbose_name='Momento del acceso')),
+                        ('course', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_events', to='moodle.course', verbose_name='Curso')),
+                        ('role', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_events', to='moodle.role', verbose_name='Rol')),
+                        ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_events', to='moodle.moodleuser', verbose_name='Usuario')),
+                    ],
+                    options={
+                        'verbose_name': 'Acceso a curso',
+                        'verbose_name_plural': 'Accesos a cursos',
+                        'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['timecreated'], name='accessevent_time_brin')],
+                    },
+                ),
+            ],
+        ),
+    ]
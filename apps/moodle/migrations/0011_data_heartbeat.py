@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0010_access_event_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beat', models.DateTimeField(verbose_name='Última escritura')),
+            ],
+            options={
+                'verbose_name': 'Latido de datos',
+                'verbose_name_plural': 'Latidos de datos',
+            },
+        ),
+    ]
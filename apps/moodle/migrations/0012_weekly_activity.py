@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 07:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0011_data_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('block', models.IntegerField(verbose_name='Bloque de 64 semanas')),
+                ('weeks', models.BigIntegerField(default=0, verbose_name='Semanas con actividad')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_activity', to='moodle.course', verbose_name='Curso')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_activity', to='moodle.moodleuser', verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Actividad semanal',
+                'verbose_name_plural': 'Actividad semanal',
+                'indexes': [models.Index(fields=['course', 'block'], name='moodle_week_course__53dfec_idx')],
+                'unique_together': {('user', 'course', 'block')},
+            },
+        ),
+    ]
@@ -0,0 +1,295 @@
+# Generated by Django 5.1 on 2026-10-18 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Suma deltas por curso (solo de cursos que existen) y, para grupos y
+# accesos, al total de la institución. En orden de curso: dos cargas en
+# paralelo no se bloquean en cruz.
+ADD_FUNCTION = """
+CREATE OR REPLACE FUNCTION moodle_coursestats_add(field text, courses bigint[], deltas bigint[])
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    IF courses IS NULL THEN
+        RETURN;
+    END IF;
+    EXECUTE format(
+        'INSERT INTO moodle_coursestats AS s (course_id, %1$I) '
+        'SELECT d.course_id, d.n FROM unnest($1, $2) AS d (course_id, n) '
+        'JOIN moodle_course c ON c.id = d.course_id ORDER BY d.course_id '
+        'ON CONFLICT (course_id) DO UPDATE SET %1$I = s.%1$I + EXCLUDED.%1$I',
+        field
+    ) USING courses, deltas;
+    IF field IN ('groups', 'accesses') THEN
+        EXECUTE format('UPDATE moodle_systemstats SET %1$I = %1$I + $1 WHERE id = 1', field)
+        USING (SELECT sum(n) FROM unnest(deltas) AS n);
+    END IF;
+END
+$$;
+"""
+
+
+def count_function(table, field, course, join=''):
+    """
+    Trigger por sentencia de `table` que lleva la cantidad de filas por curso
+    en `field`: las transiciones nuevas suman y las viejas restan (un UPDATE
+    que no cambia de curso no escribe nada).
+    """
+    def changes(*parts):
+        rows = ' UNION ALL '.join(
+            f'SELECT {course} AS course_id, {sign} AS n FROM {rows} r {join}' for rows, sign in parts
+        )
+        return (
+            f'SELECT array_agg(course_id ORDER BY course_id), array_agg(n ORDER BY course_id) '
+            f'INTO courses, deltas FROM (SELECT course_id, sum(n) AS n FROM ({rows}) c '
+            f'GROUP BY course_id HAVING sum(n) <> 0) d;'
+        )
+
+    reset = f'UPDATE moodle_coursestats SET {field} = 0 WHERE {field} <> 0;'
+    if field in ('groups', 'accesses'):
+        reset += f' UPDATE moodle_systemstats SET {field} = 0;'
+    return f"""
+CREATE OR REPLACE FUNCTION moodle_coursestats_{table}()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    courses bigint[];
+    deltas bigint[];
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        {reset}
+        RETURN NULL;
+    ELSIF TG_OP = 'INSERT' THEN
+        {changes(('new_rows', 1))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {changes(('old_rows', -1))}
+    ELSE
+        {changes(('new_rows', 1), ('old_rows', -1))}
+    END IF;
+    PERFORM moodle_coursestats_add('{field}', courses, deltas);
+    RETURN NULL;
+END
+$$;
+"""
+
+
+COUNT_FUNCTIONS = [
+    count_function('userenrolment', 'enrolled', 'e.course_id', 'JOIN moodle_enrol e ON e.id = r.enrol_id'),
+    count_function('userlastaccess', 'accesses', 'r.course_id'),
+    count_function('group', 'groups', 'r.course_id'),
+    count_function('groupmember', 'members', 'g.course_id', 'JOIN moodle_group g ON g.id = r.group_id'),
+]
+
+def move_function(table, field, child, key):
+    """
+    Trigger de UPDATE de `table` (grupos, métodos de inscripción): si una
+    fila cambia de curso, sus filas de `child` se cuentan en el curso nuevo.
+    """
+    return f"""
+CREATE OR REPLACE FUNCTION moodle_coursestats_{table}_move()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    courses bigint[];
+    deltas bigint[];
+BEGIN
+    SELECT array_agg(course_id ORDER BY course_id), array_agg(n ORDER BY course_id)
+    INTO courses, deltas FROM (
+        SELECT m.course_id, sum(m.sign) AS n FROM (
+            SELECT n.id, n.course_id, 1 AS sign FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE o.course_id <> n.course_id
+            UNION ALL
+            SELECT o.id, o.course_id, -1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE o.course_id <> n.course_id
+        ) m JOIN moodle_{child} c ON c.{key} = m.id
+        GROUP BY m.course_id HAVING sum(m.sign) <> 0
+    ) d;
+    PERFORM moodle_coursestats_add('{field}', courses, deltas);
+    RETURN NULL;
+END
+$$;
+"""
+
+
+MOVES = {
+    'group': ('members', 'groupmember', 'group_id'),
+    'enrol': ('enrolled', 'userenrolment', 'enrol_id'),
+}
+
+# Cursos visibles y usuarios solo van al total; un curso borrado se lleva su fila
+TOTAL_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION moodle_coursestats_course()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    delta bigint;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM moodle_coursestats;
+        UPDATE moodle_systemstats SET courses = 0;
+        RETURN NULL;
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT count(*) INTO delta FROM new_rows WHERE visible;
+    ELSIF TG_OP = 'DELETE' THEN
+        DELETE FROM moodle_coursestats WHERE course_id IN (SELECT id FROM old_rows);
+        SELECT -count(*) INTO delta FROM old_rows WHERE visible;
+    ELSE
+        SELECT (SELECT count(*) FROM new_rows WHERE visible)
+             - (SELECT count(*) FROM old_rows WHERE visible) INTO delta;
+    END IF;
+    IF delta <> 0 THEN
+        UPDATE moodle_systemstats SET courses = courses + delta WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION moodle_coursestats_moodleuser()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE moodle_systemstats SET users = 0;
+    ELSIF TG_OP = 'INSERT' THEN
+        UPDATE moodle_systemstats SET users = users + (SELECT count(*) FROM new_rows) WHERE id = 1;
+    ELSE
+        UPDATE moodle_systemstats SET users = users - (SELECT count(*) FROM old_rows) WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+
+def create_triggers(table, events=('INSERT', 'UPDATE', 'DELETE')):
+    """Un trigger por evento (las tablas de transición no admiten varios) y TRUNCATE"""
+    transitions = {
+        'INSERT': 'REFERENCING NEW TABLE AS new_rows',
+        'UPDATE': 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows',
+        'DELETE': 'REFERENCING OLD TABLE AS old_rows',
+    }
+    statements = [
+        f'CREATE TRIGGER moodle_coursestats_{event.lower()} AFTER {event} ON moodle_{table} '
+        f'{transitions[event]} FOR EACH STATEMENT EXECUTE FUNCTION moodle_coursestats_{table}();'
+        for event in events
+    ]
+    statements.append(
+        f'CREATE TRIGGER moodle_coursestats_truncate AFTER TRUNCATE ON moodle_{table} '
+        f'FOR EACH STATEMENT EXECUTE FUNCTION moodle_coursestats_{table}();'
+    )
+    return '\n'.join(statements)
+
+
+def drop_triggers(table, events=('INSERT', 'UPDATE', 'DELETE')):
+    return '\n'.join(
+        f'DROP TRIGGER moodle_coursestats_{event.lower()} ON moodle_{table};'
+        for event in (*events, 'TRUNCATE')
+    )
+
+
+TRIGGERS = {
+    'userenrolment': ('INSERT', 'UPDATE', 'DELETE'),
+    'userlastaccess': ('INSERT', 'UPDATE', 'DELETE'),
+    'group': ('INSERT', 'UPDATE', 'DELETE'),
+    'groupmember': ('INSERT', 'UPDATE', 'DELETE'),
+    'course': ('INSERT', 'UPDATE', 'DELETE'),
+    'moodleuser': ('INSERT', 'DELETE'),
+}
+
+MOVE_TRIGGERS = '\n'.join(
+    f'CREATE TRIGGER moodle_coursestats_move AFTER UPDATE ON moodle_{table} '
+    f'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+    f'FOR EACH STATEMENT EXECUTE FUNCTION moodle_coursestats_{table}_move();'
+    for table in MOVES
+)
+
+# Recalcula todo desde las tablas. El lock hace esperar a los triggers de
+# otras transacciones: sus filas no se ven acá y su delta se suma después.
+REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION moodle_coursestats_refresh()
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE moodle_coursestats, moodle_systemstats IN EXCLUSIVE MODE;
+    DELETE FROM moodle_coursestats;
+    INSERT INTO moodle_coursestats (course_id, enrolled, accesses, groups, members)
+    SELECT c.id, coalesce(e.n, 0), coalesce(a.n, 0), coalesce(g.n, 0), coalesce(m.n, 0)
+    FROM moodle_course c
+    LEFT JOIN (
+        SELECT en.course_id, count(*) AS n FROM moodle_userenrolment ue
+        JOIN moodle_enrol en ON en.id = ue.enrol_id GROUP BY 1
+    ) e ON e.course_id = c.id
+    LEFT JOIN (SELECT course_id, count(*) AS n FROM moodle_userlastaccess GROUP BY 1) a ON a.course_id = c.id
+    LEFT JOIN (SELECT course_id, count(*) AS n FROM moodle_group GROUP BY 1) g ON g.course_id = c.id
+    LEFT JOIN (
+        SELECT gr.course_id, count(*) AS n FROM moodle_groupmember gm
+        JOIN moodle_group gr ON gr.id = gm.group_id GROUP BY 1
+    ) m ON m.course_id = c.id;
+
+    INSERT INTO moodle_systemstats (id, users, courses, groups, accesses)
+    SELECT 1,
+        (SELECT count(*) FROM moodle_moodleuser),
+        (SELECT count(*) FROM moodle_course WHERE visible),
+        (SELECT count(*) FROM moodle_group),
+        (SELECT count(*) FROM moodle_userlastaccess)
+    ON CONFLICT (id) DO UPDATE SET users = EXCLUDED.users, courses = EXCLUDED.courses,
+        groups = EXCLUDED.groups, accesses = EXCLUDED.accesses;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0012_weekly_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='moodle.course', verbose_name='Curso')),
+                ('enrolled', models.IntegerField(db_default=0, verbose_name='Inscriptos')),
+                ('accesses', models.IntegerField(db_default=0, verbose_name='Usuarios con acceso')),
+                ('groups', models.IntegerField(db_default=0, verbose_name='Grupos')),
+                ('members', models.IntegerField(db_default=0, verbose_name='Miembros de grupos')),
+            ],
+            options={
+                'verbose_name': 'Conteos del curso',
+                'verbose_name_plural': 'Conteos de cursos',
+            },
+        ),
+        migrations.CreateModel(
+            name='SystemStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('users', models.BigIntegerField(db_default=0, verbose_name='Usuarios')),
+                ('courses', models.BigIntegerField(db_default=0, verbose_name='Cursos visibles')),
+                ('groups', models.BigIntegerField(db_default=0, verbose_name='Grupos')),
+                ('accesses', models.BigIntegerField(db_default=0, verbose_name='Registros de acceso')),
+            ],
+            options={
+                'verbose_name': 'Totales de la institución',
+                'verbose_name_plural': 'Totales de la institución',
+            },
+        ),
+        migrations.RunSQL(ADD_FUNCTION, 'DROP FUNCTION moodle_coursestats_add(text, bigint[], bigint[]);'),
+        migrations.RunSQL(
+            '\n'.join([
+                *COUNT_FUNCTIONS, TOTAL_FUNCTIONS, REFRESH_FUNCTION,
+                *(move_function(table, *move) for table, move in MOVES.items()),
+            ]),
+            '\n'.join(
+                f'DROP FUNCTION moodle_coursestats_{name}();'
+                for name in [*TRIGGERS, 'refresh', *(f'{table}_move' for table in MOVES)]
+            ),
+        ),
+        migrations.RunSQL(
+            '\n'.join([
+                *(create_triggers(table, events) for table, events in TRIGGERS.items()),
+                MOVE_TRIGGERS,
+            ]),
+            '\n'.join([
+                *(drop_triggers(table, events) for table, events in TRIGGERS.items()),
+                *(f'DROP TRIGGER moodle_coursestats_move ON moodle_{table};' for table in MOVES),
+            ]),
+        ),
+        migrations.RunSQL('SELECT moodle_coursestats_refresh();', migrations.RunSQL.noop),
+    ]
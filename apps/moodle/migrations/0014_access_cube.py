@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-18 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0013_course_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('hour', models.SmallIntegerField(verbose_name='Hora')),
+                ('count', models.BigIntegerField(verbose_name='Accesos')),
+                ('course', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_cube', to='moodle.course', verbose_name='Curso')),
+                ('group', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_cube', to='moodle.group', verbose_name='Grupo')),
+                ('role', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_cube', to='moodle.role', verbose_name='Rol')),
+            ],
+            options={
+                'verbose_name': 'Celda del cubo de accesos',
+                'verbose_name_plural': 'Cubo de accesos',
+                'indexes': [models.Index(fields=['date'], name='moodle_acce_date_b38808_idx')],
+                'constraints': [models.UniqueConstraint(fields=('course', 'group', 'role', 'date', 'hour'), name='accesscube_cell', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 07:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0014_access_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('registers', models.BinaryField(verbose_name='Registros')),
+                ('course', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='access_sketches', to='moodle.course', verbose_name='Curso')),
+            ],
+            options={
+                'verbose_name': 'Sketch de usuarios por día',
+                'verbose_name_plural': 'Sketches de usuarios por día',
+                'indexes': [models.Index(fields=['date'], name='moodle_acce_date_fd753e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('course', 'date'), name='accesssketch_cell', nulls_distinct=False)],
+            },
+        ),
+        # Los sketches se arman junto con el cubo: se vacía para que la próxima
+        # corrida de roll_up_access_cube vuelva a agregar toda la bitácora
+        migrations.RunSQL(
+            "TRUNCATE moodle_accesscube; DELETE FROM moodle_syncwatermark WHERE source = 'access_cube';",
+            migrations.RunSQL.noop,
+        ),
+    ]
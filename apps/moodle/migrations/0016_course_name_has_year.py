@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 07:49
+
+import re
+
+from django.db import migrations, models
+
+
+# Copia de apps.moodle.periods.YEAR_RE al momento de la migración
+YEAR_RE = re.compile(r'\b(20\d{2})\b')
+
+
+def fill_name_has_year(apps, schema_editor):
+    Course = apps.get_model('moodle', 'Course')
+    db_alias = schema_editor.connection.alias
+    courses = list(Course.objects.using(db_alias).only('id', 'fullname', 'shortname'))
+    for course in courses:
+        course.name_has_year = YEAR_RE.search(course.fullname or course.shortname or '') is not None
+    Course.objects.using(db_alias).bulk_update(courses, ['name_has_year'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moodle', '0015_access_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='name_has_year',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Año en el nombre'),
+        ),
+        migrations.RunPython(fill_name_has_year, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,550 @@
+"""
+Generador de datos mock a escala (manage.py load_mock_data)
+
+Categorías, cursos, usuarios, grupos, inscripciones, roles, últimos accesos y
+bitácora se sortean con NumPy (vectorizado) y se cargan con COPY. El proceso
+principal sortea el plan (grupos, inscriptos, accesos y eventos por curso);
+los usuarios se generan en bloques de USER_BLOCK_SIZE y los cursos en bloques
+de COURSE_CHUNK_SIZE, cada bloque con su propia semilla derivada de --seed
+(SeedSequence.spawn): el contenido es el mismo con cualquier cantidad de
+workers. Los bloques se generan y cargan en paralelo, uno por proceso (fork,
+como bulk.py), cada uno en su transacción.
+
+Los grupos de un curso no se superponen: cada inscripto está en una comisión.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.core.management.color import no_style
+from django.db import connections
+from django.utils import timezone
+
+from .activity import week_blocks, week_numbers
+from .cache import bump_data_version
+from .models import (
+    AccessCube, AccessEvent, AccessSketch, Category, CategoryClosure, Course, Enrol, Group,
+    GroupMember, MoodleUser, Role, RoleAssignment, SyncWatermark, UserEnrolment, UserLastAccess,
+    WeeklyActivity, WeeklyNeverAccess,
+)
+from .partitions import ensure_partitions
+from .periods import academic_period, year_in_name
+from .replicas import beat
+from .cube import CUBE_SOURCES, roll_up_access_cube
+from .snapshot import build_snapshot
+from .tenants import activate_tenant, atomic, connection, current_tenant
+
+
+# Tamaños de --scale -1 (las otras escalas los dividen)
+TOTAL_USERS = 3200
+TOTAL_COURSES = 200
+
+USER_BLOCK_SIZE = 100_000
+COURSE_CHUNK_SIZE = 10
+COPY_BLOCK_ROWS = 200_000
+
+GROUPS_PER_COURSE = (2, 3)
+MIN_GROUP_SIZE = 20
+ACCESS_RATIO = 0.7           # Inscriptos con algún acceso al curso
+LAST_ACCESS_DAYS = 60        # El último acceso cae en los últimos 60 días
+HISTORY_DAYS = 60            # Accesos previos: hasta 60 días antes del último
+MAX_EVENTS_PER_ACCESS = 15   # Accesos previos al último, por usuario y curso
+# Peso relativo de cada hora del día en la bitácora (más actividad de tarde/noche)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 7, 6, 6, 7, 8, 8, 8, 9, 10, 10, 8, 5, 2]
+
+# (shortname, nombre, proporción de inscripciones)
+ROLES = [
+    ('student', 'Estudiante', 0.95),
+    ('teacher', 'Profesor', 0.04),
+    ('editingteacher', 'Profesor Editor', 0.01),
+]
+
+SUBJECTS_BY_CAREER = {
+    'Derecho': ['Derecho Civil', 'Derecho Penal', 'Derecho Constitucional', 'Derecho Laboral',
+                'Derecho Internacional', 'Derecho Comercial', 'Filosofía del Derecho',
+                'Derecho Procesal', 'Derecho Administrativo', 'Derecho Tributario'],
+    'Economía': ['Microeconomía', 'Macroeconomía', 'Econometría', 'Finanzas',
+                 'Contabilidad', 'Estadística', 'Matemática Financiera',
+                 'Análisis Económico', 'Economía Internacional', 'Política Económica'],
+    'Ingeniería': ['Cálculo', 'Física', 'Álgebra', 'Programación',
+                   'Estructuras', 'Electrónica', 'Termodinámica',
+                   'Mecánica', 'Materiales', 'Proyecto Final'],
+    'Medicina': ['Anatomía', 'Fisiología', 'Bioquímica', 'Farmacología',
+                 'Patología', 'Clínica Médica', 'Cirugía', 'Pediatría',
+                 'Ginecología', 'Medicina Interna'],
+    'Arquitectura': ['Diseño Arquitectónico', 'Historia de la Arquitectura', 'Estructuras',
+                     'Construcciones', 'Urbanismo', 'Instalaciones',
+                     'Proyecto Arquitectónico', 'Morfología', 'Materialidad', 'Taller'],
+}
+
+FIRST_NAMES = [
+    'Juan', 'María', 'Carlos', 'Ana', 'Pedro', 'Laura', 'Diego', 'Sofia',
+    'Miguel', 'Valentina', 'Lucas', 'Camila', 'Mateo', 'Isabella', 'Santiago',
+    'Martina', 'Nicolás', 'Catalina', 'Sebastián', 'Emilia', 'Tomás', 'Agustina',
+    'Felipe', 'Josefina', 'Joaquín', 'Victoria', 'Manuel', 'Antonella', 'Pablo',
+    'Carolina', 'Andrés', 'Francisca', 'Gabriel', 'Mercedes', 'Rodrigo',
+]
+LAST_NAMES = [
+    'García', 'Rodríguez', 'Martínez', 'López', 'González', 'Pérez',
+    'Sánchez', 'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez',
+    'Fernández', 'Díaz', 'Morales', 'Jiménez', 'Álvarez', 'Romero',
+    'Herrera', 'Medina', 'Castro', 'Vargas', 'Ortiz', 'Silva',
+]
+
+# Orden de TRUNCATE (CASCADE alcanza al resto de las dependientes)
+CLEARED_MODELS = [
+    AccessCube, AccessSketch, AccessEvent, WeeklyActivity, WeeklyNeverAccess, UserLastAccess, RoleAssignment, Role,
+    UserEnrolment, Enrol, GroupMember, Group, MoodleUser, Course, CategoryClosure, Category,
+]
+
+EVENT_COLUMNS = ('user_id', 'course_id', 'role_id', 'timecreated')
+
+
+def scaled_sizes(scale):
+    """(usuarios, cursos) de una escala '-1', '-2' o '-4'"""
+    factor = abs(int(scale))
+    return TOTAL_USERS // factor, TOTAL_COURSES // factor
+
+
+def clear_mock_data():
+    """
+    Vacía las tablas de datos de Moodle con TRUNCATE (reinicia los ids).
+
+    Trabaja sobre las tablas vivas, no con tablas sombra: mientras dura la
+    carga las vistas ven datos vacíos o a medias, así que solo sirve con el
+    sitio fuera de servicio. Una recarga en vivo se hace con import_moodle.
+    """
+    tables = ', '.join(model._meta.db_table for model in CLEARED_MODELS)
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE {tables} RESTART IDENTITY CASCADE')
+        # Los ids de la bitácora vuelven a empezar: el cubo también
+        SyncWatermark.objects.filter(source__in=CUBE_SOURCES).delete()
+    bump_data_version()
+
+
+# ============================================================================
+# COPY
+# ============================================================================
+
+def _timestamps(seconds):
+    """Segundos desde epoch (array) a texto ISO 8601 en UTC para COPY"""
+    return np.datetime_as_string(np.asarray(seconds, dtype='datetime64[s]'), timezone='UTC')
+
+
+def copy_columns(cursor, table, columns):
+    """
+    Carga columnas paralelas ({columna: array o lista}) en `table` con COPY,
+    por bloques de COPY_BLOCK_ROWS. Los textos no pueden tener comas ni
+    comillas (los generados acá no las tienen). Devuelve la cantidad de filas.
+    """
+    names = list(columns)
+    values = [np.asarray(column) for column in columns.values()]
+    total = len(values[0]) if values else 0
+    for start in range(0, total, COPY_BLOCK_ROWS):
+        block = [column[start:start + COPY_BLOCK_ROWS].astype(str).tolist() for column in values]
+        text = '\n'.join(map(','.join, zip(*block))) + '\n'
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(names)}) FROM STDIN WITH (FORMAT csv)',
+            _TextStream(text),
+        )
+    return total
+
+
+class _TextStream:
+    """Archivo de lectura sobre un texto ya armado (copy_expert lee por bloques)"""
+
+    def __init__(self, text):
+        self._text = text
+        self._offset = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self._text) - self._offset
+        chunk = self._text[self._offset:self._offset + size]
+        self._offset += len(chunk)
+        return chunk
+
+
+def _next_id(cursor, model):
+    cursor.execute(f'SELECT coalesce(max(id), 0) + 1 FROM {model._meta.db_table}')
+    return cursor.fetchone()[0]
+
+
+# ============================================================================
+# PLAN (proceso principal)
+# ============================================================================
+
+def _create_categories():
+    """Grado y Postgrado como modalidades, con las carreras dentro de Grado"""
+    grado = Category.objects.create(name='Grado', depth=1)
+    postgrado = Category.objects.create(name='Postgrado', depth=1)
+    careers = [
+        Category.objects.create(name=name, parent=grado, depth=2) for name in SUBJECTS_BY_CAREER
+    ]
+    for category in [grado, postgrado, *careers]:
+        parent_path = f'/{category.parent_id}' if category.parent_id else ''
+        category.path = f'{parent_path}/{category.id}'
+    Category.objects.bulk_update([grado, postgrado, *careers], ['path'])
+    return careers
+
+
+def _plan_courses(rng, careers, count, first_id, now):
+    """Filas de cursos (tuplas en orden de columnas) repartidas entre las carreras"""
+    tz = timezone.get_current_timezone()
+    year = now.year
+    career_index = np.arange(count) % len(careers)
+    position = np.arange(count) // len(careers)
+    per_career = np.bincount(career_index, minlength=len(careers))
+    first_semester = position < per_career[career_index] // 2
+    start_days = rng.integers(1, 16, size=count)
+    year_levels = rng.integers(1, 6, size=count)
+    subject_draws = rng.random(count)
+
+    rows = []
+    for index in range(count):
+        category = careers[career_index[index]]
+        subjects = SUBJECTS_BY_CAREER[category.name]
+        subject = subjects[int(subject_draws[index] * len(subjects))]
+        semester, month = ('1C', 3) if first_semester[index] else ('2C', 8)
+        start = datetime(year, month, int(start_days[index]), tzinfo=tz)
+        end = start + timedelta(days=120)
+        course_id = first_id + index
+        shortname = f'{category.name[:3].upper()}-{year_levels[index]}{course_id:02d}-{semester}-{year}'
+        fullname = f'{subject} - Año {year_levels[index]} ({semester} {year})'
+        academic_year, course_semester = academic_period(fullname, shortname, start)
+        rows.append((
+            course_id, shortname, fullname, category.id, start.timestamp(), end.timestamp(),
+            academic_year, course_semester, year_in_name(fullname, shortname) is not None,
+        ))
+    return rows
+
+
+def _plan_memberships(rng, course_count, user_count, events):
+    """
+    Grupos, inscriptos, accesos y eventos por curso.
+
+    Con `events` None cada acceso trae en promedio MAX_EVENTS_PER_ACCESS / 2
+    accesos previos; si no, se reparten exactamente `events` eventos entre
+    los cursos según sus accesos.
+    """
+    groups = rng.integers(GROUPS_PER_COURSE[0], GROUPS_PER_COURSE[1] + 1, size=course_count)
+    total_groups = int(groups.sum())
+    high = max(MIN_GROUP_SIZE, user_count // max(total_groups, 1))
+    sizes = rng.integers(MIN_GROUP_SIZE, high + 1, size=total_groups)
+    # Comisiones disjuntas: el curso no puede superar la cantidad de usuarios
+    sizes = np.minimum(sizes, np.repeat(user_count // groups, groups))
+    group_course = np.repeat(np.arange(course_count), groups)
+    enrolled = np.bincount(group_course, weights=sizes, minlength=course_count).astype(np.int64)
+
+    accesses = rng.binomial(enrolled, ACCESS_RATIO)
+    if events is None:
+        course_events = accesses + rng.binomial(accesses * MAX_EVENTS_PER_ACCESS, 0.5)
+    elif accesses.sum():
+        course_events = rng.multinomial(events, accesses / accesses.sum())
+    else:
+        course_events = np.zeros(course_count, dtype=np.int64)
+    return groups, sizes, accesses, course_events
+
+
+# ============================================================================
+# BLOQUES (procesos)
+# ============================================================================
+
+def generate_users(task):
+    """Genera y carga un bloque de usuarios; devuelve cuántos"""
+    seed, first_id, count = task
+    rng = np.random.default_rng(seed)
+    ids = np.arange(first_id, first_id + count)
+    first = np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), size=count)]
+    last = np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), size=count)]
+    emails = [
+        f'{f.lower()}.{l.lower()}{i}@universidad.edu.ar'
+        for f, l, i in zip(first.tolist(), last.tolist(), ids.tolist())
+    ]
+    with atomic(), connection.cursor() as cursor:
+        return copy_columns(cursor, MoodleUser._meta.db_table, {
+            'id': ids,
+            'username': [f'user{i:05d}' for i in ids.tolist()],
+            'firstname': first,
+            'lastname': last,
+            'email': emails,
+        })
+
+
+def _event_times(rng, last_seconds, tz):
+    """
+    Instantes de accesos previos a cada último acceso: un día de los
+    HISTORY_DAYS anteriores, a una hora local sorteada con HOUR_WEIGHTS.
+    """
+    base = last_seconds - rng.integers(0, HISTORY_DAYS + 1, size=len(last_seconds)) * 86400
+    # Desplazamiento de la zona horaria por día (pocos días distintos)
+    days, inverse = np.unique(base // 86400, return_inverse=True)
+    offsets = np.array([
+        tz.utcoffset(datetime.utcfromtimestamp(int(day) * 86400 + 43200)).total_seconds()
+        for day in days
+    ], dtype=np.int64)[inverse]
+    local_midnight = (base + offsets) // 86400 * 86400
+    weights = np.array(HOUR_WEIGHTS, dtype=float)
+    hours = rng.choice(24, size=len(base), p=weights / weights.sum())
+    minutes = rng.integers(0, 60, size=len(base))
+    moments = local_midnight + hours * 3600 + minutes * 60 - offsets
+    return np.minimum(moments, last_seconds)
+
+
+def generate_courses(task):
+    """
+    Genera y carga un bloque de cursos: comisiones, inscripciones, roles,
+    últimos accesos, bitácora y actividad semanal. Devuelve los conteos por tabla.
+    """
+    rng = np.random.default_rng(task['seed'])
+    tz = timezone.get_current_timezone()
+    now = task['now']
+    user_count, first_user = task['user_count'], task['first_user']
+
+    members, member_groups, enrol_users, enrol_ids, enrol_courses = [], [], [], [], []
+    starts, ends, roles = [], [], []
+    access_users, access_courses, access_roles, access_times = [], [], [], []
+    event_pairs = []
+    pair_offset = 0
+    group_id = task['first_group']
+    size_index = 0
+    role_ids = np.array(task['role_ids'])
+    role_weights = np.array([weight for _, _, weight in ROLES])
+
+    for index, course_id in enumerate(task['course_ids']):
+        sizes = task['sizes'][size_index:size_index + task['groups'][index]]
+        size_index += task['groups'][index]
+        enrolled = int(sizes.sum())
+        users = rng.choice(user_count, size=enrolled, replace=False) + first_user
+
+        members.append(users)
+        member_groups.append(np.repeat(np.arange(group_id, group_id + len(sizes)), sizes))
+        group_id += len(sizes)
+        enrol_users.append(users)
+        enrol_ids.append(np.full(enrolled, task['enrol_ids'][index]))
+        enrol_courses.append(np.full(enrolled, course_id))
+        starts.append(np.full(enrolled, task['starts'][index]))
+        ends.append(np.full(enrolled, task['ends'][index]))
+        course_roles = role_ids[rng.choice(len(role_ids), size=enrolled, p=role_weights)]
+        roles.append(course_roles)
+
+        accessing = rng.choice(enrolled, size=int(task['accesses'][index]), replace=False)
+        access_users.append(users[accessing])
+        access_courses.append(np.full(len(accessing), course_id))
+        access_roles.append(course_roles[accessing])
+        access_times.append(
+            now - rng.integers(0, LAST_ACCESS_DAYS + 1, size=len(accessing)) * 86400
+            - rng.integers(0, 24, size=len(accessing)) * 3600
+        )
+
+        # Eventos: el último acceso de cada par y accesos previos al azar
+        count = int(task['events'][index])
+        if len(accessing):
+            if count >= len(accessing):
+                extra = rng.integers(0, len(accessing), size=count - len(accessing))
+                pairs = np.concatenate([np.arange(len(accessing)), extra])
+            else:
+                pairs = rng.choice(len(accessing), size=count, replace=False)
+            event_pairs.append(pairs + pair_offset)
+        pair_offset += len(accessing)
+
+    def joined(parts, dtype=np.int64):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    access_users, access_courses = joined(access_users), joined(access_courses)
+    access_roles, access_times = joined(access_roles), joined(access_times)
+
+    # Cada par aparece una vez con su último acceso y el resto son previos
+    pairs = joined(event_pairs)
+    first_seen = np.zeros(len(pairs), dtype=bool)
+    _, first_index = np.unique(pairs, return_index=True)
+    first_seen[first_index] = True
+    event_times = access_times[pairs].copy()
+    previous = ~first_seen
+    event_times[previous] = _event_times(rng, access_times[pairs[previous]], tz)
+
+    # Actividad semanal: OR de los bits de los eventos de cada (par, bloque)
+    blocks, bits = week_blocks(week_numbers(event_times))
+    keys, inverse = np.unique(np.stack([pairs, blocks]), axis=1, return_inverse=True)
+    weeks = np.zeros(keys.shape[1], dtype=np.int64)
+    np.bitwise_or.at(weeks, inverse.ravel(), bits)
+
+    stamp = _timestamps(np.full(1, now))[0]
+    counts = {}
+    with atomic(), connection.cursor() as cursor:
+        member_users = joined(members)
+        counts['group_members'] = copy_columns(cursor, GroupMember._meta.db_table, {
+            'group_id': joined(member_groups),
+            'user_id': member_users,
+            'timeadded': np.full(len(member_users), stamp),
+        })
+        enrolled_users = joined(enrol_users)
+        counts['enrolments'] = copy_columns(cursor, UserEnrolment._meta.db_table, {
+            'enrol_id': joined(enrol_ids),
+            'user_id': enrolled_users,
+            'timestart': _timestamps(joined(starts)),
+            'timeend': _timestamps(joined(ends)),
+            'timecreated': np.full(len(enrolled_users), stamp),
+        })
+        counts['role_assignments'] = copy_columns(cursor, RoleAssignment._meta.db_table, {
+            'role_id': joined(roles),
+            'user_id': enrolled_users,
+            'course_id': joined(enrol_courses),
+            'timecreated': np.full(len(enrolled_users), stamp),
+        })
+        counts['events'] = copy_columns(cursor, AccessEvent._meta.db_table, dict(zip(EVENT_COLUMNS, (
+            access_users[pairs], access_courses[pairs], access_roles[pairs], _timestamps(event_times),
+        ))))
+        counts['weekly_activity'] = copy_columns(cursor, WeeklyActivity._meta.db_table, {
+            'user_id': access_users[keys[0]],
+            'course_id': access_courses[keys[0]],
+            'block': keys[1],
+            'weeks': weeks,
+        })
+        # Al final: su trigger suma al total de la institución (una fila que
+        # los procesos en paralelo comparten) y la retiene hasta el commit
+        counts['last_accesses'] = copy_columns(cursor, UserLastAccess._meta.db_table, {
+            'user_id': access_users,
+            'course_id': access_courses,
+            'timeaccess': _timestamps(access_times),
+        })
+    return counts
+
+
+def _run_blocks(function, tasks, workers):
+    """Igual que en bulk.py: fork con las conexiones cerradas antes"""
+    if workers <= 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context,
+                             initializer=activate_tenant, initargs=(current_tenant(),)) as executor:
+        return list(executor.map(function, tasks))
+
+
+# ============================================================================
+# CARGA
+# ============================================================================
+
+def load_mock_data(users, courses, events=None, seed=None, workers=1, progress=None):
+    """
+    Genera y carga el conjunto completo; devuelve {tabla: filas cargadas}.
+
+    `progress(mensaje)` se llama al terminar cada etapa.
+    """
+    progress = progress or (lambda message: None)
+    root = np.random.SeedSequence(seed)
+    plan_seed, users_seed, courses_seed = root.spawn(3)
+    rng = np.random.default_rng(plan_seed)
+    now = int(timezone.now().timestamp())
+
+    with connection.cursor() as cursor:
+        first_user = _next_id(cursor, MoodleUser)
+        first_course = _next_id(cursor, Course)
+        first_group = _next_id(cursor, Group)
+        first_enrol = _next_id(cursor, Enrol)
+
+    careers = _create_categories()
+    course_rows = _plan_courses(rng, careers, courses, first_course, timezone.now())
+    columns = ('id', 'shortname', 'fullname', 'category_id', 'startdate', 'enddate',
+               'academic_year', 'semester', 'name_has_year', 'visible')
+    course_columns = list(zip(*course_rows))
+    course_ids = np.array(course_columns[0], dtype=np.int64)
+    starts = np.array(course_columns[4], dtype=np.int64)
+    ends = np.array(course_columns[5], dtype=np.int64)
+    groups, sizes, accesses, course_events = _plan_memberships(rng, courses, users, events)
+
+    roles = [
+        Role.objects.get_or_create(shortname=shortname, defaults={'name': name})[0].id
+        for shortname, name, _ in ROLES
+    ]
+    # La bitácora va desde HISTORY_DAYS antes del último acceso más viejo
+    oldest = timezone.now() - timedelta(days=LAST_ACCESS_DAYS + HISTORY_DAYS + 1)
+    ensure_partitions(oldest, timezone.now())
+
+    with atomic(), connection.cursor() as cursor:
+        copy_columns(cursor, Course._meta.db_table, dict(zip(columns, (
+            course_ids,
+            course_columns[1],
+            course_columns[2],
+            course_columns[3],
+            _timestamps(starts),
+            _timestamps(ends),
+            ['' if year is None else year for year in course_columns[6]],
+            course_columns[7],
+            course_columns[8],
+            np.full(courses, 'true'),
+        ))))
+        group_course = np.repeat(course_ids, groups)
+        group_number = np.concatenate([np.arange(1, count + 1) for count in groups]) if courses else []
+        shortnames = dict(zip(course_ids.tolist(), course_columns[1]))
+        copy_columns(cursor, Group._meta.db_table, {
+            'id': np.arange(first_group, first_group + len(group_course)),
+            'name': [f'Comisión {number}' for number in group_number],
+            'course_id': group_course,
+            'description': [
+                f'Comisión {number} de {shortnames[course_id]}'
+                for number, course_id in zip(group_number, group_course.tolist())
+            ],
+        })
+        copy_columns(cursor, Enrol._meta.db_table, {
+            'id': np.arange(first_enrol, first_enrol + courses),
+            'course_id': course_ids,
+            'enrol': np.full(courses, 'manual'),
+            'status': np.full(courses, 'true'),
+        })
+    counts = {'categories': len(careers) + 2, 'courses': courses, 'groups': len(group_course),
+              'enrols': courses}
+    progress(f'{courses} cursos, {len(group_course)} grupos')
+
+    user_tasks = [
+        (block_seed, first_user + start, min(USER_BLOCK_SIZE, users - start))
+        for block_seed, start in zip(
+            users_seed.spawn(-(-users // USER_BLOCK_SIZE)), range(0, users, USER_BLOCK_SIZE)
+        )
+    ]
+    counts['users'] = sum(_run_blocks(generate_users, user_tasks, workers))
+    progress(f'{counts["users"]} usuarios')
+
+    group_starts = np.concatenate([[0], np.cumsum(groups)])
+    tasks = []
+    chunk_seeds = courses_seed.spawn(-(-courses // COURSE_CHUNK_SIZE))
+    for chunk_seed, start in zip(chunk_seeds, range(0, courses, COURSE_CHUNK_SIZE)):
+        stop = min(start + COURSE_CHUNK_SIZE, courses)
+        tasks.append({
+            'seed': chunk_seed,
+            'now': now,
+            'user_count': users,
+            'first_user': first_user,
+            'course_ids': course_ids[start:stop],
+            'enrol_ids': np.arange(first_enrol + start, first_enrol + stop),
+            'first_group': first_group + int(group_starts[start]),
+            'groups': groups[start:stop],
+            'sizes': sizes[group_starts[start]:group_starts[stop]],
+            'starts': starts[start:stop],
+            'ends': ends[start:stop],
+            'accesses': accesses[start:stop],
+            'events': course_events[start:stop],
+            'role_ids': roles,
+        })
+    for result in _run_blocks(generate_courses, tasks, workers):
+        for table, count in result.items():
+            counts[table] = counts.get(table, 0) + count
+    progress(f'{counts.get("enrolments", 0)} inscripciones, {counts.get("events", 0)} eventos')
+
+    models = [Course, MoodleUser, Group, Enrol]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+        for model in [*models, GroupMember, UserEnrolment, RoleAssignment, UserLastAccess,
+                      AccessEvent, WeeklyActivity]:
+            cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    bump_data_version()
+    beat()
+    roll_up_access_cube()
+    progress('cubo de accesos al día')
+    build_snapshot()
+    progress('snapshot columnar publicado')
+    return counts
@@ -2,8 +2,12 @@
 Modelos Django que replican la estructura de Moodle
 Basados en el análisis del script PHP original
 """
-from django.db import models
+from django.conf import settings
+from django.db import NotSupportedError, models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+
+from .periods import SEMESTERS, academic_period, year_in_name
 
 
 class Category(models.Model):
@@ -23,6 +27,27 @@ class Category(models.Model):
         return self.name
 
 
+class CategoryClosure(models.Model):
+    """
+    Tabla de clausura del árbol de categorías: una fila por cada par
+    (ancestro, descendiente), incluida la propia categoría con depth=0.
+    Se mantiene sola con señales sobre Category (ver signals.py).
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE,
+                                 related_name='descendant_links', verbose_name='Ancestro')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE,
+                                   related_name='ancestor_links', verbose_name='Descendiente')
+    depth = models.IntegerField(default=0, verbose_name='Distancia')
+
+    class Meta:
+        verbose_name = 'Relación de categorías'
+        verbose_name_plural = 'Relaciones de categorías'
+        unique_together = ['ancestor', 'descendant']
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
+
 class Course(models.Model):
     """Cursos de Moodle"""
     shortname = models.CharField(max_length=255, unique=True, verbose_name='Código')
@@ -32,15 +57,42 @@ class Course(models.Model):
     startdate = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de inicio')
     enddate = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de fin')
     visible = models.BooleanField(default=True, verbose_name='Visible')
+    academic_year = models.PositiveSmallIntegerField(null=True, blank=True, editable=False,
+                                                     verbose_name='Año académico')
+    semester = models.CharField(max_length=2, choices=SEMESTERS, blank=True, editable=False,
+                                verbose_name='Cuatrimestre')
+    # El panel acepta el año siguiente solo si figura en el nombre
+    name_has_year = models.BooleanField(default=False, editable=False,
+                                        verbose_name='Año en el nombre')
 
     class Meta:
         verbose_name = 'Curso'
         verbose_name_plural = 'Cursos'
         ordering = ['shortname']
+        indexes = [
+            models.Index(fields=['academic_year', 'semester']),
+            # Búsqueda por similitud (pg_trgm) desde el autocompletado del panel
+            GinIndex(fields=['shortname'], name='course_shortname_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['fullname'], name='course_fullname_trgm', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return f"{self.shortname} - {self.fullname}"
 
+    def set_academic_period(self):
+        """Recalcula año y cuatrimestre desde el nombre y la fecha de inicio"""
+        self.academic_year, self.semester = academic_period(
+            self.fullname, self.shortname, self.startdate
+        )
+        self.name_has_year = year_in_name(self.fullname, self.shortname) is not None
+
+    def save(self, *args, **kwargs):
+        self.set_academic_period()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'academic_year', 'semester', 'name_has_year'}
+        super().save(*args, **kwargs)
+
 
 class MoodleUser(models.Model):
     """Usuarios de Moodle"""
@@ -53,6 +105,10 @@ class MoodleUser(models.Model):
         verbose_name = 'Usuario de Moodle'
         verbose_name_plural = 'Usuarios de Moodle'
         ordering = ['lastname', 'firstname']
+        indexes = [
+            # Paginación por clave de listados de usuarios
+            models.Index(fields=['lastname', 'firstname', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.lastname}, {self.firstname} ({self.username})"
@@ -196,3 +252,368 @@ class UserLastAccess(models.Model):
 
     def __str__(self):
         return f"{self.user} - {self.course.shortname} - {self.timeaccess}"
+
+
+class AccessEvent(models.Model):
+    """
+    Bitácora de accesos a cursos (un registro por acceso)
+
+    En PostgreSQL la tabla está particionada por mes sobre timecreated (ver
+    partitions.py) y su clave primaria real es (id, timecreated). Las
+    relaciones no tienen constraint: la bitácora conserva accesos de usuarios
+    o cursos que ya no existen y crece sin borrados en cascada.
+    """
+    user = models.ForeignKey(MoodleUser, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, related_name='access_events', verbose_name='Usuario')
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False,
+                               db_index=False, related_name='access_events', verbose_name='Curso')
+    role = models.ForeignKey(Role, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, null=True, blank=True,
+                             related_name='access_events', verbose_name='Rol')
+    timecreated = models.DateTimeField(verbose_name='Momento del acceso')
+
+    class Meta:
+        verbose_name = 'Acceso a curso'
+        verbose_name_plural = 'Accesos a cursos'
+        indexes = [
+            BrinIndex(fields=['timecreated'], name='accessevent_time_brin'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id} - {self.timecreated}"
+
+
+class WeeklyNeverAccess(models.Model):
+    """Serie semanal precalculada de usuarios sin acceso por grupo"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE,
+                               related_name='weekly_never_access', verbose_name='Curso')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE,
+                              related_name='weekly_never_access', verbose_name='Grupo')
+    week_start = models.DateField(verbose_name='Inicio de semana')
+    never = models.IntegerField(verbose_name='Aún no ingresaron')
+    total_group = models.IntegerField(verbose_name='Integrantes del grupo')
+    computed_at = models.DateTimeField(verbose_name='Calculado')
+
+    class Meta:
+        verbose_name = 'Resumen semanal sin acceso'
+        verbose_name_plural = 'Resúmenes semanales sin acceso'
+        unique_together = ['group', 'week_start']
+        ordering = ['course', 'group', 'week_start']
+
+    def __str__(self):
+        return f"{self.group} - {self.week_start}: {self.never}/{self.total_group}"
+
+
+class WeeklyActivity(models.Model):
+    """
+    Semanas con actividad de un usuario en un curso, como bitmap
+
+    El bit i de `weeks` es la semana 64 * block + i contada desde el lunes
+    1970-01-05 (hora local). Las cargas de accesos prenden los bits con OR;
+    ver apps/moodle/activity.py.
+    """
+    user = models.ForeignKey(MoodleUser, on_delete=models.CASCADE,
+                             related_name='weekly_activity', verbose_name='Usuario')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE,
+                               related_name='weekly_activity', verbose_name='Curso')
+    block = models.IntegerField(verbose_name='Bloque de 64 semanas')
+    weeks = models.BigIntegerField(default=0, verbose_name='Semanas con actividad')
+
+    class Meta:
+        verbose_name = 'Actividad semanal'
+        verbose_name_plural = 'Actividad semanal'
+        unique_together = ['user', 'course', 'block']
+        indexes = [
+            models.Index(fields=['course', 'block']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id} - bloque {self.block}: {self.weeks:#x}"
+
+
+class CourseStats(models.Model):
+    """
+    Conteos de un curso mantenidos por triggers de PostgreSQL
+
+    Cada INSERT, UPDATE, DELETE, COPY o TRUNCATE sobre inscripciones, últimos
+    accesos, grupos y miembros suma o resta sus filas acá en la misma
+    transacción; ver apps/moodle/coursestats.py. Sin constraint: la fila se
+    borra con el curso desde el trigger de cursos.
+    """
+    course = models.OneToOneField(Course, on_delete=models.DO_NOTHING, db_constraint=False,
+                                  primary_key=True, related_name='stats', verbose_name='Curso')
+    enrolled = models.IntegerField(db_default=0, verbose_name='Inscriptos')
+    accesses = models.IntegerField(db_default=0, verbose_name='Usuarios con acceso')
+    groups = models.IntegerField(db_default=0, verbose_name='Grupos')
+    members = models.IntegerField(db_default=0, verbose_name='Miembros de grupos')
+
+    class Meta:
+        verbose_name = 'Conteos del curso'
+        verbose_name_plural = 'Conteos de cursos'
+
+    def __str__(self):
+        return f"{self.course_id}: {self.enrolled} inscriptos, {self.accesses} con acceso"
+
+
+class SystemStats(models.Model):
+    """Totales de la institución (una sola fila, id=1) mantenidos por triggers"""
+    users = models.BigIntegerField(db_default=0, verbose_name='Usuarios')
+    courses = models.BigIntegerField(db_default=0, verbose_name='Cursos visibles')
+    groups = models.BigIntegerField(db_default=0, verbose_name='Grupos')
+    accesses = models.BigIntegerField(db_default=0, verbose_name='Registros de acceso')
+
+    class Meta:
+        verbose_name = 'Totales de la institución'
+        verbose_name_plural = 'Totales de la institución'
+
+    def __str__(self):
+        return f"{self.users} usuarios, {self.courses} cursos, {self.groups} grupos"
+
+
+class AccessCube(models.Model):
+    """
+    Accesos agregados por (curso, grupo, rol, fecha, hora): cubo de roll-up
+
+    Cada evento de la bitácora cuenta una vez, con fecha y hora locales, en
+    el grupo del usuario en ese curso (el de menor id si tiene varios; sin
+    grupo si no tiene). Se completa de forma incremental después de cada
+    carga y conserva los meses ya archivados; ver apps/moodle/cube.py.
+    """
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False,
+                               db_index=False, related_name='access_cube', verbose_name='Curso')
+    group = models.ForeignKey(Group, on_delete=models.DO_NOTHING, db_constraint=False,
+                              db_index=False, null=True, blank=True,
+                              related_name='access_cube', verbose_name='Grupo')
+    role = models.ForeignKey(Role, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, null=True, blank=True,
+                             related_name='access_cube', verbose_name='Rol')
+    date = models.DateField(verbose_name='Fecha')
+    hour = models.SmallIntegerField(verbose_name='Hora')
+    count = models.BigIntegerField(verbose_name='Accesos')
+
+    class Meta:
+        verbose_name = 'Celda del cubo de accesos'
+        verbose_name_plural = 'Cubo de accesos'
+        constraints = [
+            # Sin grupo o sin rol también es una celda (NULLS NOT DISTINCT)
+            models.UniqueConstraint(fields=['course', 'group', 'role', 'date', 'hour'],
+                                    name='accesscube_cell', nulls_distinct=False),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id}/{self.group_id}/{self.role_id} {self.date} {self.hour:02d}h: {self.count}"
+
+
+class AccessSketch(models.Model):
+    """
+    Usuarios distintos con accesos en un curso y día, como sketch HyperLogLog
+
+    Se mantiene junto con AccessCube: los distintos de cualquier rango de
+    días o conjunto de cursos salen de unir sketches (apps/moodle/hll.py),
+    con un error acotado, en lugar de un DISTINCT sobre la bitácora. Sin
+    curso: todos los cursos de la institución ese día.
+    """
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False,
+                               db_index=False, null=True, blank=True,
+                               related_name='access_sketches', verbose_name='Curso')
+    date = models.DateField(verbose_name='Fecha')
+    registers = models.BinaryField(verbose_name='Registros')
+
+    class Meta:
+        verbose_name = 'Sketch de usuarios por día'
+        verbose_name_plural = 'Sketches de usuarios por día'
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'date'], name='accesssketch_cell',
+                                    nulls_distinct=False),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} {self.date}"
+
+
+class SyncWatermark(models.Model):
+    """
+    Marca de agua de la sincronización incremental por fuente: el mayor id
+    de Moodle (o timeaccess) ya integrado. Ver apps/moodle/ingest.py.
+    """
+    source = models.CharField(max_length=50, unique=True, verbose_name='Fuente')
+    value = models.BigIntegerField(default=0, verbose_name='Marca de agua')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Actualizado')
+    reconciled_at = models.DateTimeField(null=True, blank=True, verbose_name='Última conciliación')
+
+    class Meta:
+        verbose_name = 'Marca de agua de sincronización'
+        verbose_name_plural = 'Marcas de agua de sincronización'
+        ordering = ['source']
+
+    def __str__(self):
+        return f"{self.source}: {self.value}"
+
+
+class DataHeartbeat(models.Model):
+    """
+    Instante de la última escritura de datos (una sola fila). Se actualiza en
+    la misma transacción que cada carga: comparado entre primario y réplica
+    da el atraso de la réplica. Ver apps/moodle/replicas.py.
+    """
+    beat = models.DateTimeField(verbose_name='Última escritura')
+
+    class Meta:
+        verbose_name = 'Latido de datos'
+        verbose_name_plural = 'Latidos de datos'
+
+    def __str__(self):
+        return f"{self.beat:%Y-%m-%d %H:%M:%S}"
+
+
+# ============================================================================
+# TABLAS DE MOODLE (no administradas, solo lectura, alias MOODLE_DB_ALIAS)
+# Ver routers.py y manage.py sync_moodle_db
+# ============================================================================
+
+def _mdl(table):
+    return f'{settings.MOODLE_DB_PREFIX}{table}'
+
+
+class MoodleTable(models.Model):
+    """Base de los modelos mapeados sobre tablas mdl_* de Moodle"""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        raise NotSupportedError('Las tablas de Moodle son de solo lectura')
+
+    def delete(self, *args, **kwargs):
+        raise NotSupportedError('Las tablas de Moodle son de solo lectura')
+
+
+class MdlCourseCategory(MoodleTable):
+    name = models.CharField(max_length=255)
+    parent = models.BigIntegerField(default=0)
+    path = models.CharField(max_length=255, default='')
+    depth = models.BigIntegerField(default=0)
+    timemodified = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('course_categories')
+
+
+class MdlCourse(MoodleTable):
+    category = models.BigIntegerField(default=0)
+    fullname = models.CharField(max_length=254)
+    shortname = models.CharField(max_length=255)
+    startdate = models.BigIntegerField(default=0)
+    enddate = models.BigIntegerField(default=0)
+    visible = models.SmallIntegerField(default=1)
+    timemodified = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('course')
+
+
+class MdlUser(MoodleTable):
+    username = models.CharField(max_length=100)
+    firstname = models.CharField(max_length=100)
+    lastname = models.CharField(max_length=100)
+    email = models.CharField(max_length=100)
+    deleted = models.SmallIntegerField(default=0)
+    suspended = models.SmallIntegerField(default=0)
+    timemodified = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('user')
+
+
+class MdlEnrol(MoodleTable):
+    enrol = models.CharField(max_length=20)
+    status = models.BigIntegerField(default=0)
+    courseid = models.BigIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = _mdl('enrol')
+
+
+class MdlUserEnrolment(MoodleTable):
+    status = models.BigIntegerField(default=0)
+    enrolid = models.BigIntegerField()
+    userid = models.BigIntegerField()
+    timestart = models.BigIntegerField(default=0)
+    timeend = models.BigIntegerField(default=0)
+    timecreated = models.BigIntegerField(default=0)
+    timemodified = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('user_enrolments')
+
+
+class MdlGroup(MoodleTable):
+    courseid = models.BigIntegerField()
+    name = models.CharField(max_length=254)
+    description = models.TextField(null=True, blank=True)
+    timemodified = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('groups')
+
+
+class MdlGroupMember(MoodleTable):
+    groupid = models.BigIntegerField()
+    userid = models.BigIntegerField()
+    timeadded = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('groups_members')
+
+
+class MdlUserLastAccess(MoodleTable):
+    userid = models.BigIntegerField()
+    courseid = models.BigIntegerField()
+    timeaccess = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('user_lastaccess')
+
+
+class MdlRole(MoodleTable):
+    name = models.CharField(max_length=255, default='')
+    shortname = models.CharField(max_length=100)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('role')
+
+
+class MdlContext(MoodleTable):
+    # contextlevel 50 = curso (instanceid es el id del curso)
+    contextlevel = models.BigIntegerField()
+    instanceid = models.BigIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = _mdl('context')
+
+
+class MdlRoleAssignment(MoodleTable):
+    roleid = models.BigIntegerField()
+    contextid = models.BigIntegerField()
+    userid = models.BigIntegerField()
+    timemodified = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = _mdl('role_assignments')
@@ -0,0 +1,63 @@
+"""
+Paginación por clave (keyset / seek)
+
+En lugar de OFFSET, cada página continúa desde la última fila de la anterior
+usando una comparación de tuplas sobre el orden del queryset, de modo que
+cualquier página cuesta lo mismo que la primera si hay un índice compuesto
+sobre esas columnas.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Codifica los valores de orden de la última fila como cursor opaco"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decodifica un cursor; devuelve None si es inválido"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _after(fields, values):
+    """(f1, f2, ..., fn) > (v1, v2, ..., vn) expresado con Q"""
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f'{field}__gt': values[i]})
+        for previous, value in zip(fields[:i], values[:i]):
+            step &= Q(**{previous: value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, fields, cursor=None, size=100):
+    """
+    Devuelve (filas, cursor_siguiente) ordenando por `fields` (ascendente).
+
+    `cursor_siguiente` es None en la última página.
+    """
+    queryset = queryset.order_by(*fields)
+    values = decode_cursor(cursor, len(fields))
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values))
+
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+
+    rows = rows[:size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field) for field in fields)
@@ -0,0 +1,99 @@
+"""
+Particiones mensuales de la bitácora de accesos (AccessEvent)
+
+La tabla está particionada por rango de timecreated, un mes (UTC) por
+partición (requiere PostgreSQL, como el resto de la base). Las crea la función SQL moodle_accessevent_ensure_partitions
+(migración 0010): la migración deja el último año y los meses próximos,
+manage.py create_access_partitions (cron) mantiene PARTITION_MONTHS_AHEAD meses
+por delante y quien inserta eventos se asegura antes los meses que toca.
+"""
+from datetime import date, timezone as dt_timezone
+
+from .models import AccessEvent
+from .tenants import connection, current_tenant
+
+
+PARTITION_FUNCTION = 'moodle_accessevent_ensure_partitions'
+PARTITION_MONTHS_AHEAD = 3
+
+# (institución, mes) ya verificados por este proceso (evita una consulta por lote)
+_ensured = set()
+
+
+def month_start(moment):
+    """Primer día del mes (UTC) que contiene el instante o la fecha"""
+    if hasattr(moment, 'astimezone'):
+        moment = moment.astimezone(dt_timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(day, months):
+    """Primer día del mes que está `months` meses después (o antes) de `day`"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(first, last):
+    """Meses (primer día) entre dos instantes o fechas, ambos incluidos"""
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return f'{AccessEvent._meta.db_table}_{month:%Y_%m}'
+
+
+def ensure_partitions(first, last):
+    """
+    Crea las particiones que falten para cubrir [first, last].
+
+    Devuelve cuántas creó.
+    """
+    tenant = current_tenant()
+    months = [month for month in iter_months(first, last) if (tenant, month) not in _ensured]
+    if not months:
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {PARTITION_FUNCTION}(%s, %s)', [months[0], months[-1]])
+        created = cursor.fetchone()[0]
+    _ensured.update((tenant, month) for month in months)
+    return created
+
+
+def ensure_partitions_for(moments):
+    """Crea las particiones de los meses en que caen los instantes (sin rellenar huecos)"""
+    return sum(ensure_partitions(month, month) for month in {month_start(m) for m in moments})
+
+
+def forget_partition(month=None):
+    """
+    Olvida un mes verificado (su partición se archivó), o todos sin `month`:
+    otro proceso pudo haber archivado meses que este creía presentes.
+    """
+    tenant = current_tenant()
+    if month is None:
+        _ensured.difference_update({key for key in _ensured if key[0] == tenant})
+    else:
+        _ensured.discard((tenant, month))
+
+
+def list_partitions():
+    """(nombre, desde, hasta, filas estimadas) de cada partición, en orden"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+            [AccessEvent._meta.db_table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound, estimate in rows:
+        # FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')
+        values = bound.split("'")
+        partitions.append((name, values[1], values[3], max(estimate, 0)))
+    return partitions
@@ -0,0 +1,52 @@
+"""
+Período académico (año y cuatrimestre) de un curso
+
+Se calcula una sola vez al guardar el curso o al importarlo, en lugar de
+aplicar expresiones regulares sobre el nombre en cada request.
+"""
+import re
+
+from django.utils import timezone
+
+
+SEMESTERS = [
+    ('1C', 'Primer cuatrimestre'),
+    ('2C', 'Segundo cuatrimestre'),
+]
+
+YEAR_RE = re.compile(r'\b(20\d{2})\b')
+SEMESTER_RE = re.compile(r'\b([12])\s*C\b', re.IGNORECASE)
+
+
+def year_in_name(fullname, shortname=''):
+    """Año que figura en el nombre del curso ("... 2025") o None"""
+    year_match = YEAR_RE.search(fullname or shortname or '')
+    return int(year_match.group(1)) if year_match else None
+
+
+def academic_period(fullname, shortname='', startdate=None):
+    """
+    Devuelve (año, cuatrimestre) de un curso.
+
+    El año sale del nombre ("... 2025") y si no hay, de la fecha de inicio.
+    El cuatrimestre sale del nombre ("1C", "2C") y si no hay, del mes de
+    inicio (enero-julio: 1C, agosto-diciembre: 2C). Cualquiera de los dos
+    puede quedar en None / '' si no hay datos.
+    """
+    name = fullname or shortname or ''
+    if startdate is not None and timezone.is_aware(startdate):
+        startdate = timezone.localtime(startdate)
+
+    year = year_in_name(fullname, shortname)
+    if year is None and startdate is not None:
+        year = startdate.year
+
+    semester_match = SEMESTER_RE.search(name) or SEMESTER_RE.search(shortname or '')
+    if semester_match:
+        semester = f'{semester_match.group(1)}C'
+    elif startdate is not None:
+        semester = '1C' if startdate.month <= 7 else '2C'
+    else:
+        semester = ''
+
+    return year, semester
@@ -0,0 +1,161 @@
+"""
+Réplicas de lectura para estadísticas y panel
+
+Cada institución puede tener una réplica (settings.TENANTS[...]['replica']).
+Las vistas marcadas con @replica_reads leen de ella en los GET; las cargas
+siguen escribiendo en el primario. El atraso se mide comparando DataHeartbeat,
+que cada carga actualiza en su misma transacción: la réplica tiene los datos
+hasta su latido. Sirve para una réplica física de PostgreSQL o para una copia.
+
+- atraso > REPLICA_MAX_LAG_SECONDS (o réplica caída): se lee del primario.
+- atraso >= REPLICA_AS_OF_SECONDS: la página muestra "datos al ...".
+- con atraso >= REPLICA_AS_OF_SECONDS tampoco se usan las cachés versionadas
+  (la versión es la del primario); un atraso menor, el de los latidos de
+  eventos en vivo, se toma como al día. Lo que se cachee en ese estado usa
+  como versión el latido de la réplica (replica_data_version).
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .models import DataHeartbeat
+from .tenants import current_tenant
+
+
+logger = logging.getLogger(__name__)
+
+# (institución, alias, atraso, datos al) elegidos para las lecturas del request
+_read_target = ContextVar('moodle_read_target', default=None)
+
+# {institución: (momento de la medición, atraso o None, latido de la réplica)}
+_status_cache = {}
+_status_lock = threading.Lock()
+
+
+def beat():
+    """Registra una escritura de datos; llamar dentro de la transacción de la carga"""
+    DataHeartbeat.objects.update_or_create(pk=1, defaults={'beat': timezone.now()})
+
+
+def replica_aliases():
+    return {config['replica'] for config in settings.TENANTS.values() if config.get('replica')}
+
+
+def _last_beat(alias):
+    return DataHeartbeat.objects.using(alias).filter(pk=1).values_list('beat', flat=True).first()
+
+
+def _measure(tenant):
+    config = settings.TENANTS[tenant]
+    try:
+        replica_beat = _last_beat(config['replica'])
+        primary_beat = _last_beat(config['alias'])
+    except DatabaseError as error:
+        logger.warning('Réplica de %s no disponible, se lee del primario: %s', tenant, error)
+        return None, None
+    if primary_beat is None:
+        return timedelta(0), replica_beat
+    if replica_beat is None:
+        return None, None
+    return max(primary_beat - replica_beat, timedelta(0)), replica_beat
+
+
+def replica_status(tenant=None):
+    """
+    (atraso, datos al) de la réplica de la institución; atraso None si no
+    responde o no tiene datos. Se mide cada REPLICA_LAG_CHECK_SECONDS por proceso.
+    """
+    tenant = tenant or current_tenant()
+    with _status_lock:
+        cached = _status_cache.get(tenant)
+        if cached is None or time.monotonic() - cached[0] >= settings.REPLICA_LAG_CHECK_SECONDS:
+            cached = _status_cache[tenant] = (time.monotonic(), *_measure(tenant))
+    return cached[1], cached[2]
+
+
+def read_target(tenant=None):
+    """(alias, atraso, datos al) para las lecturas de solo consulta de la institución"""
+    tenant = tenant or current_tenant()
+    config = settings.TENANTS[tenant]
+    if not config.get('replica'):
+        return config['alias'], timedelta(0), None
+    lag, as_of = replica_status(tenant)
+    if lag is None or lag > timedelta(seconds=settings.REPLICA_MAX_LAG_SECONDS):
+        return config['alias'], timedelta(0), None
+    if lag < timedelta(seconds=settings.REPLICA_AS_OF_SECONDS):
+        as_of = None
+    return config['replica'], lag, as_of
+
+
+def read_alias():
+    """Alias elegido por @replica_reads para la institución actual, o None"""
+    target = _read_target.get()
+    if target is None or target[0] != current_tenant():
+        return None
+    return target[1]
+
+
+def reads_current_data():
+    """False si las lecturas van a una réplica atrasada al menos REPLICA_AS_OF_SECONDS"""
+    target = _read_target.get()
+    return (
+        target is None or target[0] != current_tenant()
+        or target[2] < timedelta(seconds=settings.REPLICA_AS_OF_SECONDS)
+    )
+
+
+def replica_data_version():
+    """
+    Latido de la réplica atrasada que leen las consultas del request, o None
+    si leen datos al día (ver reads_current_data). Cambia a lo sumo cada
+    REPLICA_LAG_CHECK_SECONDS, así que sirve de versión para cachés en proceso.
+    """
+    if reads_current_data():
+        return None
+    return _read_target.get()[3]
+
+
+def _streamed_with_target(target, content):
+    token = _read_target.set(target)
+    try:
+        yield from content
+    finally:
+        _read_target.reset(token)
+
+
+def replica_reads(view):
+    """
+    Decorador de vistas de solo consulta: en GET/HEAD lee de la réplica si
+    está al día (ver read_target) y deja request.data_as_of.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.data_as_of = None
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        tenant = current_tenant()
+        alias, lag, request.data_as_of = read_target(tenant)
+        target = (tenant, alias, lag, request.data_as_of)
+        token = _read_target.set(target)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_target.reset(token)
+        if response.streaming:
+            response.streaming_content = _streamed_with_target(target, response.streaming_content)
+        return response
+
+    return wrapper
+
+
+def data_freshness(request):
+    """Context processor: "datos al" cuando la página se leyó de una réplica atrasada"""
+    return {'data_as_of': getattr(request, 'data_as_of', None)}
@@ -0,0 +1,443 @@
+"""
+Motor de reportes de "usuarios que aún no ingresaron"
+
+El último acceso por usuario se obtiene con una única consulta agrupada
+(MAX(timeaccess) por usuario), los instantes se ordenan una sola vez y cada
+período se resuelve con una búsqueda binaria: O((U + P) log U) en lugar de
+recorrer todos los usuarios en cada semana.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .bitsets import bitmap_andnot, membership_index, popcount
+from .models import (
+    Group, GroupMember, MoodleUser, UserEnrolment, UserLastAccess,
+    WeeklyNeverAccess,
+)
+from .tenants import atomic
+
+
+GRANULARITIES = [
+    ('day', 'Diaria'),
+    ('week', 'Semanal'),
+    ('month', 'Mensual'),
+]
+DEFAULT_GRANULARITY = 'week'
+
+# Orden estable para listados y paginación por clave
+NEVER_USERS_ORDERING = ('lastname', 'firstname', 'id')
+
+
+def normalize_granularity(value):
+    """Devuelve una granularidad válida (semanal por defecto)"""
+    valid = {key for key, _ in GRANULARITIES}
+    return value if value in valid else DEFAULT_GRANULARITY
+
+
+def _period_start(day, granularity):
+    """Primer día del período que contiene a `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())  # lunes
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day, granularity):
+    """Primer día del período siguiente"""
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def _period_label(start, end, granularity):
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    if granularity == 'day':
+        return start.strftime('%Y-%m-%d')
+    return f"{start.strftime('%Y-%m-%d')} → {end.strftime('%Y-%m-%d')}"
+
+
+def iter_periods(from_date, to_date, granularity=DEFAULT_GRANULARITY):
+    """
+    Genera (inicio, fin, etiqueta) para cada período entre from_date y to_date.
+
+    Los límites se calculan sobre fechas locales, de modo que cada período
+    empieza a las 00:00:00 y termina a las 23:59:59 de su último día.
+    """
+    tz = timezone.get_current_timezone()
+    current = _period_start(timezone.localtime(from_date, tz).date(), granularity)
+    last_day = timezone.localtime(to_date, tz).date()
+
+    while current <= last_day:
+        following = _next_period(current, granularity)
+        start = timezone.make_aware(datetime.combine(current, time.min), tz)
+        end = timezone.make_aware(
+            datetime.combine(following - timedelta(days=1), time(23, 59, 59)), tz
+        )
+        yield start, end, _period_label(start, end, granularity)
+        current = following
+
+
+def last_access_map(course, users=None):
+    """
+    Último acceso al curso por usuario en una sola consulta agrupada.
+
+    `users` puede ser un queryset de ids (subconsulta) o un iterable de ids.
+    """
+    accesses = UserLastAccess.objects.filter(course=course)
+    if users is not None:
+        accesses = accesses.filter(user_id__in=users)
+
+    return dict(
+        accesses.values('user_id')
+        .annotate(last=Max('timeaccess'))
+        .values_list('user_id', 'last')
+    )
+
+
+def never_accessed_series(last_accesses, total, periods):
+    """
+    Serie de usuarios que aún no ingresaron al cierre de cada período.
+
+    `last_accesses` es {user_id: último acceso} restringido a los usuarios
+    objetivo y `total` la cantidad de usuarios objetivo (con o sin acceso).
+    """
+    timestamps = sorted(ts.timestamp() for ts in last_accesses.values())
+
+    series = []
+    for start, end, label in periods:
+        accessed = bisect_right(timestamps, end.timestamp())
+        series.append({
+            'label': label,
+            'never': total - accessed,
+            'start_ts': int(start.timestamp()),
+            'end_ts': int(end.timestamp()),
+        })
+    return series
+
+
+def _target_users(course, group):
+    """Usuarios del grupo inscritos al curso (dos semi-joins, sin listas IN)"""
+    return MoodleUser.objects.filter(
+        Exists(GroupMember.objects.filter(group=group, user=OuterRef('pk'))),
+        Exists(UserEnrolment.objects.filter(enrol__course=course, user=OuterRef('pk'))),
+    )
+
+
+def target_user_ids(course, group):
+    """Usuarios del grupo que además están inscritos en el curso (índice de bitmaps)"""
+    index = membership_index()
+    if index is None:
+        return set(_target_users(course, group).values_list('pk', flat=True))
+    return set(index.ids(index.targets(course.id, group.id)).tolist())
+
+
+def never_accessed_count(course, group, week_end):
+    """
+    Cantidad de usuarios objetivo sin acceso a `week_end`.
+
+    (miembros AND inscriptos) ANDNOT (con acceso hasta week_end) sobre bitmaps;
+    solo se consulta la base para los accesos. Sin índice (réplica atrasada)
+    se cuenta con la consulta de never_accessed_users.
+    """
+    index = membership_index()
+    if index is None:
+        return never_accessed_users(course, group, week_end).count()
+    targets = index.targets(course.id, group.id)
+    if not popcount(targets):
+        return 0
+
+    accessed = UserLastAccess.objects.filter(
+        course=course, timeaccess__lte=week_end,
+        user__in=GroupMember.objects.filter(group=group).values('user_id'),
+    ).values_list('user_id', flat=True).iterator()
+    return popcount(bitmap_andnot(targets, index.bitmap(accessed)))
+
+
+def never_accessed_users(course, group, week_end):
+    """
+    Usuarios del grupo inscritos al curso que aún no ingresaron a `week_end`.
+
+    Se resuelve en una sola consulta: dos semi-joins (grupo e inscripción) y
+    un anti-join (NOT EXISTS) contra el último acceso, sin listas IN.
+    """
+    return _target_users(course, group).filter(
+        ~Exists(UserLastAccess.objects.filter(
+            course=course, user=OuterRef('pk'), timeaccess__lte=week_end
+        )),
+    ).order_by(*NEVER_USERS_ORDERING)
+
+
+def calculate_never_accessed(course, group, from_date, to_date,
+                             granularity=DEFAULT_GRANULARITY):
+    """Reporte de usuarios sin acceso por período para un grupo del curso"""
+    granularity = normalize_granularity(granularity)
+    targets = target_user_ids(course, group)
+
+    group_users = GroupMember.objects.filter(group=group).values('user_id')
+    last_accesses = {
+        user_id: last
+        for user_id, last in last_access_map(course, group_users).items()
+        if user_id in targets
+    }
+
+    periods = iter_periods(from_date, to_date, granularity)
+    return {
+        'series': never_accessed_series(last_accesses, len(targets), periods),
+        'total_group': len(targets),
+        'granularity': granularity,
+    }
+
+
+# ============================================================================
+# PRECÁLCULO POR LOTES (tabla WeeklyNeverAccess)
+# ============================================================================
+
+BATCH_CHUNK_SIZE = 5000
+
+
+def _by_course(rows):
+    """Agrupa filas (course_id, ...) ya ordenadas por curso"""
+    for course_id, group in groupby(rows, key=lambda row: row[0]):
+        yield course_id, [row[1:] for row in group]
+
+
+def iter_course_batches(course_ids=None):
+    """
+    Recorre todos los cursos en una sola pasada por lotes.
+
+    Lanza tres consultas ordenadas por curso (miembros de grupos, inscriptos
+    y último acceso agrupado) y las consume en paralelo, de modo que solo los
+    datos de un curso están en memoria a la vez. Genera, por curso:
+    (course_id, {group_id: set(user_ids)}, set(inscriptos), {user_id: último acceso})
+    """
+    members = GroupMember.objects.order_by('group__course_id')
+    enrolments = UserEnrolment.objects.order_by('enrol__course_id')
+    accesses = UserLastAccess.objects.order_by('course_id')
+    groups = Group.objects.order_by('course_id')
+    if course_ids is not None:
+        members = members.filter(group__course_id__in=course_ids)
+        enrolments = enrolments.filter(enrol__course_id__in=course_ids)
+        accesses = accesses.filter(course_id__in=course_ids)
+        groups = groups.filter(course_id__in=course_ids)
+
+    streams = {
+        'groups': _by_course(
+            groups.values_list('course_id', 'id').iterator(chunk_size=BATCH_CHUNK_SIZE)
+        ),
+        'members': _by_course(
+            members.values_list('group__course_id', 'group_id', 'user_id')
+            .iterator(chunk_size=BATCH_CHUNK_SIZE)
+        ),
+        'enrolled': _by_course(
+            enrolments.values_list('enrol__course_id', 'user_id')
+            .iterator(chunk_size=BATCH_CHUNK_SIZE)
+        ),
+        'accesses': _by_course(
+            accesses.values('course_id', 'user_id')
+            .annotate(last=Max('timeaccess'))
+            .values_list('course_id', 'user_id', 'last')
+            .iterator(chunk_size=BATCH_CHUNK_SIZE)
+        ),
+    }
+    heads = {name: next(stream, None) for name, stream in streams.items()}
+
+    # Los grupos definen qué cursos se reportan
+    while heads['groups'] is not None:
+        course_id, group_rows = heads['groups']
+        batch = {}
+        for name in ('members', 'enrolled', 'accesses'):
+            # Descartar cursos sin grupos y quedarse con el actual
+            while heads[name] is not None and heads[name][0] < course_id:
+                heads[name] = next(streams[name], None)
+            if heads[name] is not None and heads[name][0] == course_id:
+                batch[name] = heads[name][1]
+                heads[name] = next(streams[name], None)
+            else:
+                batch[name] = []
+
+        group_users = {group_id: set() for (group_id,) in group_rows}
+        for group_id, user_id in batch['members']:
+            group_users[group_id].add(user_id)
+
+        yield (
+            course_id,
+            group_users,
+            {user_id for (user_id,) in batch['enrolled']},
+            dict(batch['accesses']),
+        )
+        heads['groups'] = next(streams['groups'], None)
+
+
+def group_never_accessed(group_users, enrolled, last_accesses, periods):
+    """Serie por grupo a partir de los datos ya cargados de un curso"""
+    periods = list(periods)
+    result = {}
+    for group_id, users in group_users.items():
+        targets = users & enrolled
+        accessed = {
+            user_id: last_accesses[user_id]
+            for user_id in targets if user_id in last_accesses
+        }
+        result[group_id] = {
+            'series': never_accessed_series(accessed, len(targets), periods),
+            'total_group': len(targets),
+        }
+    return result
+
+
+def calculate_course_matrix(course, from_date, to_date, granularity=DEFAULT_GRANULARITY):
+    """
+    Matriz grupo × período de usuarios sin acceso para todos los grupos del curso.
+
+    Miembros, inscriptos y último acceso se leen una sola vez para el curso y
+    se reparten por grupo, en lugar de recalcular cada grupo por separado.
+    """
+    granularity = normalize_granularity(granularity)
+    periods = list(iter_periods(from_date, to_date, granularity))
+
+    reports = {}
+    for _course_id, group_users, enrolled, last_accesses in iter_course_batches([course.id]):
+        reports = group_never_accessed(group_users, enrolled, last_accesses, periods)
+
+    rows = []
+    for group in Group.objects.filter(course=course).order_by('name'):
+        report = reports.get(group.id, {'series': [], 'total_group': 0})
+        rows.append({
+            'group': group,
+            'total_group': report['total_group'],
+            'never': [point['never'] for point in report['series']],
+        })
+
+    return {
+        'periods': [
+            {
+                'label': label,
+                'start_ts': int(start.timestamp()),
+                'end_ts': int(end.timestamp()),
+            }
+            for start, end, label in periods
+        ],
+        'rows': rows,
+        'granularity': granularity,
+    }
+
+
+def _store_weeks(course_ids, periods, last_weeks=None):
+    """
+    Recalcula y reemplaza las semanas `periods` de WeeklyNeverAccess de cada
+    curso (las demás semanas guardadas no se tocan); con `last_weeks`
+    ({curso: semana}) no escribe semanas posteriores a la indicada.
+
+    Devuelve la cantidad de filas escritas.
+    """
+    weeks = [timezone.localtime(start).date() for start, _, _ in periods]
+    computed_at = timezone.now()
+    written = 0
+
+    for course_id, group_users, enrolled, last_accesses in iter_course_batches(course_ids):
+        reports = group_never_accessed(group_users, enrolled, last_accesses, periods)
+        last_week = last_weeks[course_id] if last_weeks else None
+        rows = [
+            WeeklyNeverAccess(
+                course_id=course_id,
+                group_id=group_id,
+                week_start=week,
+                never=point['never'],
+                total_group=report['total_group'],
+                computed_at=computed_at,
+            )
+            for group_id, report in reports.items()
+            for week, point in zip(weeks, report['series'])
+            if last_week is None or week <= last_week
+        ]
+        with atomic():
+            WeeklyNeverAccess.objects.filter(course_id=course_id, week_start__in=weeks).delete()
+            WeeklyNeverAccess.objects.bulk_create(rows, batch_size=BATCH_CHUNK_SIZE)
+        written += len(rows)
+
+    return written
+
+
+def precompute_weekly_never_accessed(from_date, to_date, course_ids=None):
+    """
+    Recalcula la tabla WeeklyNeverAccess para todos los (curso, grupo, semana)
+    del rango; las semanas fuera del rango quedan como estaban.
+
+    Devuelve la cantidad de filas escritas.
+    """
+    return _store_weeks(course_ids, list(iter_periods(from_date, to_date, 'week')))
+
+
+def refresh_stored_weeks(course_ids, since):
+    """
+    Recalcula las semanas precalculadas desde la que contiene a `since` hasta
+    la última guardada, solo para los cursos indicados que ya tienen datos.
+
+    Pensado para eventos de acceso en vivo: `since` es el último acceso más
+    antiguo que cambió, que es el anterior al evento cuando lo había (un
+    usuario cuenta como sin acceso en las semanas que cierran antes de su
+    último acceso, así que cambian todas las semanas desde ese instante).
+    Devuelve la cantidad de filas escritas.
+    """
+    first_week = _period_start(timezone.localtime(since).date(), 'week')
+    last_weeks = dict(
+        WeeklyNeverAccess.objects.filter(course_id__in=course_ids, week_start__gte=first_week)
+        .values('course_id').annotate(last=Max('week_start')).values_list('course_id', 'last')
+    )
+    if not last_weeks:
+        return 0
+
+    tz = timezone.get_current_timezone()
+    from_date = timezone.make_aware(datetime.combine(first_week, time.min), tz)
+    to_date = timezone.make_aware(datetime.combine(max(last_weeks.values()), time.min), tz)
+    return _store_weeks(list(last_weeks), list(iter_periods(from_date, to_date, 'week')), last_weeks)
+
+
+def _fresh_snapshot():
+    max_age = timedelta(hours=settings.NEVER_ACCESS_SNAPSHOT_MAX_AGE_HOURS)
+    return WeeklyNeverAccess.objects.filter(computed_at__gte=timezone.now() - max_age)
+
+
+def stored_weekly_report(group, from_date, to_date):
+    """
+    Reporte semanal leído de la tabla precalculada.
+
+    Devuelve None si falta alguna semana del rango o los datos no están
+    frescos, en cuyo caso corresponde calcularlo en vivo.
+    """
+    periods = list(iter_periods(from_date, to_date, 'week'))
+    rows = {
+        row.week_start: row
+        for row in _fresh_snapshot().filter(
+            group=group,
+            week_start__in=[timezone.localtime(start).date() for start, _, _ in periods],
+        )
+    }
+    if not periods or len(rows) != len(periods):
+        return None
+
+    series = []
+    for start, end, label in periods:
+        row = rows[timezone.localtime(start).date()]
+        series.append({
+            'label': label,
+            'never': row.never,
+            'start_ts': int(start.timestamp()),
+            'end_ts': int(end.timestamp()),
+        })
+
+    return {
+        'series': series,
+        'total_group': rows[timezone.localtime(periods[0][0]).date()].total_group,
+        'granularity': 'week',
+        'precomputed': True,
+    }
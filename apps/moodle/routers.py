@@ -0,0 +1,65 @@
+"""
+Routers de bases de datos
+
+Los modelos Mdl* (tablas mdl_* de Moodle) se leen del alias MOODLE_DB_ALIAS;
+en esa base nunca se migra nada. El resto de apps.moodle va a la base de la
+institución actual (ver tenants.py).
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import MoodleTable
+from .replicas import read_alias, replica_aliases
+from .tenants import tenant_alias, tenant_aliases
+
+
+def _is_moodle_table(model):
+    return issubclass(model, MoodleTable)
+
+
+class MoodleSourceRouter:
+
+    def db_for_read(self, model, **hints):
+        if _is_moodle_table(model):
+            return settings.MOODLE_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if _is_moodle_table(model):
+            return settings.MOODLE_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if _is_moodle_table(type(obj1)) != _is_moodle_table(type(obj2)):
+            return False
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.MOODLE_DB_ALIAS:
+            return False
+        return None
+
+
+class TenantRouter:
+    """
+    Modelos de apps.moodle a la base de la institución actual (o a su
+    réplica en las vistas con @replica_reads); auth, sesiones y analytics
+    quedan en 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'moodle':
+            return read_alias() or tenant_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'moodle':
+            return tenant_alias()
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        if db == DEFAULT_DB_ALIAS or db not in tenant_aliases():
+            return None
+        return app_label == 'moodle'
@@ -0,0 +1,79 @@
+"""
+Búsqueda de cursos para el panel y el autocompletado
+
+Se usan índices GIN con pg_trgm: el filtro por similitud de
+palabra (operador <%) usa el índice y el resultado se ordena por relevancia.
+"""
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .cache import cached_by_version
+from .categories import category_ids_named, descendant_ids
+from .models import Course
+from .tenants import connection
+
+
+AUTOCOMPLETE_LIMIT = 20
+
+# Con menos caracteres no hay trigramas útiles: se busca por prefijo del código
+MIN_TRIGRAM_TERM = 3
+
+COURSE_FIELDS = ('id', 'shortname', 'fullname')
+
+
+def panel_courses(current_year=None):
+    """
+    Cursos visibles de Grado del año actual o el siguiente.
+
+    El año siguiente solo cuenta si figura en el nombre (por fecha de inicio
+    se toma solo el año actual); los cursos sin año conocido se incluyen igual.
+    """
+    if current_year is None:
+        current_year = timezone.localtime().year
+
+    courses = Course.objects.filter(visible=True).filter(
+        Q(academic_year=current_year) |
+        Q(academic_year=current_year + 1, name_has_year=True) |
+        Q(academic_year__isnull=True)
+    )
+    allowed_category_ids = descendant_ids(category_ids_named('Grado'))
+    if allowed_category_ids:
+        courses = courses.filter(category_id__in=allowed_category_ids)
+    return courses
+
+
+def search_courses(courses, term, limit=AUTOCOMPLETE_LIMIT):
+    """Los `limit` cursos más parecidos a `term`, como dicts (id, shortname, fullname)"""
+    term = term.strip()
+    if not term:
+        return []
+
+    if len(term) < MIN_TRIGRAM_TERM:
+        courses = courses.filter(shortname__istartswith=term).order_by('shortname')
+    else:
+        courses = (
+            courses.filter(
+                Q(shortname__trigram_word_similar=term) |
+                Q(fullname__trigram_word_similar=term)
+            )
+            .annotate(rank=Greatest(
+                TrigramWordSimilarity(term, 'shortname'),
+                TrigramWordSimilarity(term, 'fullname'),
+            ))
+            .order_by('-rank', 'shortname')
+        )
+
+    return list(courses.values(*COURSE_FIELDS)[:limit])
+
+
+def default_course_options(limit=AUTOCOMPLETE_LIMIT):
+    """Primeros cursos del panel sin búsqueda; cacheado hasta la próxima carga"""
+    current_year = timezone.localtime().year
+    return cached_by_version(
+        f'panel:courses:{current_year}:{limit}',
+        lambda: list(
+            panel_courses(current_year).order_by('shortname').values(*COURSE_FIELDS)[:limit]
+        ),
+    )
@@ -0,0 +1,354 @@
+"""
+Recarga completa en tablas sombra con intercambio atómico
+
+En lugar de integrar sobre las tablas vivas, cada fuente se vuelca a una copia
+(<tabla>__shadow) sin índices ni claves. Con los datos ya cargados se
+construyen índices, claves primarias/únicas y foráneas (mucho más rápido que
+mantenerlos fila a fila) y se corre ANALYZE; recién entonces, en una
+transacción corta, las sombras toman el nombre de las tablas vivas. Los
+lectores ven los datos anteriores completos hasta el commit y los nuevos
+completos después: nunca una carga a medias.
+
+Las claves foráneas de otras tablas (semanas precalculadas, clausura de
+categorías) se vuelven a crear NOT VALID dentro del intercambio; después se
+borran sus filas huérfanas (como haría el CASCADE de Django) y se validan sin
+bloquear a los lectores.
+"""
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.color import no_style
+from django.db import OperationalError, connections
+
+from .activity import record_activity_sql
+from .cache import bump_data_version
+from .categories import rebuild_category_closure
+from .coursestats import refresh_course_stats
+from .ingest import (
+    MERGE_LOCK_KEY, SOURCES, _parent_filter, create_stage, drop_stage, load_stages,
+    store_watermarks,
+)
+from .models import UserLastAccess
+from .replicas import beat
+from .tenants import activate_tenant, atomic, connection, current_tenant
+
+
+SHADOW_SUFFIX = '__shadow'
+OLD_SUFFIX = '__old'
+
+# El intercambio espera los locks a lo sumo esto por intento; si hay lecturas
+# largas se reintenta en lugar de encolar a todos los lectores detrás
+SWAP_LOCK_TIMEOUT = '5s'
+SWAP_ATTEMPTS = 5
+SWAP_RETRY_SECONDS = 2
+
+# Memoria para construir cada índice (por proceso)
+MAINTENANCE_WORK_MEM = '512MB'
+
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def shadow_table(table):
+    return f'{table}{SHADOW_SUFFIX}'
+
+
+def _temporary_name(name):
+    """Nombre provisorio (único y corto) para un índice o constraint de la sombra"""
+    return 'shadow_' + hashlib.md5(name.encode()).hexdigest()[:20]
+
+
+# ============================================================================
+# CATÁLOGO
+# ============================================================================
+
+def table_constraints(table):
+    """(nombre, tipo p/u/f, definición, tabla referenciada) de la tabla"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid), "
+            "CASE WHEN contype = 'f' THEN confrelid::regclass::text END "
+            "FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f') "
+            "ORDER BY contype = 'f', conname",
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def table_indexes(table):
+    """(nombre, definición) de los índices que no respaldan una PK/UNIQUE"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) "
+            "FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT EXISTS ("
+            "  SELECT 1 FROM pg_constraint c "
+            "  WHERE c.conindid = x.indexrelid AND c.conrelid = x.indrelid "
+            "  AND c.contype IN ('p', 'u', 'x')"
+            ") ORDER BY i.relname",
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def table_triggers(table):
+    """(nombre, definición) de los triggers propios de la tabla (p. ej. los de coursestats.py)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger "
+            "WHERE tgrelid = %s::regclass AND NOT tgisinternal ORDER BY tgname",
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def referencing_constraints(tables):
+    """
+    Claves foráneas de otras tablas hacia `tables`.
+
+    Devuelve (tabla, nombre, definición, columna, tabla referenciada, columna
+    referenciada); Django solo crea claves de una columna.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid), "
+            "a.attname, c.confrelid::regclass::text, r.attname "
+            "FROM pg_constraint c "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+            "JOIN pg_attribute r ON r.attrelid = c.confrelid AND r.attnum = c.confkey[1] "
+            "WHERE c.contype = 'f' AND c.confrelid = ANY(%s::regclass[]) "
+            "AND NOT c.conrelid = ANY(%s::regclass[]) "
+            "ORDER BY 1, 2",
+            [tables, tables],
+        )
+        return cursor.fetchall()
+
+
+def serial_sequence(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        return cursor.fetchone()[0]
+
+
+# ============================================================================
+# SOMBRAS
+# ============================================================================
+
+def create_shadow(source):
+    """Copia vacía de la tabla: columnas, defaults, identidad y CHECK; sin índices"""
+    shadow = shadow_table(source.table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {shadow}')
+        cursor.execute(
+            f'CREATE TABLE {shadow} (LIKE {source.table} INCLUDING DEFAULTS '
+            f'INCLUDING IDENTITY INCLUDING GENERATED INCLUDING CONSTRAINTS INCLUDING STORAGE)'
+        )
+    return shadow
+
+
+def drop_shadow(source):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {shadow_table(source.table)}')
+
+
+def fill_shadow_sql(source, stage, tables):
+    """INSERT ... SELECT DISTINCT ON (clave) del staging a la sombra (gana la última fila)"""
+    columns = ', '.join(source.columns)
+    conflict = ', '.join(source.conflict)
+    return (
+        f'INSERT INTO {tables[source.model]} ({columns}) '
+        f'SELECT DISTINCT ON ({conflict}) {columns} FROM {stage} s '
+        f'WHERE {_parent_filter(source, stage, tables)} '
+        f'ORDER BY {conflict}, s.ctid DESC'
+    )
+
+
+def shadow_build_plan(table, shadowed):
+    """
+    Sentencias para armar la sombra de `table` a imagen de la tabla viva.
+
+    Devuelve (claves e índices, claves foráneas, renombres y triggers para
+    después del intercambio). Las foráneas hacia tablas que también se
+    recargan apuntan a sus sombras; los triggers se crean recién sobre la
+    tabla ya intercambiada, así no corren durante el llenado.
+    """
+    shadow = shadow_table(table)
+    keys, foreign, renames = [], [], []
+
+    for name, kind, definition, referenced in table_constraints(table):
+        temporary = _temporary_name(f'{shadow}.{name}')
+        if kind == 'f':
+            if referenced in shadowed:
+                definition = definition.replace(
+                    f'REFERENCES {referenced}(', f'REFERENCES {shadow_table(referenced)}(', 1
+                )
+            foreign.append(f'ALTER TABLE {shadow} ADD CONSTRAINT {temporary} {definition}')
+        else:
+            keys.append(f'ALTER TABLE {shadow} ADD CONSTRAINT {temporary} {definition}')
+        renames.append(f'ALTER TABLE {table} RENAME CONSTRAINT {temporary} TO {name}')
+
+    for name, definition in table_indexes(table):
+        temporary = _temporary_name(f'{shadow}.{name}')
+        definition = definition.replace(f'INDEX {name} ON', f'INDEX {temporary} ON', 1)
+        definition = re.sub(
+            rf' ON (ONLY )?((?:\w+\.)?){re.escape(table)} ', rf' ON \g<1>\g<2>{shadow} ',
+            definition, count=1,
+        )
+        keys.append(definition)
+        renames.append(f'ALTER INDEX {temporary} RENAME TO {name}')
+
+    # La definición nombra la tabla viva: después del intercambio es la nueva
+    renames.extend(definition for _, definition in table_triggers(table))
+
+    keys.append(f'ANALYZE {shadow}')
+    return keys, foreign, renames
+
+
+def execute_statements(statements):
+    """Corre sentencias de mantenimiento en orden; corre en un proceso aparte"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET maintenance_work_mem = '{MAINTENANCE_WORK_MEM}'")
+        for sql in statements:
+            cursor.execute(sql)
+    return len(statements)
+
+
+def _run_parallel(function, args, workers):
+    """Igual que en bulk.py/ingest.py: fork con las conexiones cerradas antes"""
+    if workers <= 1 or len(args) <= 1:
+        return [function(arg) for arg in args]
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=min(workers, len(args)), mp_context=context,
+                             initializer=activate_tenant, initargs=(current_tenant(),)) as executor:
+        return list(executor.map(function, args))
+
+
+# ============================================================================
+# INTERCAMBIO
+# ============================================================================
+
+def swap_shadows(sources, renames, external, marks=None):
+    """
+    Reemplaza las tablas vivas por sus sombras en una sola transacción.
+
+    Solo hay renombres y DROP (el espacio se libera al commit); las secuencias
+    de identidad recuperan su nombre original y se ponen al día con los ids,
+    y los conteos de coursestats.py se recalculan sobre las tablas nuevas.
+    """
+    tables = [source.table for source in sources]
+    sequences = {table: serial_sequence(table) for table in tables}
+
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [MERGE_LOCK_KEY])
+        cursor.execute(f'LOCK TABLE {", ".join(tables)} IN ACCESS EXCLUSIVE MODE')
+
+        for child, name, *_ in external:
+            cursor.execute(f'ALTER TABLE {child} DROP CONSTRAINT {name}')
+        for table in tables:
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {table}{OLD_SUFFIX}')
+            cursor.execute(f'ALTER TABLE {shadow_table(table)} RENAME TO {table}')
+        # Juntas: las viejas se referencian entre sí
+        cursor.execute(f'DROP TABLE {", ".join(table + OLD_SUFFIX for table in tables)}')
+        for sql in renames:
+            cursor.execute(sql)
+        for table, sequence in sequences.items():
+            current = serial_sequence(table)
+            if sequence and current and current != sequence:
+                cursor.execute(f'ALTER SEQUENCE {current} RENAME TO {sequence.split(".")[-1]}')
+        for child, name, definition, *_ in external:
+            cursor.execute(f'ALTER TABLE {child} ADD CONSTRAINT {name} {definition} NOT VALID')
+
+        for sql in connection.ops.sequence_reset_sql(no_style(), [s.model for s in sources]):
+            cursor.execute(sql)
+        # Las tablas nuevas se cargaron sin triggers: conteos desde cero
+        refresh_course_stats()
+        store_watermarks(marks)
+        beat()
+
+
+def _is_lock_timeout(error):
+    return getattr(error.__cause__, 'pgcode', None) == LOCK_NOT_AVAILABLE
+
+
+def validate_external(external):
+    """Borra las filas huérfanas de las tablas que referencian y valida sus claves"""
+    removed = 0
+    with connection.cursor() as cursor:
+        for child, name, _, column, parent, parent_column in external:
+            cursor.execute(
+                f'DELETE FROM {child} c WHERE c.{column} IS NOT NULL AND NOT EXISTS '
+                f'(SELECT 1 FROM {parent} p WHERE p.{parent_column} = c.{column})'
+            )
+            removed += cursor.rowcount
+            cursor.execute(f'ALTER TABLE {child} VALIDATE CONSTRAINT {name}')
+    return removed
+
+
+def shadow_reload(paths, workers=1):
+    """
+    Recarga completa de las fuentes de `paths` ({fuente: archivo o None}).
+
+    Devuelve lo mismo que ingest.run_import: (filas cargadas, filas en las
+    tablas nuevas, bajas) por fuente; las bajas no se informan porque la
+    tabla se reemplaza entera.
+    """
+    run_id = os.getpid()
+    sources = [source for source in SOURCES if source.name in paths]
+    tables = {source.model: shadow_table(source.table) for source in sources}
+    shadowed = {source.table for source in sources}
+
+    for source in sources:
+        create_stage(source, run_id)
+        create_shadow(source)
+    try:
+        stages = load_stages(paths, run_id, workers, None)
+
+        # En orden de dependencias: las foráneas se validan contra las sombras
+        filled = {}
+        with connection.cursor() as cursor:
+            for source in sources:
+                stage = source.stage_table(run_id)
+                cursor.execute(f'ANALYZE {stage}')
+                cursor.execute(fill_shadow_sql(source, stage, tables))
+                filled[source.name] = cursor.rowcount
+        for source in sources:
+            drop_stage(source, run_id)
+
+        plans = [shadow_build_plan(source.table, shadowed) for source in sources]
+        _run_parallel(execute_statements, [keys for keys, _, _ in plans], workers)
+        _run_parallel(execute_statements, [foreign for _, foreign, _ in plans if foreign], workers)
+        renames = [sql for _, _, table_renames in plans for sql in table_renames]
+
+        external = referencing_constraints(sorted(shadowed))
+        marks = {name: high for name, (_, high) in stages.items()}
+        for attempt in range(1, SWAP_ATTEMPTS + 1):
+            try:
+                swap_shadows(sources, renames, external, marks)
+                break
+            except OperationalError as error:
+                if not _is_lock_timeout(error) or attempt == SWAP_ATTEMPTS:
+                    raise
+                time.sleep(SWAP_RETRY_SECONDS)
+    finally:
+        for source in sources:
+            drop_stage(source, run_id)
+            drop_shadow(source)
+
+    validate_external(external)
+    if 'user_lastaccess' in paths:
+        # Cada último acceso es actividad en su semana (los bits previos quedan)
+        with atomic(), connection.cursor() as cursor:
+            cursor.execute(*record_activity_sql(
+                f'SELECT user_id, course_id, timeaccess AS moment FROM {UserLastAccess._meta.db_table}'
+            ))
+    if 'categories' in paths:
+        rebuild_category_closure()
+    bump_data_version()
+    loaded = {name: count for name, (count, _) in stages.items()}
+    return loaded, filled, {}
+
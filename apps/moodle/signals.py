@@ -0,0 +1,67 @@
+"""
+Señales de la app moodle
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_data_version
+from .categories import add_category_links, bump_category_version, move_category_links
+from .models import Category, Course, Enrol, Group, GroupMember, MoodleUser, UserEnrolment
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_parent(sender, instance, raw, **kwargs):
+    """Guarda el padre anterior para detectar movimientos en el árbol"""
+    if raw or instance.pk is None:
+        instance._previous_parent_id = None
+        return
+    instance._previous_parent_id = (
+        Category.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure(sender, instance, created, raw, **kwargs):
+    """Mantiene CategoryClosure al crear o mover una categoría"""
+    if raw:
+        return
+    if created:
+        add_category_links(instance)
+    elif instance.parent_id != getattr(instance, '_previous_parent_id', instance.parent_id):
+        move_category_links(instance)
+    bump_category_version()
+    bump_data_version()
+
+
+@receiver(post_delete, sender=Category)
+def forget_category(sender, instance, **kwargs):
+    """Las filas de clausura se borran en cascada; solo se invalida la caché"""
+    bump_category_version()
+    bump_data_version()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, raw=False, **kwargs):
+    """Un curso nuevo, editado o borrado invalida los listados cacheados"""
+    if not raw:
+        bump_data_version()
+
+
+# Las cargas por lotes (bulk_create, SQL crudo, TRUNCATE) no disparan
+# señales y llaman a bump_data_version() explícitamente. Los borrados desde
+# el ORM sí: también los que llegan en cascada desde un grupo, una
+# inscripción de curso o un usuario (los de un curso los cubre el receptor
+# de arriba).
+@receiver(post_save, sender=MoodleUser)
+@receiver(post_delete, sender=MoodleUser)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Enrol)
+@receiver(post_save, sender=GroupMember)
+@receiver(post_delete, sender=GroupMember)
+@receiver(post_save, sender=UserEnrolment)
+@receiver(post_delete, sender=UserEnrolment)
+def invalidate_membership_index(sender, raw=False, **kwargs):
+    """Altas y bajas de usuarios, miembros o inscripciones invalidan el índice de bitmaps"""
+    if not raw:
+        bump_data_version()
@@ -0,0 +1,303 @@
+"""
+Snapshot columnar de los datos de acceso para análisis en proceso
+
+build_snapshot() exporta bitácora, últimos accesos, inscripciones,
+pertenencia a grupos y roles a arreglos NumPy tipados (un .npy por columna)
+en un directorio nuevo y recién al final mueve el enlace `current`
+(os.replace: atómico). Las vistas abren las columnas con np.memmap: todos
+los procesos del servidor comparten las mismas páginas del sistema
+operativo, sin copias por proceso ni objetos por fila. Quien ya abrió un
+snapshot lo sigue leyendo aunque se publique otro.
+
+Se reconstruye al final de cada importación y de load_mock_data (o con
+manage.py build_access_snapshot). events_between() completa la bitácora
+del snapshot con los eventos en vivo llegados después (id mayor al último
+exportado) y con los meses que ya estaban archivados al construirlo.
+"""
+import json
+import os
+import shutil
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import archived_events, load_manifest, to_micros
+from .models import (
+    AccessEvent, Enrol, Group, GroupMember, RoleAssignment, UserEnrolment, UserLastAccess,
+)
+from .tenants import atomic, connection, current_tenant, tenant_path
+
+
+SNAPSHOT_FETCH_SIZE = 100000
+SNAPSHOT_LOCK_KEY = 'apps.moodle.snapshot'
+CURRENT_LINK = 'current'
+# Snapshots que se conservan en disco (el publicado y el anterior)
+KEEP_SNAPSHOTS = 2
+
+EVENT_COLUMNS = ('user', 'course', 'role', 'time')
+# Columnas de tiempo: microsegundos desde epoch (como en archive.py)
+TIME_COLUMNS = {'time'}
+
+
+def _micros(column):
+    return f'(extract(epoch FROM {column}) * 1000000)::bigint'
+
+
+# {tabla: (columnas, SELECT, columna de usuario para filtrar)}
+TABLES = {
+    'events': (
+        EVENT_COLUMNS,
+        f'SELECT user_id, course_id, coalesce(role_id, 0), {_micros("timecreated")} '
+        f'FROM {AccessEvent._meta.db_table}',
+        'user_id',
+    ),
+    'last_access': (
+        ('user', 'course', 'time'),
+        f'SELECT user_id, course_id, {_micros("timeaccess")} FROM {UserLastAccess._meta.db_table}',
+        'user_id',
+    ),
+    'enrolments': (
+        ('user', 'course', 'time'),
+        f'SELECT ue.user_id, e.course_id, {_micros("ue.timecreated")} '
+        f'FROM {UserEnrolment._meta.db_table} ue JOIN {Enrol._meta.db_table} e ON e.id = ue.enrol_id',
+        'ue.user_id',
+    ),
+    'members': (
+        ('user', 'group', 'course'),
+        f'SELECT gm.user_id, gm.group_id, g.course_id '
+        f'FROM {GroupMember._meta.db_table} gm JOIN {Group._meta.db_table} g ON g.id = gm.group_id',
+        'gm.user_id',
+    ),
+    'roles': (
+        ('user', 'course', 'role'),
+        f'SELECT user_id, coalesce(course_id, 0), role_id FROM {RoleAssignment._meta.db_table}',
+        'user_id',
+    ),
+}
+
+
+def snapshot_dir():
+    return tenant_path(settings.ACCESS_SNAPSHOT_DIR)
+
+
+def _fetch(sql, params, width):
+    """Filas de una consulta como arreglo N×width, por bloques con un cursor del servidor"""
+    parts = []
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(SNAPSHOT_FETCH_SIZE)
+            if not rows:
+                break
+            parts.append(np.array(rows, dtype=np.int64))
+    return np.concatenate(parts) if parts else np.empty((0, width), dtype=np.int64)
+
+
+def _typed(column, values):
+    """Ids en int32 si entran (la mitad de disco y de caché), tiempos en int64"""
+    if column in TIME_COLUMNS:
+        return values
+    if not len(values) or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max):
+        return values.astype(np.int32)
+    return values
+
+
+def _save(path, values):
+    with open(path, 'wb') as fh:
+        np.save(fh, np.ascontiguousarray(values))
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+# ============================================================================
+# CONSTRUCCIÓN
+# ============================================================================
+
+def build_snapshot():
+    """
+    Construye un snapshot y lo publica; devuelve su directorio, o None si
+    otra construcción de la misma institución está en curso.
+
+    Todas las tablas se leen en una misma transacción REPEATABLE READ: el
+    snapshot es coherente aunque haya cargas en paralelo.
+    """
+    events = AccessEvent._meta.db_table
+    # Como en cube.py: los escritores en curso terminan antes de leer el
+    # máximo, así ningún id menor aparece después (y se perdería: la cola en
+    # vivo de events_between solo mira ids mayores)
+    with atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {events} IN SHARE MODE')
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {events}')
+        max_event_id = cursor.fetchone()[0]
+
+    base = snapshot_dir()
+    base.mkdir(parents=True, exist_ok=True)
+    name = f'{timezone.now():%Y%m%dT%H%M%S%f}-{os.getpid()}'
+    partial = base / f'{name}.partial'
+    partial.mkdir()
+    try:
+        rows = {}
+        with atomic(), connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            cursor.execute('SELECT pg_try_advisory_xact_lock(hashtext(%s))', [SNAPSHOT_LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                return None
+            archived = sorted(load_manifest())
+
+            for table, (columns, sql, _) in TABLES.items():
+                if table == 'events':
+                    # Los posteriores al máximo quedan para la cola en vivo;
+                    # ordenada por tiempo: un rango es un corte (searchsorted)
+                    values = _fetch(f'{sql} WHERE id <= %s', [max_event_id], len(columns))
+                    values = values[np.argsort(values[:, 3], kind='stable')]
+                else:
+                    values = _fetch(sql, [], len(columns))
+                for index, column in enumerate(columns):
+                    _save(partial / f'{table}.{column}.npy', _typed(column, values[:, index]))
+                rows[table] = len(values)
+
+        meta = {
+            'built_at': timezone.now().isoformat(timespec='seconds'),
+            'max_event_id': max_event_id,
+            'archived_months': archived,
+            'rows': rows,
+        }
+        with open(partial / 'meta.json', 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh, indent=2)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(partial, base / name)
+
+        link = base / f'{CURRENT_LINK}.partial'
+        if link.is_symlink():
+            link.unlink()
+        link.symlink_to(name)
+        os.replace(link, base / CURRENT_LINK)
+    finally:
+        if partial.exists():
+            shutil.rmtree(partial)
+
+    _prune(base, name)
+    return base / name
+
+
+def _prune(base, current):
+    """Borra los snapshots viejos (los lectores que los tienen abiertos siguen leyendo)"""
+    # Solo directorios de snapshots (no los de otras instituciones)
+    published = sorted(
+        path for path in base.iterdir()
+        if not path.is_symlink() and (path / 'meta.json').is_file()
+        and not path.name.endswith('.partial')
+    )
+    for path in published[:-KEEP_SNAPSHOTS]:
+        if path.name != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+class Snapshot:
+    """Un snapshot publicado; las columnas se abren con np.memmap a demanda"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path / 'meta.json', encoding='utf-8') as fh:
+            self.meta = json.load(fh)
+        self._tables = {}
+
+    def table(self, name):
+        """{columna: memmap de solo lectura} de una tabla"""
+        if name not in self._tables:
+            self._tables[name] = {
+                column: np.load(self.path / f'{name}.{column}.npy', mmap_mode='r')
+                for column in TABLES[name][0]
+            }
+        return self._tables[name]
+
+
+# {institución: Snapshot abierto}; se reabre cuando cambia el enlace
+_open = {}
+
+
+def current_snapshot():
+    """Snapshot publicado de la institución actual, o None si todavía no hay"""
+    link = snapshot_dir() / CURRENT_LINK
+    try:
+        target = os.readlink(link)
+    except OSError:
+        return None
+    tenant = current_tenant()
+    snapshot = _open.get(tenant)
+    if snapshot is None or snapshot.path.name != target:
+        snapshot = _open[tenant] = Snapshot(link.parent / target)
+    return snapshot
+
+
+def table_columns(name, users=None):
+    """
+    Columnas de una tabla ({columna: arreglo}) del snapshot, o de la base si
+    todavía no hay uno; con `users` (ids) solo las filas de esos usuarios.
+    """
+    columns, sql, user_column = TABLES[name]
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        data = snapshot.table(name)
+        if users is None:
+            return dict(data)
+        keep = np.isin(data['user'], np.asarray(list(users), dtype=np.int64))
+        return {column: values[keep] for column, values in data.items()}
+
+    params = []
+    if users is not None:
+        sql = f'{sql} WHERE {user_column} = ANY(%s)'
+        params = [[int(user) for user in users]]
+    values = _fetch(sql, params, len(columns))
+    return {column: values[:, index] for index, column in enumerate(columns)}
+
+
+def events_between(start, end, course_ids=None):
+    """
+    Bitácora completa en [start, end) como columnas (user, course, role y
+    time en microsegundos), opcionalmente de ciertos cursos; None si todavía
+    no hay snapshot.
+    """
+    snapshot = current_snapshot()
+    if snapshot is None:
+        return None
+
+    data = snapshot.table('events')
+    low, high = np.searchsorted(data['time'], [to_micros(start), to_micros(end)])
+    parts = [{column: data[column][low:high] for column in EVENT_COLUMNS}]
+    if course_ids is not None:
+        keep = np.isin(parts[0]['course'], np.fromiter(course_ids, dtype=np.int64))
+        parts[0] = {column: values[keep] for column, values in parts[0].items()}
+
+    # Meses que ya estaban archivados al construirlo
+    months = [date.fromisoformat(f'{month}-01') for month in snapshot.meta['archived_months']]
+    archived = archived_events(start, end, course_ids, months) if months else None
+    if archived is not None:
+        parts.append(archived)
+
+    # Eventos en vivo posteriores al snapshot
+    tail = AccessEvent.objects.filter(
+        id__gt=snapshot.meta['max_event_id'], timecreated__gte=start, timecreated__lt=end,
+    )
+    if course_ids is not None:
+        tail = tail.filter(course_id__in=list(course_ids))
+    rows = list(tail.values_list('user_id', 'course_id', 'role_id', 'timecreated'))
+    if rows:
+        users, courses, roles, moments = zip(*rows)
+        parts.append({
+            'user': np.array(users, dtype=np.int64),
+            'course': np.array(courses, dtype=np.int64),
+            'role': np.array([role or 0 for role in roles], dtype=np.int64),
+            'time': np.array([to_micros(moment) for moment in moments], dtype=np.int64),
+        })
+
+    if len(parts) == 1:
+        return parts[0]
+    return {column: np.concatenate([part[column] for part in parts]) for column in EVENT_COLUMNS}
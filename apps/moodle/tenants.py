@@ -0,0 +1,208 @@
+"""
+Instituciones (tenants): una base de datos por sitio Moodle
+
+Cada institución configurada en settings.TENANTS tiene su propio alias de
+base con el esquema completo de apps.moodle; la primera usa 'default', que
+además guarda usuarios, sesiones y análisis guardados. La institución actual
+vive en un ContextVar: TenantMiddleware la fija por request (?tenant=, sesión
+o cabecera X-Moodle-Tenant) y los comandos la toman de MOODLE_TENANT.
+
+Un usuario solo puede elegir las instituciones de allowed_tenants() (403 si
+pide otra). Los pedidos sin usuario (la API de eventos, que se autentica
+con token) eligen con ?tenant= o la cabecera solo para ese pedido, sin
+leer ni crear sesión.
+TenantRouter (routers.py) manda las consultas del ORM a su base; el SQL
+crudo usa `connection` y `atomic()` de este módulo en lugar de django.db.
+
+Los totales entre instituciones se calculan en paralelo con fan_out().
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections, transaction
+
+
+TENANT_SESSION_KEY = 'moodle_tenant'
+TENANT_HEADER = 'X-Moodle-Tenant'
+
+_current = ContextVar('moodle_tenant', default=None)
+
+
+def tenant_names():
+    """Instituciones configuradas, la principal primero"""
+    return list(settings.TENANTS)
+
+
+def default_tenant():
+    return tenant_names()[0]
+
+
+def is_multi_tenant():
+    return len(settings.TENANTS) > 1
+
+
+def tenant_label(name):
+    return settings.TENANTS[name]['label']
+
+
+def current_tenant():
+    """Institución activa: la del contexto o MOODLE_TENANT o la principal"""
+    name = _current.get()
+    if name is None:
+        name = os.environ.get('MOODLE_TENANT') or default_tenant()
+        if name not in settings.TENANTS:
+            raise KeyError(f'Institución desconocida en MOODLE_TENANT: {name}')
+    return name
+
+
+def allowed_tenants(user):
+    """
+    Instituciones que puede consultar un usuario autenticado: las que no
+    tienen grupo configurado y las de los grupos a los que pertenece.
+    """
+    if user.is_superuser:
+        return tenant_names()
+    groups = set(user.groups.values_list('name', flat=True))
+    return [
+        name for name, config in settings.TENANTS.items()
+        if not config.get('group') or config['group'] in groups
+    ]
+
+
+def tenant_alias(name=None):
+    """Alias de base de datos de una institución (por defecto la actual)"""
+    return settings.TENANTS[name or current_tenant()]['alias']
+
+
+def tenant_aliases():
+    return {config['alias'] for config in settings.TENANTS.values()}
+
+
+def activate_tenant(name):
+    """Fija la institución del contexto actual (p. ej. al iniciar un proceso hijo)"""
+    if name not in settings.TENANTS:
+        raise KeyError(f'Institución desconocida: {name}')
+    return _current.set(name)
+
+
+@contextmanager
+def use_tenant(name):
+    token = activate_tenant(name)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def atomic(**kwargs):
+    """transaction.atomic() sobre la base de la institución actual"""
+    return transaction.atomic(using=tenant_alias(), **kwargs)
+
+
+def tenant_path(base):
+    """
+    Directorio de archivos (reportes, spool, archivo) de la institución actual:
+    la principal usa `base` tal cual, las demás un subdirectorio con su nombre.
+    """
+    name = current_tenant()
+    return base if name == default_tenant() else base / name
+
+
+class _TenantConnection:
+    """Como django.db.connection, pero de la base de la institución actual"""
+
+    def __getattr__(self, item):
+        return getattr(connections[tenant_alias()], item)
+
+
+connection = _TenantConnection()
+
+
+def _run_for_tenant(name, function, args):
+    with use_tenant(name):
+        try:
+            return function(*args)
+        finally:
+            # Cada hilo abre sus propias conexiones
+            connections[tenant_alias(name)].close()
+
+
+def fan_out(function, *args, tenants=None):
+    """
+    Ejecuta function(*args) en cada institución, en paralelo (un hilo por
+    institución: el trabajo es esperar a cada base).
+
+    Devuelve {institución: resultado} en el orden de settings.TENANTS.
+    """
+    names = tenants or tenant_names()
+    if len(names) == 1:
+        with use_tenant(names[0]):
+            return {names[0]: function(*args)}
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        futures = {name: executor.submit(_run_for_tenant, name, function, args) for name in names}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def _streamed_in_tenant(name, content):
+    with use_tenant(name):
+        yield from content
+
+
+class TenantMiddleware:
+    """Activa la institución elegida durante el request (request.tenant)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _resolve(self, request):
+        chosen = request.GET.get('tenant')
+        requested = chosen if chosen in settings.TENANTS else request.headers.get(TENANT_HEADER)
+        if requested not in settings.TENANTS:
+            requested = None
+
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # API con token o página de login: sin sesión
+            request.allowed_tenants = tenant_names()
+            return requested or default_tenant()
+
+        request.allowed_tenants = allowed_tenants(user)
+        if requested is not None:
+            if requested not in request.allowed_tenants:
+                raise PermissionDenied('Institución no permitida')
+            if requested == chosen:
+                # Elegida en el selector: queda para los próximos requests
+                request.session[TENANT_SESSION_KEY] = requested
+            return requested
+        name = request.session.get(TENANT_SESSION_KEY)
+        if name in request.allowed_tenants:
+            return name
+        if not request.allowed_tenants:
+            raise PermissionDenied('Sin instituciones permitidas')
+        return request.allowed_tenants[0]
+
+    def __call__(self, request):
+        request.tenant = self._resolve(request)
+        with use_tenant(request.tenant):
+            response = self.get_response(request)
+        if response.streaming:
+            # Los CSV se generan después de salir de la vista
+            response.streaming_content = _streamed_in_tenant(request.tenant, response.streaming_content)
+        return response
+
+
+def tenant_context(request):
+    """Context processor: institución actual y opciones del selector"""
+    if not is_multi_tenant():
+        return {}
+    allowed = getattr(request, 'allowed_tenants', tenant_names())
+    return {
+        'current_tenant': current_tenant(),
+        # Con una sola institución permitida no hay nada que elegir
+        'tenant_choices': [(name, tenant_label(name)) for name in allowed] if len(allowed) > 1 else [],
+    }
+
@@ -0,0 +1,78 @@
+"""
+Tests de los sketches HyperLogLog (apps.moodle.hll)
+"""
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.moodle.hll import (
+    REGISTERS, SPARSE_LIMIT, HyperLogLog, count_by, sketches_by, union_by,
+)
+
+
+class SketchesByTests(SimpleTestCase):
+    """Las funciones vectorizadas deben coincidir con un sketch por clave"""
+
+    def setUp(self):
+        rng = np.random.default_rng(2024)
+        # Clave 3 con pocos usuarios (disperso) y clave 7 con muchos (denso)
+        self.values = {
+            3: rng.integers(1, 10_000, size=200),
+            7: rng.integers(1, 10_000_000, size=20_000),
+            11: np.array([42]),
+        }
+        self.keys = np.concatenate([np.full(len(v), k) for k, v in self.values.items()])
+        self.flat = np.concatenate(list(self.values.values()))
+
+    def test_sketches_by_equals_one_sketch_per_key(self):
+        keys, blobs = sketches_by(self.keys, self.flat)
+
+        self.assertEqual(keys.tolist(), [3, 7, 11])
+        for key, blob in zip(keys.tolist(), blobs):
+            self.assertEqual(blob, HyperLogLog.of(self.values[key]).to_bytes())
+
+    def test_sparse_and_dense_encodings(self):
+        _, blobs = sketches_by(self.keys, self.flat)
+
+        self.assertLess(len(blobs[0]), 1 + 4 * SPARSE_LIMIT)
+        self.assertEqual(len(blobs[1]), 1 + REGISTERS)
+        for blob, key in zip(blobs, [3, 7, 11]):
+            restored = HyperLogLog.from_bytes(memoryview(blob))
+            np.testing.assert_array_equal(restored.registers, HyperLogLog.of(self.values[key]).registers)
+
+    def test_union_by_equals_sketch_of_all_values(self):
+        # Cada clave partida en dos "días": la unión debe dar el sketch del total
+        halves_keys, halves_blobs = [], []
+        for key, values in self.values.items():
+            for part in np.array_split(values, 2):
+                if len(part):
+                    halves_keys.append(key)
+                    halves_blobs.append(HyperLogLog.of(part).to_bytes())
+
+        keys, blobs = union_by(halves_keys, halves_blobs)
+        expected_keys, expected_blobs = sketches_by(self.keys, self.flat)
+
+        self.assertEqual(keys.tolist(), expected_keys.tolist())
+        self.assertEqual(blobs, expected_blobs)
+
+    def test_count_by_matches_single_sketch_count(self):
+        keys, blobs = sketches_by(self.keys, self.flat)
+        _, counts = count_by(keys, blobs)
+
+        for key, blob, count in zip(keys.tolist(), blobs, counts.tolist()):
+            self.assertEqual(count, HyperLogLog.from_bytes(blob).count())
+            exact = len(np.unique(self.values[key]))
+            self.assertLessEqual(abs(count - exact), max(1, 0.05 * exact))
+
+    def test_count_by_unions_repeated_keys(self):
+        a, b = HyperLogLog.of(range(0, 600)), HyperLogLog.of(range(300, 900))
+
+        keys, counts = count_by([5, 5], [a.to_bytes(), b.to_bytes()])
+
+        self.assertEqual(keys.tolist(), [5])
+        self.assertEqual(counts[0], (a | b).count())
+
+    def test_corrupt_sketch_is_rejected(self):
+        with self.assertRaises(ValueError):
+            count_by([1], [b'\x00\x01\x02\x03\x04'])
+        with self.assertRaises(ValueError):
+            HyperLogLog.from_bytes(b'')
@@ -0,0 +1,66 @@
+"""
+Tests de la paginación por clave (apps.moodle.pagination)
+"""
+import base64
+
+from django.test import SimpleTestCase, TestCase
+
+from apps.moodle.models import MoodleUser
+from apps.moodle.pagination import decode_cursor, encode_cursor, keyset_page
+from apps.moodle.reports import NEVER_USERS_ORDERING
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        values = ['Pérez', 'Ana', 17]
+        self.assertEqual(decode_cursor(encode_cursor(values), 3), values)
+
+    def test_invalid_cursors(self):
+        self.assertIsNone(decode_cursor('', 3))
+        self.assertIsNone(decode_cursor(None, 3))
+        self.assertIsNone(decode_cursor('no es base64!', 3))
+        self.assertIsNone(decode_cursor(encode_cursor(['Pérez', 'Ana']), 3))
+        self.assertIsNone(decode_cursor(base64.urlsafe_b64encode(b'{"a":1}').decode(), 1))
+
+
+class KeysetPageTests(TestCase):
+    """Recorrer todas las páginas equivale al listado completo, sin repetidos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Apellidos y nombres repetidos: el desempate es por id
+        MoodleUser.objects.bulk_create(
+            MoodleUser(
+                username=f'user{i}', firstname=['Ana', 'Juan'][i % 2],
+                lastname=['Gómez', 'Pérez', 'Álvarez'][i % 3], email=f'user{i}@example.com',
+            )
+            for i in range(23)
+        )
+
+    def walk(self, size):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(MoodleUser.objects.all(), NEVER_USERS_ORDERING, cursor, size)
+            pages.append(rows)
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_the_ordered_list(self):
+        expected = list(MoodleUser.objects.order_by(*NEVER_USERS_ORDERING).values_list('pk', flat=True))
+
+        for size in (1, 5, 23, 50):
+            with self.subTest(size=size):
+                pages = self.walk(size)
+                self.assertEqual([user.pk for rows in pages for user in rows], expected)
+                self.assertTrue(all(len(rows) == size for rows in pages[:-1]))
+
+    def test_last_page_has_no_cursor(self):
+        rows, cursor = keyset_page(MoodleUser.objects.all(), NEVER_USERS_ORDERING, size=23)
+        self.assertEqual(len(rows), 23)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor_starts_over(self):
+        first, _ = keyset_page(MoodleUser.objects.all(), NEVER_USERS_ORDERING, size=5)
+        again, _ = keyset_page(MoodleUser.objects.all(), NEVER_USERS_ORDERING, 'basura', size=5)
+        self.assertEqual(again, first)
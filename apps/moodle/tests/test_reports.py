@@ -0,0 +1,93 @@
+"""
+Tests del motor de "usuarios que aún no ingresaron" (apps.moodle.reports)
+"""
+from datetime import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.moodle import reports
+from apps.moodle.models import (
+    Category, Course, Enrol, Group, GroupMember, MoodleUser, UserEnrolment, UserLastAccess,
+)
+
+
+def local(year, month, day, hour=12):
+    return timezone.make_aware(datetime(year, month, day, hour))
+
+
+class NeverAccessedTests(TestCase):
+    """never_accessed_count (bitmaps o SQL) coincide con la serie del reporte"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Grado')
+        cls.course = Course.objects.create(shortname='MAT1', fullname='Matemática 2025', category=category)
+        other_course = Course.objects.create(shortname='FIS1', fullname='Física 2025', category=category)
+        cls.group = Group.objects.create(name='Comisión A', course=cls.course)
+        enrol = Enrol.objects.create(course=cls.course)
+        other_enrol = Enrol.objects.create(course=other_course)
+
+        users = [
+            MoodleUser.objects.create(username=f'u{i}', firstname='Nombre', lastname=f'Apellido {i}',
+                                      email=f'u{i}@example.com')
+            for i in range(9)
+        ]
+        # u0-u5: miembros e inscriptos (objetivo); u6: miembro sin inscripción;
+        # u7: inscripto fuera del grupo; u8: miembro inscripto solo en otro curso
+        for user in users[:7] + [users[8]]:
+            GroupMember.objects.create(group=cls.group, user=user)
+        for user in users[:6] + [users[7]]:
+            UserEnrolment.objects.create(enrol=enrol, user=user)
+        UserEnrolment.objects.create(enrol=other_enrol, user=users[8])
+
+        accesses = {
+            0: local(2025, 3, 4),
+            1: local(2025, 3, 12),
+            2: local(2025, 3, 20),
+            3: local(2025, 4, 5),  # después del rango
+            6: local(2025, 3, 4),
+            7: local(2025, 3, 4),
+        }
+        for index, moment in accesses.items():
+            UserLastAccess.objects.create(user=users[index], course=cls.course, timeaccess=moment)
+        UserLastAccess.objects.create(user=users[4], course=other_course, timeaccess=local(2025, 3, 4))
+
+        cls.from_date = local(2025, 3, 3)
+        cls.to_date = local(2025, 3, 23)
+
+    def report(self):
+        return reports.calculate_never_accessed(self.course, self.group, self.from_date, self.to_date)
+
+    def assert_counts_match_series(self):
+        result = self.report()
+        self.assertEqual(result['total_group'], 6)
+        self.assertEqual([point['never'] for point in result['series']], [5, 4, 3])
+
+        for point in result['series']:
+            week_end = datetime.fromtimestamp(point['end_ts'], tz=timezone.get_current_timezone())
+            with self.subTest(week=point['label']):
+                self.assertEqual(reports.never_accessed_count(self.course, self.group, week_end), point['never'])
+                self.assertEqual(
+                    reports.never_accessed_users(self.course, self.group, week_end).count(), point['never']
+                )
+
+    def test_bitmap_index(self):
+        self.assertIsNotNone(reports.membership_index())
+        self.assert_counts_match_series()
+
+    def test_without_index(self):
+        # Réplica atrasada: todo se resuelve con las consultas SQL
+        with mock.patch.object(reports, 'membership_index', return_value=None):
+            self.assertEqual(
+                reports.target_user_ids(self.course, self.group),
+                set(MoodleUser.objects.filter(username__in=[f'u{i}' for i in range(6)])
+                    .values_list('pk', flat=True)),
+            )
+            self.assert_counts_match_series()
+
+    def test_never_users_listing(self):
+        week_end = local(2025, 3, 23, 23)
+        names = reports.never_accessed_users(self.course, self.group, week_end).values_list('username', flat=True)
+        self.assertEqual(list(names), ['u3', 'u4', 'u5'])
@@ -0,0 +1,52 @@
+"""
+Tests del filtro de cursos del panel (apps.moodle.search.panel_courses)
+"""
+from datetime import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.moodle.models import Category, Course
+from apps.moodle.search import panel_courses
+
+
+class PanelCoursesTests(TestCase):
+    """Cursos visibles de Grado del año actual o del siguiente si figura en el nombre"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grado = Category.objects.create(name='Grado')
+        career = Category.objects.create(name='Contador Público', parent=grado)
+        posgrado = Category.objects.create(name='Posgrado')
+
+        def course(shortname, fullname, category=career, startdate=None, visible=True):
+            if startdate is not None:
+                startdate = timezone.make_aware(datetime(*startdate))
+            Course.objects.create(shortname=shortname, fullname=fullname, category=category,
+                                  startdate=startdate, visible=visible)
+
+        course('ACTUAL-NOMBRE', 'Contabilidad I 2025')
+        course('ACTUAL-FECHA', 'Contabilidad II', startdate=(2025, 3, 10))
+        course('SIGUIENTE-NOMBRE', 'Contabilidad III 2026')
+        course('SIGUIENTE-FECHA', 'Contabilidad IV', startdate=(2026, 3, 9))
+        course('ANTERIOR', 'Contabilidad V 2024')
+        course('DOS-AÑOS', 'Contabilidad VI 2027')
+        course('SIN-AÑO', 'Taller de tesis')
+        course('OCULTO', 'Contabilidad VII 2025', visible=False)
+        course('POSGRADO', 'Finanzas 2025', category=posgrado)
+
+    def test_year_filter(self):
+        shortnames = set(panel_courses(current_year=2025).values_list('shortname', flat=True))
+        self.assertEqual(shortnames, {'ACTUAL-NOMBRE', 'ACTUAL-FECHA', 'SIGUIENTE-NOMBRE', 'SIN-AÑO'})
+
+    def test_next_year_only_from_the_name(self):
+        courses = Course.objects.filter(shortname__in=['SIGUIENTE-NOMBRE', 'SIGUIENTE-FECHA'])
+        self.assertEqual({c.academic_year for c in courses}, {2026})
+        self.assertEqual(
+            dict(courses.values_list('shortname', 'name_has_year')),
+            {'SIGUIENTE-NOMBRE': True, 'SIGUIENTE-FECHA': False},
+        )
+
+    def test_follows_current_year(self):
+        shortnames = set(panel_courses(current_year=2026).values_list('shortname', flat=True))
+        self.assertEqual(shortnames, {'SIGUIENTE-NOMBRE', 'SIGUIENTE-FECHA', 'DOS-AÑOS', 'SIN-AÑO'})
@@ -9,5 +9,12 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('panel/', views.panel_view, name='panel'),
+    path('panel/courses/', views.course_autocomplete_view, name='course_autocomplete'),
+    path('panel/csv/', views.report_csv_view, name='report_csv'),
+    path('panel/matrix/', views.course_matrix_view, name='course_matrix'),
     path('never-users/', views.never_users_view, name='never_users'),
+    path('never-users/csv/', views.never_users_csv_view, name='never_users_csv'),
+    path('reports/', views.faculty_reports_view, name='faculty_reports'),
+    path('api/access-events/', views.access_events_view, name='access_events'),
+    path('reports/<str:name>', views.faculty_report_download, name='faculty_report_download'),
 ]
@@ -1,16 +1,33 @@
 """
 Vistas para el panel de gestores (migrado de PHP)
 """
-from django.shortcuts import render, redirect
+import csv
+import hmac
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+)
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Count, Q
-from .models import (
-    Course, Group, MoodleUser, Category,
-    GroupMember, UserEnrolment, UserLastAccess
+from .bulk import FACULTY_REPORT_PREFIX, list_faculty_reports, reports_dir
+from .events import BufferFull, access_event_buffer, parse_ndjson_events
+from .models import Course, Group
+from .pagination import keyset_page
+from .replicas import replica_reads
+from .reports import (
+    GRANULARITIES, DEFAULT_GRANULARITY, NEVER_USERS_ORDERING,
+    calculate_course_matrix, calculate_never_accessed, never_accessed_count,
+    never_accessed_users,
+    normalize_granularity,
+    stored_weekly_report,
 )
+from .search import AUTOCOMPLETE_LIMIT, default_course_options, panel_courses, search_courses
 
 
 def login_view(request):
@@ -43,68 +60,26 @@ def logout_view(request):
 
 
 @login_required
+@replica_reads
 def panel_view(request):
     """Panel principal de reportes (migrado de panel.php)"""
 
-    # Obtener categorías "Grado" y sus descendientes
-    grado_categories = Category.objects.filter(name__iexact='Grado')
-    allowed_category_ids = set()
-
-    if grado_categories.exists():
-        for cat in grado_categories:
-            # Incluir la categoría principal
-            allowed_category_ids.add(cat.id)
-            # Buscar todos los descendientes (categorías que tienen a esta en su path)
-            # Si cat.path es "/1", buscamos categorías cuyo path empiece con "/1/"
-            descendants = Category.objects.filter(path__startswith=cat.path + '/')
-            allowed_category_ids.update(descendants.values_list('id', flat=True))
-
-    # Filtro de búsqueda por código
+    # Búsqueda por código o nombre; sin búsqueda no se lista nada, el
+    # autocompletado consulta course_autocomplete_view
     course_search = request.GET.get('q', '').strip()
-
-    # Filtrar cursos (solo categoría Grado del año actual)
     now = timezone.now()
-    current_year = now.year
-
-    courses = Course.objects.filter(visible=True)
-
-    if allowed_category_ids:
-        courses = courses.filter(category_id__in=allowed_category_ids)
 
     if course_search:
-        courses = courses.filter(
-            Q(shortname__icontains=course_search) |
-            Q(fullname__icontains=course_search)
-        )
-
-    # Filtrar por año actual en el nombre del curso (más permisivo)
-    import re
-    filtered_courses = []
-    for course in courses:
-        # Buscar año en el nombre
-        year_match = re.search(r'\b(20\d{2})\b', course.fullname or course.shortname)
-
-        if year_match:
-            course_year = int(year_match.group(1))
-            # Aceptar año actual y siguiente
-            if course_year == current_year or course_year == current_year + 1:
-                filtered_courses.append(course)
-        elif course.startdate:
-            # Si no hay año en el nombre, usar startdate del año actual
-            if course.startdate.year == current_year:
-                filtered_courses.append(course)
-        else:
-            # Si no tiene ni año ni fecha, incluirlo igual
-            filtered_courses.append(course)
-
-    # Ordenar por shortname
-    filtered_courses.sort(key=lambda c: c.shortname)
+        filtered_courses = search_courses(panel_courses(), course_search)
+    else:
+        filtered_courses = []
 
     # Parámetros del formulario
     courseid = int(request.GET.get('courseid') or 0)
     groupid = int(request.GET.get('groupid') or 0)
     from_str = request.GET.get('from', '')
     to_str = request.GET.get('to', '')
+    granularity = normalize_granularity(request.GET.get('granularity', ''))
 
     # Rango por defecto: últimos 30 días
     if not from_str and not to_str:
@@ -142,6 +117,14 @@ def panel_view(request):
             courseid = 0
             groupid = 0
 
+    # El curso elegido siempre figura entre las opciones
+    if selected_course and all(c['id'] != selected_course.id for c in filtered_courses):
+        filtered_courses.insert(0, {
+            'id': selected_course.id,
+            'shortname': selected_course.shortname,
+            'fullname': selected_course.fullname,
+        })
+
     selected_group = None
     if courseid and groupid:
         try:
@@ -153,7 +136,9 @@ def panel_view(request):
     # Calcular reporte
     report = None
     if selected_course and selected_group and from_date and to_date:
-        report = calculate_weekly_report(selected_course, selected_group, from_date, to_date)
+        report = calculate_weekly_report(
+            selected_course, selected_group, from_date, to_date, granularity
+        )
 
     context = {
         'courses': filtered_courses,
@@ -163,6 +148,8 @@ def panel_view(request):
         'selected_group': selected_group,
         'from_str': from_str,
         'to_str': to_str,
+        'granularity': granularity,
+        'granularities': GRANULARITIES,
         'errors': errors,
         'report': report,
     }
@@ -170,60 +157,39 @@ def panel_view(request):
     return render(request, 'moodle/panel.html', context)
 
 
-def calculate_weekly_report(course, group, from_date, to_date):
-    """Calcula el reporte semanal de usuarios sin acceso"""
-
-    # A) Usuarios del grupo
-    group_user_ids = set(GroupMember.objects.filter(group=group).values_list('user_id', flat=True))
-
-    # B) Usuarios inscritos al curso
-    course_user_ids = set(
-        UserEnrolment.objects.filter(enrol__course=course).values_list('user_id', flat=True)
-    )
-
-    # C) Intersección
-    target_user_ids = group_user_ids & course_user_ids
-
-    # D) Últimos accesos
-    last_accesses = {}
-    for access in UserLastAccess.objects.filter(course=course, user_id__in=target_user_ids):
-        user_id = access.user_id
-        if user_id not in last_accesses or access.timeaccess > last_accesses[user_id]:
-            last_accesses[user_id] = access.timeaccess
-
-    # E) Serie semanal
-    series = []
-    current_date = from_date
-
-    # Encontrar el lunes de la semana
-    while current_date.weekday() != 0:  # 0 = lunes
-        current_date -= timedelta(days=1)
-
-    while current_date <= to_date:
-        week_end = current_date + timedelta(days=6, hours=23, minutes=59, seconds=59)
+@login_required
+@replica_reads
+def course_autocomplete_view(request):
+    """Autocompletado de cursos del panel (JSON, ordenado por relevancia)"""
+    term = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit') or AUTOCOMPLETE_LIMIT), 1), 50)
+    except ValueError:
+        return HttpResponseBadRequest('Parámetro limit inválido.')
+
+    if term:
+        results = search_courses(panel_courses(), term, limit)
+    else:
+        results = default_course_options(limit)
+    return JsonResponse({'results': results})
 
-        still_never = 0
-        for user_id in target_user_ids:
-            if user_id not in last_accesses or last_accesses[user_id] > week_end:
-                still_never += 1
 
-        week_label = f"{current_date.strftime('%Y-%m-%d')} → {week_end.strftime('%Y-%m-%d')}"
+def calculate_weekly_report(course, group, from_date, to_date, granularity=DEFAULT_GRANULARITY):
+    """Calcula el reporte de usuarios sin acceso (semanal por defecto)"""
+    if granularity == 'week':
+        # Usar la serie precalculada si está fresca y cubre todo el rango
+        report = stored_weekly_report(group, from_date, to_date)
+        if report is not None:
+            return report
 
-        series.append({
-            'week': week_label,
-            'never': still_never,
-            'end_ts': int(week_end.timestamp())
-        })
+    return calculate_never_accessed(course, group, from_date, to_date, granularity)
 
-        current_date += timedelta(days=7)
 
-    return {
-        'series': series,
-        'total_group': len(target_user_ids)
-    }
+NEVER_USERS_PAGE_SIZE = 100
 
 
 @login_required
+@replica_reads
 def never_users_view(request):
     """Lista de usuarios que no accedieron en una semana específica"""
     courseid = int(request.GET.get('courseid') or 0)
@@ -237,41 +203,234 @@ def never_users_view(request):
     group = Group.objects.get(id=groupid)
     week_end = timezone.datetime.fromtimestamp(week_end_ts, tz=timezone.get_current_timezone())
 
-    # Usuarios del grupo
-    group_user_ids = set(GroupMember.objects.filter(group=group).values_list('user_id', flat=True))
-
-    # Usuarios inscritos
-    course_user_ids = set(
-        UserEnrolment.objects.filter(enrol__course=course).values_list('user_id', flat=True)
-    )
-
-    # Intersección
-    target_user_ids = group_user_ids & course_user_ids
-
-    # Últimos accesos
-    last_accesses = {}
-    for access in UserLastAccess.objects.filter(course=course, user_id__in=target_user_ids):
-        user_id = access.user_id
-        if user_id not in last_accesses or access.timeaccess > last_accesses[user_id]:
-            last_accesses[user_id] = access.timeaccess
+    week_start_ts = int(request.GET.get('start') or 0)
+    if week_start_ts:
+        week_start = timezone.datetime.fromtimestamp(week_start_ts, tz=timezone.get_current_timezone())
+    else:
+        week_start = week_end - timedelta(days=6)
 
-    # Faltantes
-    missing_user_ids = []
-    for user_id in target_user_ids:
-        if user_id not in last_accesses or last_accesses[user_id] > week_end:
-            missing_user_ids.append(user_id)
+    # Conteo en vivo sobre el índice de bitmaps: el mismo estado que el listado
+    total_missing = never_accessed_count(course, group, week_end)
 
-    # Datos de usuarios
-    users = MoodleUser.objects.filter(id__in=missing_user_ids).order_by('lastname', 'firstname')
+    if total_missing == 0:
+        users, next_cursor = [], None
+    else:
+        users, next_cursor = keyset_page(
+            never_accessed_users(course, group, week_end), NEVER_USERS_ORDERING,
+            cursor=request.GET.get('after'), size=NEVER_USERS_PAGE_SIZE,
+        )
 
-    week_start = week_end - timedelta(days=6)
     week_label = f"{week_start.strftime('%Y-%m-%d')} → {week_end.strftime('%Y-%m-%d')}"
 
     context = {
         'users': users,
+        'total_missing': total_missing,
         'week_label': week_label,
+        'week_start_ts': int(week_start.timestamp()),
+        'week_end_ts': week_end_ts,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
         'course': course,
         'group': group,
     }
 
     return render(request, 'moodle/never_users.html', context)
+
+
+@login_required
+@replica_reads
+def course_matrix_view(request):
+    """Matriz grupo × semana de usuarios sin acceso para todo un curso"""
+    course = get_object_or_404(Course, id=int(request.GET.get('courseid') or 0))
+    granularity = normalize_granularity(request.GET.get('granularity', ''))
+
+    now = timezone.now()
+    from_date = _parse_day(request.GET.get('from')) or now - timedelta(days=30)
+    to_date = _parse_day(request.GET.get('to')) or now
+    if from_date > to_date:
+        from_date, to_date = to_date, from_date
+
+    matrix = calculate_course_matrix(course, from_date, to_date, granularity)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'course': {'id': course.id, 'shortname': course.shortname, 'fullname': course.fullname},
+            'from': from_date.strftime('%Y-%m-%d'),
+            'to': to_date.strftime('%Y-%m-%d'),
+            'granularity': granularity,
+            'periods': matrix['periods'],
+            'groups': [
+                {
+                    'id': row['group'].id,
+                    'name': row['group'].name,
+                    'total_group': row['total_group'],
+                    'never': row['never'],
+                }
+                for row in matrix['rows']
+            ],
+        })
+
+    rows = [
+        {
+            'group': row['group'],
+            'total_group': row['total_group'],
+            'cells': list(zip(matrix['periods'], row['never'])),
+        }
+        for row in matrix['rows']
+    ]
+
+    context = {
+        'course': course,
+        'from_str': from_date.strftime('%Y-%m-%d'),
+        'to_str': to_date.strftime('%Y-%m-%d'),
+        'granularity': granularity,
+        'granularities': GRANULARITIES,
+        'periods': matrix['periods'],
+        'rows': rows,
+    }
+    return render(request, 'moodle/course_matrix.html', context)
+
+
+# ============================================================================
+# EXPORTACIÓN CSV (migrado de report_csv.php y never_users_csv.php)
+# ============================================================================
+
+CSV_BOM = '\ufeff'  # BOM para que Excel detecte UTF-8
+CSV_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """Pseudo-buffer: csv.writer escribe la línea y la devolvemos tal cual"""
+
+    def write(self, value):
+        return value
+
+
+def _stream_csv(filename, header, rows):
+    """Respuesta CSV que se genera fila a fila (memoria constante)"""
+    writer = csv.writer(_Echo())
+
+    def generate():
+        yield CSV_BOM
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _parse_day(value):
+    """Convierte YYYY-MM-DD a datetime con timezone (None si es inválido)"""
+    try:
+        return timezone.make_aware(timezone.datetime.strptime(value, '%Y-%m-%d'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _course_and_group(courseid, groupid):
+    """Curso y grupo validados (el grupo debe pertenecer al curso)"""
+    group = Group.objects.select_related('course').filter(id=groupid, course_id=courseid).first()
+    return (group.course, group) if group else (None, None)
+
+
+@login_required
+@replica_reads
+def report_csv_view(request):
+    """Reporte de usuarios sin acceso por período en CSV"""
+    courseid = int(request.GET.get('courseid') or 0)
+    groupid = int(request.GET.get('groupid') or 0)
+    from_date = _parse_day(request.GET.get('from'))
+    to_date = _parse_day(request.GET.get('to'))
+    granularity = normalize_granularity(request.GET.get('granularity', ''))
+
+    course, group = _course_and_group(courseid, groupid)
+    if not course or not from_date or not to_date:
+        return HttpResponseBadRequest('Parámetros inválidos')
+    if from_date > to_date:
+        from_date, to_date = to_date, from_date
+
+    report = calculate_weekly_report(course, group, from_date, to_date, granularity)
+    header = ['Semana' if granularity == 'week' else 'Período', 'Aún no habían ingresado']
+
+    return _stream_csv(
+        f'reporte_semanal_{courseid}_{groupid}.csv',
+        header,
+        ([row['label'], row['never']] for row in report['series']),
+    )
+
+
+@login_required
+@replica_reads
+def never_users_csv_view(request):
+    """Usuarios que aún no habían ingresado al cierre de una semana, en CSV"""
+    courseid = int(request.GET.get('courseid') or 0)
+    groupid = int(request.GET.get('groupid') or 0)
+    week_end_ts = int(request.GET.get('end') or 0)
+
+    course, group = _course_and_group(courseid, groupid)
+    if not course or not week_end_ts:
+        return HttpResponseBadRequest('Parámetros inválidos')
+
+    week_end = timezone.datetime.fromtimestamp(week_end_ts, tz=timezone.get_current_timezone())
+    users = (
+        never_accessed_users(course, group, week_end)
+        .values_list('lastname', 'firstname', 'email', 'username', 'id')
+        .iterator(chunk_size=CSV_CHUNK_SIZE)
+    )
+
+    return _stream_csv(
+        f'usuarios_sin_ingreso_{courseid}_{groupid}_{week_end_ts}.csv',
+        ['Apellido', 'Nombre', 'Email', 'Usuario', 'ID'],
+        users,
+    )
+
+
+@login_required
+def faculty_reports_view(request):
+    """Reportes masivos por categoría generados con manage.py faculty_report"""
+    return render(request, 'moodle/faculty_reports.html', {'reports': list_faculty_reports()})
+
+
+@login_required
+def faculty_report_download(request, name):
+    """Descarga de un reporte masivo"""
+    if not name.startswith(FACULTY_REPORT_PREFIX) or not name.endswith('.csv') or '/' in name:
+        raise Http404('Reporte inexistente')
+
+    path = reports_dir() / name
+    if not path.is_file():
+        raise Http404('Reporte inexistente')
+
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name,
+                        content_type='text/csv; charset=utf-8')
+
+
+@csrf_exempt
+@require_POST
+def access_events_view(request):
+    """
+    Recibe eventos de acceso en NDJSON (Authorization: Bearer <token>).
+
+    Responde 202 al encolarlos; 503 con Retry-After si el buffer está lleno.
+    """
+    token = settings.ACCESS_EVENTS_TOKEN
+    auth = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode()):
+        return JsonResponse({'error': 'No autorizado'}, status=401)
+
+    events, rejected = parse_ndjson_events(request.body.splitlines())
+    if len(events) + rejected > settings.ACCESS_EVENTS_MAX_BATCH:
+        return JsonResponse(
+            {'error': f'Máximo {settings.ACCESS_EVENTS_MAX_BATCH} eventos por pedido'}, status=413
+        )
+
+    try:
+        access_event_buffer().add(events)
+    except BufferFull:
+        response = JsonResponse({'error': 'Buffer lleno, reintentar'}, status=503)
+        response['Retry-After'] = str(max(1, round(settings.ACCESS_EVENTS_FLUSH_SECONDS)))
+        return response
+
+    return JsonResponse({'accepted': len(events), 'rejected': rejected}, status=202)
@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third party
     'django_extensions',
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.moodle.tenants.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,6 +56,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'apps.moodle.tenants.tenant_context',
+                'apps.moodle.replicas.data_freshness',
             ],
         },
     },
@@ -73,6 +77,75 @@ DATABASES = {
     }
 }
 
+# Instituciones: una base por sitio Moodle (ver apps/moodle/tenants.py).
+# MOODLE_TENANTS=grado,posgrado: la primera usa la base 'default'; cada una de
+# las demás lee TENANT_<NOMBRE>_DB_NAME y, si se indican, _DB_HOST, _DB_PORT,
+# _DB_USER y _DB_PASSWORD (si no, los de la principal). Migrar cada base con
+# manage.py migrate --database=tenant_<nombre>. TENANT_<NOMBRE>_GROUP es el
+# grupo de Django cuyos usuarios pueden consultarla (por defecto el nombre de
+# la institución; en la principal, vacío: todos); los superusuarios ven todas.
+#
+# Réplica de lectura opcional para estadísticas y panel (apps/moodle/replicas.py):
+# DB_REPLICA_HOST (o _NAME) para la principal, TENANT_<NOMBRE>_REPLICA_HOST para
+# las demás; _PORT, _NAME, _USER y _PASSWORD, si faltan, son los del primario.
+TENANTS = {}
+for _index, _name in enumerate(config('MOODLE_TENANTS', default='principal', cast=Csv())):
+    _prefix = f'TENANT_{_name.upper()}'
+    _alias = 'default' if _index == 0 else f'tenant_{_name}'
+    if _index:
+        DATABASES[_alias] = {
+            **DATABASES['default'],
+            'NAME': config(f'{_prefix}_DB_NAME'),
+            'HOST': config(f'{_prefix}_DB_HOST', default=DATABASES['default']['HOST']),
+            'PORT': config(f'{_prefix}_DB_PORT', default=DATABASES['default']['PORT']),
+            'USER': config(f'{_prefix}_DB_USER', default=DATABASES['default']['USER']),
+            'PASSWORD': config(f'{_prefix}_DB_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        }
+    _replica_prefix = 'DB_REPLICA' if _index == 0 else f'{_prefix}_REPLICA'
+    _replica = None
+    if config(f'{_replica_prefix}_HOST', default='') or config(f'{_replica_prefix}_NAME', default=''):
+        _replica = f'{_alias}_replica'
+        DATABASES[_replica] = {
+            **DATABASES[_alias],
+            **{
+                key: config(f'{_replica_prefix}_{key}', default=DATABASES[_alias][key])
+                for key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD')
+            },
+            'TEST': {'MIRROR': _alias},
+        }
+    TENANTS[_name] = {
+        'alias': _alias,
+        'label': config(f'{_prefix}_LABEL', default=_name.capitalize()),
+        'group': config(f'{_prefix}_GROUP', default='' if _index == 0 else _name),
+        'replica': _replica,
+    }
+
+# Atraso tolerado de la réplica: más que MAX se lee del primario; desde AS_OF
+# las páginas muestran "datos al ..."; se mide cada CHECK segundos por proceso
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=900, cast=int)
+REPLICA_AS_OF_SECONDS = config('REPLICA_AS_OF_SECONDS', default=60, cast=int)
+REPLICA_LAG_CHECK_SECONDS = config('REPLICA_LAG_CHECK_SECONDS', default=5, cast=int)
+
+# Base de datos de Moodle (solo lectura) para manage.py sync_moodle_db.
+# Sin MOODLE_DB_NAME el alias no se define y la sincronización directa
+# queda deshabilitada.
+MOODLE_DB_ALIAS = 'moodle'
+MOODLE_DB_PREFIX = config('MOODLE_DB_PREFIX', default='mdl_')
+if config('MOODLE_DB_NAME', default=''):
+    DATABASES[MOODLE_DB_ALIAS] = {
+        'ENGINE': config('MOODLE_DB_ENGINE', default='django.db.backends.postgresql'),
+        'NAME': config('MOODLE_DB_NAME'),
+        'USER': config('MOODLE_DB_USER', default=''),
+        'PASSWORD': config('MOODLE_DB_PASSWORD', default=''),
+        'HOST': config('MOODLE_DB_HOST', default=''),
+        'PORT': config('MOODLE_DB_PORT', default=''),
+    }
+
+DATABASE_ROUTERS = [
+    'apps.moodle.routers.MoodleSourceRouter',
+    'apps.moodle.routers.TenantRouter',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -95,6 +168,35 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Reportes masivos generados por manage.py faculty_report
+REPORTS_DIR = Path(config('REPORTS_DIR', default=str(MEDIA_ROOT / 'reports')))
+
+# Caché compartida entre procesos (web, workers y comandos de carga)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    }
+}
+
+# Export NDJSON nocturno de Moodle (manage.py import_moodle_ndjson)
+MOODLE_EXPORT_DIR = config('MOODLE_EXPORT_DIR', default='/var/lib/moodle-exports')
+
+# Ingesta de eventos de acceso en tiempo real (token vacío: endpoint deshabilitado)
+ACCESS_EVENTS_TOKEN = config('ACCESS_EVENTS_TOKEN', default='')
+ACCESS_EVENTS_FLUSH_SIZE = config('ACCESS_EVENTS_FLUSH_SIZE', default=5000, cast=int)
+ACCESS_EVENTS_FLUSH_SECONDS = config('ACCESS_EVENTS_FLUSH_SECONDS', default=2.0, cast=float)
+ACCESS_EVENTS_MAX_PENDING = config('ACCESS_EVENTS_MAX_PENDING', default=50000, cast=int)
+ACCESS_EVENTS_MAX_BATCH = config('ACCESS_EVENTS_MAX_BATCH', default=10000, cast=int)
+ACCESS_EVENTS_SPOOL_DIR = Path(config('ACCESS_EVENTS_SPOOL_DIR', default=str(BASE_DIR / 'spool' / 'access-events')))
+
+# Archivo en frío de la bitácora: meses más viejos que el horizonte pasan a .npz
+ACCESS_ARCHIVE_DIR = Path(config('ACCESS_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'access-events')))
+ACCESS_ARCHIVE_AFTER_MONTHS = config('ACCESS_ARCHIVE_AFTER_MONTHS', default=24, cast=int)
+
+# Snapshot columnar (.npy con memmap) para analytics; se reconstruye tras cada importación
+ACCESS_SNAPSHOT_DIR = Path(config('ACCESS_SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots' / 'access')))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -113,3 +215,7 @@ CSRF_COOKIE_SECURE = not DEBUG
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/panel/'
 LOGOUT_REDIRECT_URL = '/'
+
+# Reportes precalculados (manage.py precompute_weekly_report)
+# Pasado este tiempo el panel vuelve a calcular en vivo
+NEVER_ACCESS_SNAPSHOT_MAX_AGE_HOURS = config('NEVER_ACCESS_SNAPSHOT_MAX_AGE_HOURS', default=26, cast=int)
@@ -12,6 +12,9 @@ echo "Ejecutando migraciones..."
 python manage.py makemigrations
 python manage.py migrate
 
+echo "Poniendo al día el cubo de accesos..."
+python manage.py roll_up_access_cube
+
 echo "Creando superusuario si no existe..."
 python manage.py shell << END
 from django.contrib.auth import get_user_model